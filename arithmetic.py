@@ -0,0 +1,271 @@
+"""
+Arithmetic for microPROLOG.
+
+(is X Expr) and the comparison predicates evaluate expressions built
+from numbers and the functions in FUNCTIONS. Evaluation fails the goal
+when an expression holds an unbound variable, a non-number or an unknown
+function, or when a function is undefined for its arguments.
+
+Expressions written in clause bodies are compiled once, when the clause
+is added, into closures that read the clause's variables straight from
+its frame (see compile_goal); other goals are evaluated by walking the
+term (see evaluate).
+"""
+from typing import Callable, Optional, Union
+from terms import Term, Atom, Compound, Slot
+from unification import BindingStore, deref, unify
+
+Number = Union[int, float]
+
+
+class EvaluationError(Exception):
+    """An expression has no value."""
+
+
+def _integers(x: Number, y: Number):
+    if type(x) is not int or type(y) is not int:
+        raise EvaluationError("Integers expected")
+
+
+def _divide(x: Number, y: Number) -> Number:
+    """/ - exact division of integers gives an integer"""
+    if type(x) is int and type(y) is int and x % y == 0:
+        return x // y
+    return x / y
+
+
+def _int_divide(x: Number, y: Number) -> int:
+    """// - integer division, truncating towards zero"""
+    _integers(x, y)
+    quotient = abs(x) // abs(y)
+    return -quotient if (x < 0) != (y < 0) else quotient
+
+
+def _mod(x: Number, y: Number) -> int:
+    """mod - the remainder has the sign of the divisor"""
+    _integers(x, y)
+    return x % y
+
+
+def _rem(x: Number, y: Number) -> int:
+    """rem - the remainder of //, with the sign of the dividend"""
+    return x - y * _int_divide(x, y)
+
+
+def _power(x: Number, y: Number) -> Number:
+    """** - integer for integer arguments and exponents >= 0"""
+    if type(x) is int and type(y) is int and y >= 0:
+        return x ** y
+    result = float(x) ** y
+    if type(result) is complex:
+        raise EvaluationError("Complex result")
+    return result
+
+
+def _bitwise(operation: Callable) -> Callable:
+    def apply(x: Number, y: Number) -> int:
+        _integers(x, y)
+        return operation(x, y)
+    return apply
+
+
+def _shift_left(x: int, y: int) -> int:
+    if y < 0:
+        return x >> -y
+    return x << y
+
+
+def _complement(x: Number) -> int:
+    """\\ - bitwise complement"""
+    _integers(x, 0)
+    return ~x
+
+
+# (name, arity) -> Python function of the argument values
+FUNCTIONS = {
+    ('+', 2): lambda x, y: x + y,
+    ('-', 2): lambda x, y: x - y,
+    ('*', 2): lambda x, y: x * y,
+    ('/', 2): _divide,
+    ('//', 2): _int_divide,
+    ('mod', 2): _mod,
+    ('rem', 2): _rem,
+    ('min', 2): min,
+    ('max', 2): max,
+    ('**', 2): _power,
+    ('/\\', 2): _bitwise(lambda x, y: x & y),
+    ('\\/', 2): _bitwise(lambda x, y: x | y),
+    ('xor', 2): _bitwise(lambda x, y: x ^ y),
+    ('<<', 2): _bitwise(_shift_left),
+    ('>>', 2): _bitwise(lambda x, y: _shift_left(x, -y)),
+    ('-', 1): lambda x: -x,
+    ('abs', 1): abs,
+    ('\\', 1): _complement,
+}
+
+# Comparison predicates -> test of the two values
+COMPARISONS = {
+    '<': lambda x, y: x < y,
+    '>': lambda x, y: x > y,
+    '=<': lambda x, y: x <= y,
+    '>=': lambda x, y: x >= y,
+    '<>': lambda x, y: x != y,
+}
+
+# Raised while evaluating an expression that has no value
+EVALUATION_ERRORS = (EvaluationError, ArithmeticError, TypeError, ValueError)
+
+
+def evaluate(expr: Term) -> Number:
+    """Evaluate an expression term; raises EvaluationError if it has no value."""
+    expr = deref(expr)
+    
+    if isinstance(expr, Atom):
+        value = expr.value
+        if type(value) is int or type(value) is float:
+            return value
+        raise EvaluationError(f"Not a number: {expr}")
+    
+    elif isinstance(expr, Compound):
+        function = FUNCTIONS.get((expr.functor, len(expr.args)))
+        if function is None:
+            raise EvaluationError(f"Unknown function: {expr.functor}/{len(expr.args)}")
+        return function(*[evaluate(arg) for arg in expr.args])
+    
+    raise EvaluationError(f"Cannot evaluate: {expr}")
+
+
+def compile_expression(expr) -> Callable[[list], Number]:
+    """
+    Compile an expression template into a function of a clause frame.
+    
+    Slots read their value from the frame; parts without slots are
+    evaluated once, here.
+    """
+    if isinstance(expr, Slot):
+        index = expr.index
+        
+        def load(frame: list) -> Number:
+            term = frame[index]
+            if type(term) is Atom:
+                value = term.value
+                if type(value) is int or type(value) is float:
+                    return value
+            if term is None:
+                raise EvaluationError("Unbound variable")
+            return evaluate(term)  # Bound to a variable or an expression
+        return load
+    
+    if expr.ground:
+        try:
+            value = evaluate(expr)
+        except EVALUATION_ERRORS:
+            return lambda frame: evaluate(expr)  # Raises again when run
+        return lambda frame: value
+    
+    function = FUNCTIONS.get((expr.functor, len(expr.args))) if isinstance(expr, Compound) else None
+    if function is None:
+        def fail(frame: list) -> Number:
+            raise EvaluationError(f"Cannot evaluate: {expr}")
+        return fail
+    
+    args = [compile_expression(arg) for arg in expr.args]
+    if len(args) == 1:
+        arg = args[0]
+        return lambda frame: function(arg(frame))
+    
+    left, right = args
+    # The common operators are inlined, and so is a constant right operand
+    if expr.functor in ('+', '-', '*') and expr.args[1].ground and isinstance(expr.args[1], Atom):
+        value = expr.args[1].value
+        if type(value) is int or type(value) is float:
+            if expr.functor == '+':
+                return lambda frame: left(frame) + value
+            if expr.functor == '-':
+                return lambda frame: left(frame) - value
+            return lambda frame: left(frame) * value
+    if expr.functor == '+':
+        return lambda frame: left(frame) + right(frame)
+    if expr.functor == '-':
+        return lambda frame: left(frame) - right(frame)
+    if expr.functor == '*':
+        return lambda frame: left(frame) * right(frame)
+    return lambda frame: function(left(frame), right(frame))
+
+
+class Arithmetic:
+    """
+    A compiled (is X Expr) or comparison goal of a clause body.
+    
+    It takes the place of the goal in the clause's template, and runs on
+    the frame of the clause instance instead of on a built goal term.
+    cells is the number of terms a run builds: the value of an is goal.
+    """
+    __slots__ = ('goal', 'run', 'cells')
+    
+    def __init__(self, goal: Compound, run: Callable[[list, BindingStore], bool]):
+        self.goal = goal  # The goal template, for printing
+        self.run = run
+        self.cells = int(goal.functor == 'is')
+    
+    def __str__(self):
+        return str(self.goal)
+
+
+def compile_goal(goal, fresh: bool = False) -> Optional[Arithmetic]:
+    """
+    Compile an arithmetic goal template, or return None if it is not one.
+    
+    A goal (is X Expr) is compiled when X is a slot or a number. fresh
+    says that no term built before the goal runs holds X, so its slot
+    can simply be overwritten with the value, even when the goal runs
+    again after backtracking.
+    """
+    if not isinstance(goal, Compound) or len(goal.args) != 2:
+        return None
+    
+    if goal.functor in COMPARISONS:
+        test = COMPARISONS[goal.functor]
+        left = compile_expression(goal.args[0])
+        right = compile_expression(goal.args[1])
+        
+        def compare(frame: list, store: BindingStore) -> bool:
+            try:
+                return test(left(frame), right(frame))
+            except EVALUATION_ERRORS:
+                return False
+        return Arithmetic(goal, compare)
+    
+    if goal.functor != 'is':
+        return None
+    
+    target = goal.args[0]
+    expression = compile_expression(goal.args[1])
+    if isinstance(target, Slot):
+        index = target.index
+        if fresh:
+            def assign(frame: list, store: BindingStore) -> bool:
+                try:
+                    frame[index] = Atom(expression(frame))
+                except EVALUATION_ERRORS:
+                    return False
+                return True
+            return Arithmetic(goal, assign)
+        
+        def bind(frame: list, store: BindingStore) -> bool:
+            try:
+                value = Atom(expression(frame))
+            except EVALUATION_ERRORS:
+                return False
+            return unify(frame[index], value, store)
+        return Arithmetic(goal, bind)
+    
+    if isinstance(target, Atom):
+        def check(frame: list, store: BindingStore) -> bool:
+            try:
+                return unify(target, Atom(expression(frame)), store)
+            except EVALUATION_ERRORS:
+                return False
+        return Arithmetic(goal, check)
+    
+    return None
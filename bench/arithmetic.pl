@@ -0,0 +1,15 @@
+% Arithmetic programs for bench/arithmetic.py
+
+% (sum N 0 S): S is 1 + 2 + ... + N
+((sum 0 Acc Acc)).
+((sum N Acc S) (> N 0) (is Acc1 (+ Acc N)) (is N1 (- N 1)) (sum N1 Acc1 S)).
+
+% (collatz N S): S steps take N to 1
+((collatz 1 0)).
+((collatz N S) (> N 1) (is M (mod N 2)) (step M N N1) (collatz N1 S1) (is S (+ S1 1))).
+((step 0 N M) (is M (// N 2))).
+((step 1 N M) (is M (+ (* 3 N) 1))).
+
+% (collatzn N): the collatz steps of N, N-1, ..., 1
+((collatzn 0)).
+((collatzn N) (> N 0) (collatz N S) (is M (- N 1)) (collatzn M)).
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Arithmetic benchmark.
+Times loops dominated by is and comparisons on both engines.
+
+Usage: python bench/arithmetic.py [repeats]
+"""
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from wam import WamEngine
+
+DEFAULT_REPEATS = 5
+
+FILES = ['examples/factorial2.pl', 'bench/arithmetic.pl']
+QUERIES = [
+    '(fact2 300 X)',
+    '(sum 20000 0 S)',
+    '(collatzn 300)',
+]
+
+
+def load(engine_class):
+    """Return a REPL using engine_class with FILES consulted."""
+    repl = REPL(engine_class)
+    with redirect_stdout(io.StringIO()):
+        for filename in FILES:
+            repl._load_file(os.path.join(ROOT, filename))
+    return repl
+
+
+def run(repl, query, repeats):
+    """Run a query repeats times; return the best time."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in repl.engine.solve(parse_query(query)):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    
+    print(f"{'query':<20}{'solve':>11}{'wam':>11}")
+    for query in QUERIES:
+        row = ''
+        for engine_class in (InferenceEngine, WamEngine):
+            elapsed = run(load(engine_class), query, repeats)
+            row += f"{elapsed * 1000:9.1f}ms"
+        print(f"{query:<20}{row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Engine comparison benchmark.
+Runs the same queries through InferenceEngine and the WAM-style WamEngine,
+checks that both give the same answers in the same order, and prints the
+speedup. Exits with status 1 if the answers of any query differ.
+
+Usage: python bench/engines.py [repeats]
+"""
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from wam import WamEngine
+
+DEFAULT_REPEATS = 5
+
+# (files to load, query)
+WORKLOADS = [
+    (['family.pl'], '(sibling X Y)'),
+    (['examples/ancestors.pl'], '(ancestor X Y)'),
+    (['examples/factorial.pl'], '(fact 300 X)'),
+    (['examples/factorial2.pl'], '(fact2 300 X)'),
+    (['world/world.pl', 'world/world3.pl'], '(leftOf X Y)'),
+    (['world/world.pl', 'world/world3.pl'], '(smaller X Y)'),
+    (['world/world.pl', 'world/world3.pl'], '(sameShape X Y) (smaller X Y)'),
+    (['world/world.pl', 'world/world3.pl'], '(sameColor X Y) (shape X S1) (shape Y S2) (/= S1 S2)'),
+    (['bench/tail_loop.pl'], '(count 0 20000)'),
+]
+
+
+def load(engine_class, files):
+    """Return a REPL using engine_class with files consulted."""
+    repl = REPL(engine_class)
+    with redirect_stdout(io.StringIO()):
+        for filename in files:
+            repl._load_file(os.path.join(ROOT, filename))
+    return repl
+
+
+def run(repl, query, repeats):
+    """Run a query repeats times; return (best time, answers as text)."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        answers = [str(subst) for subst in repl.engine.solve(parse_query(query))]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, answers
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    
+    differ = []
+    print(f"{'query':<60} {'solve':>10} {'wam':>10} {'speedup':>8}")
+    for files, query in WORKLOADS:
+        solve_time, solve_answers = run(load(InferenceEngine, files), query, repeats)
+        wam_time, wam_answers = run(load(WamEngine, files), query, repeats)
+        
+        note = ""
+        if solve_answers != wam_answers:
+            note = "  ANSWERS DIFFER"
+            differ.append(query)
+        print(f"{query:<60} {solve_time * 1000:8.1f}ms {wam_time * 1000:8.1f}ms {solve_time / wam_time:7.1f}x{note}")
+    
+    if differ:
+        print(f"Answers differ: {', '.join(differ)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Clause indexing benchmark.
+Builds a Tarski world with many objects and times lookups of single
+objects by name, e.g. (position o123 P). With first-argument indexing
+each lookup only tries the matching clause.
+
+It then times queries that bind another argument, e.g. (color X red),
+with and without demand-driven indexing of those positions, and prints
+the index statistics of the engine.
+
+Usage: python bench/indexing.py [objects] [lookups]
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as database_module
+from database import Database, Clause
+from inference import InferenceEngine
+from parser import parse_query
+from terms import Atom, Compound, List as ListTerm
+
+DEFAULT_OBJECTS = 10000
+DEFAULT_LOOKUPS = 2000
+DEFAULT_REPEATS = 20
+JIT_WARMUP = 10  # Untimed calls before timing, enough to build the indexes
+
+SHAPES = ['cube', 'tetrahedron', 'dodecahedron']
+SIZES = ['small', 'medium', 'large']
+COLORS = ['red', 'yellow', 'purple', 'green', 'blue']
+
+
+def build_world(database: Database, objects: int):
+    """Add shape, size, color, weight and position facts for the objects."""
+    rng = random.Random(42)
+    for i in range(objects):
+        name = Atom(f"o{i}")
+        database.add_clause(Clause(Compound('object', (name,))))
+        database.add_clause(Clause(Compound('shape', (name, Atom(rng.choice(SHAPES))))))
+        database.add_clause(Clause(Compound('size', (name, Atom(rng.choice(SIZES))))))
+        database.add_clause(Clause(Compound('color', (name, Atom(rng.choice(COLORS))))))
+        database.add_clause(Clause(Compound('weight', (name, Atom(rng.randrange(1000))))))
+        database.add_clause(Clause(Compound('position', (name, ListTerm((Atom(i % 100), Atom(i // 100)))))))
+
+
+def time_queries(engine: InferenceEngine, queries: list) -> float:
+    """Run every query to exhaustion; return the elapsed seconds."""
+    start = time.perf_counter()
+    for query in queries:
+        for _ in engine.solve(query):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    objects = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_OBJECTS
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LOOKUPS
+    
+    database = Database()
+    build_world(database, objects)
+    engine = InferenceEngine(database)
+    print(f"{objects} objects, {len(database)} clauses")
+    
+    rng = random.Random(7)
+    names = [f"o{rng.randrange(objects)}" for _ in range(lookups)]
+    queries = [parse_query(f"(position {name} P)") for name in names]
+    elapsed = time_queries(engine, queries)
+    print(f"{lookups} x (position oN P): {elapsed * 1000:.1f}ms, "
+          f"{elapsed / lookups * 1e6:.1f}us per lookup")
+    
+    # Queries binding the second argument only
+    texts = ["(weight X 500)", "(color X red)", "(shape X cube) (size X large)"]
+    print(f"{'query':<32} {'first arg only':>15} {'JIT indexing':>15}")
+    results = {text: [] for text in texts}
+    for threshold in (math.inf, database_module.JIT_THRESHOLD):
+        database_module.JIT_THRESHOLD = threshold
+        database = Database()
+        build_world(database, objects)
+        engine = InferenceEngine(database)
+        for text in texts:
+            time_queries(engine, [parse_query(text)] * JIT_WARMUP)
+            elapsed = time_queries(engine, [parse_query(text)] * DEFAULT_REPEATS)
+            results[text].append(elapsed / DEFAULT_REPEATS)
+    for text, (before, after) in results.items():
+        print(f"{text:<32} {before * 1000:13.1f}ms {after * 1000:13.1f}ms")
+    
+    print("Index statistics:")
+    for name, stats in sorted(engine.statistics()['indexes'].items()):
+        print(f"  {name:<12} indexed on {stats['indexed']}, lookups {stats['lookups']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+% List programs for bench/occurs_check.py and bench/lists.py
+
+% (range N L): L is [N N-1 ... 1]
+((range 0 [])).
+((range N [N | T]) (> N 0) (is M (- N 1)) (range M T)).
+
+% (len L N): N is the length of L
+((len [] 0)).
+((len [_ | T] N) (len T M) (is N (+ M 1))).
+
+% Naive reverse: quadratic in the length of the list
+((app [] L L)).
+((app [H | T] L [H | R]) (app T L R)).
+((nrev [] [])).
+((nrev [H | T] R) (nrev T RT) (app RT [H] R)).
+
+% Accumulator reverse: every call passes the growing list along
+((rev L R) (rev L [] R)).
+((rev [] Acc Acc)).
+((rev [H | T] Acc R) (rev T [H | Acc] R)).
+
+% Wrap a list N times: wrap repeats L, so each call binds W to a term holding all of L
+((wrap L (box L))).
+((wrapn 0 L)).
+((wrapn N L) (> N 0) (wrap L W) (is M (- N 1)) (wrapn M L)).
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+List traversal benchmark.
+Walks list literals of growing length with len and rev from lists.pl on
+both engines. Each step matches [H | T] against what is left of one flat
+list, so the time per element should not grow with the length. The
+builtin length and reverse are timed on the same lists for comparison.
+
+Usage: python bench/lists.py [repeats]
+"""
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from wam import WamEngine
+
+DEFAULT_REPEATS = 3
+LENGTHS = [1000, 5000, 20000]
+QUERIES = ['(len {list} N)', '(rev {list} R)', '(length {list} N)', '(reverse {list} R)']
+
+
+def run(repl, query, repeats):
+    """Run a query repeats times; return the best time."""
+    goals = parse_query(query)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in repl.engine.solve(goals):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(LENGTHS)))
+    
+    header = ''.join(f"{length:>15}" for length in LENGTHS)
+    print(f"{'query':<20} {'engine':<6}{header}")
+    for query in QUERIES:
+        for name, engine_class in (('solve', InferenceEngine), ('wam', WamEngine)):
+            repl = REPL(engine_class)
+            with redirect_stdout(io.StringIO()):
+                repl._load_file(os.path.join(ROOT, 'bench', 'lists.pl'))
+            row = ''
+            for length in LENGTHS:
+                literal = '[' + ' '.join(str(i) for i in range(length)) + ']'
+                elapsed = run(repl, query.format(list=literal), repeats)
+                row += f"{elapsed * 1000:13.1f}ms"
+            print(f"{query.format(list='L'):<20} {name:<6}{row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Occurs check benchmark.
+Runs list programs from lists.pl with each occurs check mode on both
+engines, plus a run with 'auto' and only the wrap predicate switched off.
+
+Usage: python bench/occurs_check.py [repeats]
+"""
+
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from wam import WamEngine
+
+DEFAULT_REPEATS = 3
+
+QUERIES = [
+    '(range 300 L) (nrev L R)',
+    '(range 2000 L) (rev L R)',
+    '(range 1000 L) (wrapn 1000 L)',
+    '(range 2000 L) (wrapn 1000 L)',
+]
+
+# Column title -> (engine occurs check mode, per-predicate declarations)
+SETTINGS = [
+    ('full', ('full', [])),
+    ('auto', ('auto', [])),
+    ('off', ('off', [])),
+    ('auto+wrap off', ('auto', ['(occurs_check wrap 2 off).'])),
+]
+
+
+def load(engine_class, mode, declarations):
+    """Return a REPL with lists.pl consulted and the given occurs check settings."""
+    repl = REPL(engine_class, occurs_check=mode)
+    with redirect_stdout(io.StringIO()):
+        repl._load_file(os.path.join(ROOT, 'bench', 'lists.pl'))
+        for declaration in declarations:
+            repl._handle_clause(declaration[:-1])
+    return repl
+
+
+def run(repl, query, repeats):
+    """Run a query repeats times; return (best time, number of answers)."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        answers = list(repl.engine.solve(parse_query(query)))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(answers)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    
+    header = ''.join(f"{title:>15}" for title, _ in SETTINGS)
+    print(f"{'query':<32} {'engine':<6}{header}")
+    for query in QUERIES:
+        for name, engine_class in (('solve', InferenceEngine), ('wam', WamEngine)):
+            row = ''
+            counts = set()
+            for _, (mode, declarations) in SETTINGS:
+                elapsed, count = run(load(engine_class, mode, declarations), query, repeats)
+                counts.add(count)
+                row += f"{elapsed * 1000:13.1f}ms"
+            note = "" if len(counts) == 1 else "  ANSWERS DIFFER"
+            print(f"{query:<32} {name:<6}{row}{note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Profiler overhead benchmark.
+Runs queries through InferenceEngine with and without a Profiler, checks
+that the answers are the same and prints how much slower profiling is,
+and the peak memory of a run either way, so that profiling a deep
+recursion cannot quietly start using memory as it goes. The last
+workload joins two predicates of FACTS facts each.
+
+Usage: python bench/profiler.py [repeats] [facts]
+"""
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from profiler import Profiler
+
+DEFAULT_REPEATS = 5
+DEFAULT_FACTS = 20000
+
+# (files to load, query)
+WORKLOADS = [
+    (['family.pl'], '(sibling X Y)'),
+    (['examples/ancestors.pl'], '(ancestor X Y)'),
+    (['examples/factorial.pl'], '(fact 300 X)'),
+    (['world/world.pl', 'world/world3.pl'], '(sameShape X Y) (smaller X Y)'),
+    (['world/world.pl', 'world/world3.pl'], '(sameColor X Y) (shape X S1) (shape Y S2) (/= S1 S2)'),
+    (['bench/tail_loop.pl'], '(count 0 20000)'),
+    (['bench/tail_loop.pl'], '(countBack 0 2000)'),
+]
+
+
+def load(files, facts=0):
+    """Return a REPL with files consulted and, with facts, the fact base of the join workload."""
+    repl = REPL(InferenceEngine)
+    with redirect_stdout(io.StringIO()):
+        for filename in files:
+            repl._load_file(os.path.join(ROOT, filename))
+        for i in range(facts):
+            repl._handle_clause(f"(item {i} {i % 100})")
+            repl._handle_clause(f"(price {i % 100} {i})")
+        if facts:
+            repl._handle_clause("((cost I P) (item I G) (price G P))")
+    return repl
+
+
+def run(repl, query, repeats, profile):
+    """Run a query repeats times; return (best time, answers as text)."""
+    best = None
+    for _ in range(repeats):
+        repl.engine.profiler = Profiler() if profile else None
+        start = time.perf_counter()
+        answers = [str(subst) for subst in repl.engine.solve(parse_query(query))]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, answers
+
+
+def peak_memory(repl, query, profile):
+    """Run a query once under tracemalloc; return its peak memory in bytes."""
+    repl.engine.profiler = Profiler() if profile else None
+    tracemalloc.start()
+    try:
+        for _ in repl.engine.solve(parse_query(query)):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPEATS
+    facts = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_FACTS
+    workloads = [(files, query, 0) for files, query in WORKLOADS]
+    workloads.append(([], '(cost I 5)', facts))
+    
+    print(f"{'query':<60} {'plain':>10} {'profiled':>10} {'overhead':>8} {'peak':>10} {'profiled':>10}")
+    for files, query, fact_count in workloads:
+        repl = load(files, fact_count)
+        plain_time, plain_answers = run(repl, query, repeats, False)
+        profiled_time, profiled_answers = run(repl, query, repeats, True)
+        plain_peak = peak_memory(repl, query, False)
+        profiled_peak = peak_memory(repl, query, True)
+        
+        note = "" if plain_answers == profiled_answers else "  ANSWERS DIFFER"
+        print(f"{query:<60} {plain_time * 1000:8.1f}ms {profiled_time * 1000:8.1f}ms "
+              f"{profiled_time / plain_time:7.2f}x {plain_peak / 1024:8.0f}kB {profiled_peak / 1024:8.0f}kB{note}")
+
+
+if __name__ == "__main__":
+    main()
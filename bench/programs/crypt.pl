@@ -0,0 +1,15 @@
+% SEND + MORE = MONEY, one column at a time from the right:
+% each digit is picked from those left, and the sum of a column fixes the next
+
+((sel X [X | T] T)).
+((sel X [H | T] [H | R]) (sel X T R)).
+
+((crypt [S E N D M O R Y])
+    (sel D [0 1 2 3 4 5 6 7 8 9] R1) (sel E R1 R2)
+    (is S1 (+ D E)) (is Y (mod S1 10)) (is C1 (// S1 10)) (sel Y R2 R3)
+    (sel N R3 R4) (sel R R4 R5)
+    (is S2 (+ (+ N R) C1)) (is E (mod S2 10)) (is C2 (// S2 10))
+    (sel O R5 R6)
+    (is S3 (+ (+ E O) C2)) (is N (mod S3 10)) (is C3 (// S3 10))
+    (sel S R6 R7) (> S 0) (sel M R7 R8) (> M 0)
+    (is S4 (+ (+ S M) C3)) (is O (mod S4 10)) (is M (// S4 10))).
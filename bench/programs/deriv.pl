@@ -0,0 +1,21 @@
+% Symbolic differentiation: the ops8, divide10, log10 and times10 tests
+
+((d (+ U V) X (+ DU DV)) ! (d U X DU) (d V X DV)).
+((d (- U V) X (- DU DV)) ! (d U X DU) (d V X DV)).
+((d (* U V) X (+ (* DU V) (* U DV))) ! (d U X DU) (d V X DV)).
+((d (/ U V) X (/ (- (* DU V) (* U DV)) (^ V 2))) ! (d U X DU) (d V X DV)).
+((d (^ U N) X (* DU (* N (^ U N1)))) ! (number N) (is N1 (- N 1)) (d U X DU)).
+((d (- U) X (- DU)) ! (d U X DU)).
+((d (exp U) X (* (exp U) DU)) ! (d U X DU)).
+((d (log U) X (/ DU U)) ! (d U X DU)).
+((d X X 1) !).
+((d C X 0)).
+
+((ops8 D) (d (* (+ x 1) (* (+ (^ x 2) 2) (+ (^ x 3) 3))) x D)).
+((divide10 D) (d (/ (/ (/ (/ (/ (/ (/ (/ (/ (/ x x) x) x) x) x) x) x) x) x) x) x D)).
+((log10 D) (d (log (log (log (log (log (log (log (log (log (log x)))))))))) x D)).
+((times10 D) (d (* (* (* (* (* (* (* (* (* (* x x) x) x) x) x) x) x) x) x) x) x D)).
+
+% (bench N): the four tests N times
+((bench 0)).
+((bench N) (> N 0) (ops8 D1) (divide10 D2) (log10 D3) (times10 D4) (is M (- N 1)) (bench M)).
@@ -0,0 +1,9 @@
+% Towers of Hanoi: the moves taking N disks from A to B, as a difference list
+
+((hanoi 0 A B C Ms Ms)).
+((hanoi N A B C Ms0 Ms)
+    (> N 0) (is M (- N 1))
+    (hanoi M A C B Ms0 [(move A B) | Ms1])
+    (hanoi M C B A Ms1 Ms)).
+
+((moves N Count) (hanoi N a b c Ms []) (length Ms Count)).
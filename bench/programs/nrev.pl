@@ -0,0 +1,15 @@
+% Naive reverse of a 30 element list: 496 inferences per reverse
+
+((app [] L L)).
+((app [H | T] L [H | R]) (app T L R)).
+
+((nrev [] [])).
+((nrev [H | T] R) (nrev T RT) (app RT [H] R)).
+
+((range 0 [])).
+((range N [N | T]) (> N 0) (is M (- N 1)) (range M T)).
+
+% (bench N F): reverse the list N times, F is the first element of the last reverse
+((bench N F) (range 30 L) (loop N L F)).
+((loop 1 L F) (nrev L [F | _])).
+((loop N L F) (> N 1) (nrev L _) (is M (- N 1)) (loop M L F)).
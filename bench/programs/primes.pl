@@ -0,0 +1,15 @@
+% The primes up to a limit, by sieving a list of integers
+
+((primes Limit Ps) (integers 2 Limit Is) (sift Is Ps)).
+((count_primes Limit N) (primes Limit Ps) (length Ps N)).
+
+((integers Low High [Low | Rest]) (=< Low High) ! (is M (+ Low 1)) (integers M High Rest)).
+((integers Low High [])).
+
+((sift [] [])).
+((sift [I | Is] [I | Ps]) (remove I Is New) (sift New Ps)).
+
+% (remove P Is Nis): Nis is Is without the multiples of P
+((remove P [] [])).
+((remove P [I | Is] Nis) (is 0 (mod I P)) ! (remove P Is Nis)).
+((remove P [I | Is] [I | Nis]) (remove P Is Nis)).
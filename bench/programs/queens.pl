@@ -0,0 +1,13 @@
+% N queens: all the ways to put N queens on an N x N board
+
+((queens N Qs) (numlist 1 N Ns) (place Ns [] Qs)).
+
+((place [] Qs Qs)).
+((place Unplaced Safe Qs) (sel Q Unplaced Rest) (noattack Q Safe 1) (place Rest [Q | Safe] Qs)).
+
+((sel X [X | T] T)).
+((sel X [H | T] [H | R]) (sel X T R)).
+
+% (noattack Q Qs D): Q is on no diagonal of the queens Qs, the first D columns away
+((noattack Q [] D)).
+((noattack Q [Y | Ys] D) (<> Q (+ Y D)) (<> Q (- Y D)) (is D1 (+ D 1)) (noattack Q Ys D1)).
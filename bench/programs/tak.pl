@@ -0,0 +1,7 @@
+% Takeuchi's function: deep recursion with arithmetic
+
+((tak X Y Z A) (=< X Y) ! (= Z A)).
+((tak X Y Z A)
+    (is X1 (- X 1)) (is Y1 (- Y 1)) (is Z1 (- Z 1))
+    (tak X1 Y Z A1) (tak Y1 Z X A2) (tak Z1 X Y A3)
+    (tak A1 A2 A3 A)).
@@ -0,0 +1,30 @@
+% The zebra puzzle: who owns the zebra, and who drinks water?
+% A house is (h Color Nationality Pet Drink Smoke). Every unknown has its own
+% name: all the _ in a clause are one variable
+
+((right_of A B [B A | _])).
+((right_of A B [_ | Y]) (right_of A B Y)).
+
+((next_to A B [A B | _])).
+((next_to A B [B A | _])).
+((next_to A B [_ | Y]) (next_to A B Y)).
+
+((houses Hs)
+    (= Hs [(h X1 norwegian X2 X3 X4) X5 (h X6 X7 X8 milk X9) X10 X11])
+    (member (h red english X12 X13 X14) Hs)
+    (member (h X15 spanish dog X16 X17) Hs)
+    (member (h green X18 X19 coffee X20) Hs)
+    (member (h X21 ukrainian X22 tea X23) Hs)
+    (right_of (h green X24 X25 X26 X27) (h ivory X28 X29 X30 X31) Hs)
+    (member (h X32 X33 snails X34 winston) Hs)
+    (member (h yellow X35 X36 X37 kools) Hs)
+    (next_to (h X38 X39 X40 X41 chesterfield) (h X42 X43 fox X44 X45) Hs)
+    (next_to (h X46 X47 X48 X49 kools) (h X50 X51 horse X52 X53) Hs)
+    (member (h X54 X55 X56 orange_juice lucky) Hs)
+    (member (h X57 japanese X58 X59 parliament) Hs)
+    (next_to (h X60 norwegian X61 X62 X63) (h blue X64 X65 X66 X67) Hs)).
+
+((zebra Owner Drinker)
+    (houses Hs)
+    (member (h X68 Owner zebra X69 X70) Hs)
+    (member (h X71 Drinker X72 water X73) Hs)).
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Retract scaling benchmark.
+Adds N facts and retracts them one at a time, by value and in order
+through an unbound pattern, then churns a counter fact with
+assert/retract pairs. The time per operation should stay flat as N grows.
+
+Usage: python bench/retract.py [max_facts]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, Clause
+from terms import Atom, Variable, Compound
+
+DEFAULT_MAX_FACTS = 32000
+
+
+def fill(database: Database, count: int):
+    """Add (fact 0 ...) to (fact count-1 ...)."""
+    for i in range(count):
+        database.add_clause(Clause(Compound('fact', (Atom(i), Atom(f"v{i}")))))
+
+
+def time_per_op(count: int, action) -> float:
+    """Run action(database, count) on a filled database; return microseconds per fact."""
+    database = Database()
+    fill(database, count)
+    start = time.perf_counter()
+    action(database, count)
+    elapsed = time.perf_counter() - start
+    assert len(database) == 0
+    return elapsed / count * 1e6
+
+
+def retract_by_value(database: Database, count: int):
+    for i in range(count):
+        database.retract(Compound('fact', (Atom(i), Variable('V'))))
+
+
+def retract_in_order(database: Database, count: int):
+    for _ in range(count):
+        database.retract(Compound('fact', (Variable('N'), Variable('V'))))
+
+
+def churn(database: Database, count: int):
+    """Replace a counter fact count times, then remove the facts."""
+    database.add_clause(Clause(Compound('counter', (Atom(0),))))
+    for i in range(count):
+        database.retract(Compound('counter', (Variable('N'),)))
+        database.add_clause(Clause(Compound('counter', (Atom(i + 1),))))
+    database.retract(Compound('counter', (Variable('N'),)))
+    retract_in_order(database, count)
+
+
+def main():
+    max_facts = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MAX_FACTS
+    
+    print(f"{'facts':>8} {'by value':>12} {'in order':>12} {'churn':>12}   (us per fact)")
+    count = 1000
+    while count <= max_facts:
+        print(f"{count:>8} {time_per_op(count, retract_by_value):12.1f} "
+              f"{time_per_op(count, retract_in_order):12.1f} {time_per_op(count, churn):12.1f}")
+        count *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Classic Prolog benchmark suite.
+Runs the programs in bench/programs through InferenceEngine, checks their
+answers, and writes the median and 95th percentile times, LIPS and peak
+memory of each as JSON. With --compare, flags benchmarks that got slower
+or use more memory than in a baseline written by an earlier run.
+
+Usage: python bench/suite.py [--repeats N] [--output FILE] [--compare]
+                             [--baseline FILE] [--threshold PERCENT] [name ...]
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from repl import REPL
+from parser import parse_query
+from inference import InferenceEngine
+from counters import Counters
+
+DEFAULT_REPEATS = 10
+DEFAULT_THRESHOLD = 10.0  # Percent slower than the baseline that counts as a regression
+PROGRAMS = os.path.join(ROOT, 'bench', 'programs')
+BASELINE = os.path.join(ROOT, 'bench', 'baseline.json')
+
+# (name, file in bench/programs, query, first answer)
+BENCHMARKS = [
+    ('nrev', 'nrev.pl', '(bench 50 F)', '{F = 1}'),
+    ('queens', 'queens.pl', '(aggregate_all count (queens 8 Qs) N)', '{N = 92}'),
+    ('zebra', 'zebra.pl', '(zebra Owner Drinker)', '{Owner = japanese, Drinker = norwegian}'),
+    ('crypt', 'crypt.pl', '(crypt L)', '{L = [9 5 6 7 1 0 8 2]}'),
+    ('deriv', 'deriv.pl', '(bench 300)', '{}'),
+    ('tak', 'tak.pl', '(tak 15 10 5 A)', '{A = 10}'),
+    ('poly', 'poly.pl', '(poly 10 Size)', '{Size = 286}'),
+    ('primes', 'primes.pl', '(count_primes 1000 N)', '{N = 168}'),
+    ('query', 'query.pl', '(bench 20 N)', '{N = 5}'),
+    ('hanoi', 'hanoi.pl', '(moves 13 N)', '{N = 8191}'),
+]
+
+
+def load(filename):
+    """Return a REPL using InferenceEngine with a program from bench/programs consulted."""
+    repl = REPL(InferenceEngine)
+    with redirect_stdout(io.StringIO()):
+        repl._load_file(os.path.join(PROGRAMS, filename))
+    return repl
+
+
+def run(repl, query):
+    """Run a query to its last solution; return the time taken and the first answer as text."""
+    first = None
+    start = time.perf_counter()
+    for subst in repl.engine.solve(parse_query(query)):
+        if first is None:
+            first = str(subst)
+    return time.perf_counter() - start, first
+
+
+def measure(filename, query, expected, repeats):
+    """Run one benchmark: a checked warm-up, a counted run, the timed runs and a traced run."""
+    repl = load(filename)
+    _, answer = run(repl, query)
+    if answer != expected:
+        raise AssertionError(f"{query} answered {answer}, expected {expected}")
+    
+    repl.engine.counters = Counters()
+    run(repl, query)
+    inferences = repl.engine.counters.inferences
+    repl.engine.counters = None
+    
+    times = sorted(run(repl, query)[0] for _ in range(repeats))
+    
+    tracemalloc.start()
+    try:
+        run(repl, query)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    median = statistics.median(times)
+    return {
+        'query': query,
+        'median': median,
+        'p95': times[math.ceil(0.95 * len(times)) - 1],
+        'inferences': inferences,
+        'lips': inferences / median,
+        'peak_memory': peak,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print each benchmark against the baseline results; return the names of the regressions."""
+    limit = 1 + threshold / 100
+    regressions = []
+    print(f"\nAgainst the baseline (Python {baseline['python']}), flagging changes over {threshold:g}%:")
+    print(f"{'benchmark':<10}{'baseline':>12}{'now':>12}{'time':>9}{'memory':>9}")
+    for name, result in results.items():
+        before = baseline['benchmarks'].get(name)
+        if before is None:
+            print(f"{name:<10}{'-':>12}{result['median'] * 1000:10.1f}ms   (new)")
+            continue
+        time_ratio = result['median'] / before['median']
+        memory_ratio = result['peak_memory'] / before['peak_memory'] if before['peak_memory'] else 1.0
+        notes = []
+        if time_ratio > limit:
+            notes.append('SLOWER')
+        if memory_ratio > limit:
+            notes.append('MORE MEMORY')
+        if result['inferences'] != before['inferences']:
+            notes.append(f"inferences {before['inferences']} -> {result['inferences']}")
+        if time_ratio > limit or memory_ratio > limit:
+            regressions.append(name)
+        print(f"{name:<10}{before['median'] * 1000:10.1f}ms{result['median'] * 1000:10.1f}ms"
+              f"{time_ratio:8.2f}x{memory_ratio:8.2f}x  {' '.join(notes)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the classic Prolog benchmarks on InferenceEngine.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help="timed runs of each benchmark")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', action='store_true', help="flag regressions against the baseline")
+    parser.add_argument('--baseline', default=BASELINE,
+                        help="results file to compare with (default: bench/baseline.json)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="percent slower or bigger that counts as a regression")
+    args = parser.parse_args()
+    
+    unknown = set(args.names) - {name for name, *_ in BENCHMARKS}
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    
+    results = {}
+    print(f"{'benchmark':<10}{'median':>11}{'p95':>11}{'inferences':>12}{'LIPS':>11}{'peak':>10}")
+    for name, filename, query, expected in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+        result = results[name] = measure(filename, query, expected, args.repeats)
+        print(f"{name:<10}{result['median'] * 1000:9.1f}ms{result['p95'] * 1000:9.1f}ms"
+              f"{result['inferences']:>12,}{result['lips']:>11,.0f}{result['peak_memory'] / 1024:8.0f}kB")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'engine': 'InferenceEngine',
+                'python': platform.python_version(),
+                'repeats': args.repeats,
+                'benchmarks': results,
+            }, f, indent=2)
+            f.write('\n')
+    
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+% Counting loops for bench/tail_recursion.py
+
+% Tail-recursive: the recursive call is the last goal of the body
+((count N N)).
+((count I N) (< I N) (is I1 (+ I 1)) (count I1 N)).
+
+% Not tail-recursive: a goal after the recursive call keeps every frame alive
+((countBack N N)).
+((countBack I N) (< I N) (is I1 (+ I 1)) (countBack I1 N) (number I)).
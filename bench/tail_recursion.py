@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tail recursion memory benchmark.
+Runs a tail-recursive counting loop and samples the process memory while
+it runs. With last-call optimization the samples stay flat however many
+iterations the loop makes. The non-tail-recursive loop is run for
+comparison; its memory grows with every iteration.
+
+Usage: python bench/tail_recursion.py [iterations] [non_tail_iterations]
+"""
+
+import os
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repl import REPL
+from parser import parse_query
+
+DEFAULT_ITERATIONS = 1000000
+DEFAULT_NON_TAIL_ITERATIONS = 100000
+SAMPLE_INTERVAL = 1.0  # seconds
+
+
+def current_memory_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        # No /proc: fall back to the peak, which still shows growth
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_loop(repl: REPL, predicate: str, iterations: int):
+    """Run one counting loop, printing memory samples while it runs."""
+    print(f"({predicate} 0 {iterations})")
+    samples = []
+    done = threading.Event()
+    
+    def sample():
+        start = time.perf_counter()
+        while not done.wait(SAMPLE_INTERVAL):
+            memory = current_memory_mb()
+            samples.append(memory)
+            print(f"  {time.perf_counter() - start:6.1f}s  {memory:8.1f} MB")
+    
+    sampler = threading.Thread(target=sample, daemon=True)
+    start = time.perf_counter()
+    sampler.start()
+    solved = any(True for _ in repl.engine.solve(parse_query(f"({predicate} 0 {iterations})")))
+    done.set()
+    sampler.join()
+    elapsed = time.perf_counter() - start
+    
+    status = "yes" if solved else "no"
+    print(f"  {status} in {elapsed:.1f}s ({iterations / elapsed:,.0f} iterations/s)")
+    if samples:
+        print(f"  memory: first sample {samples[0]:.1f} MB, last {samples[-1]:.1f} MB, max {max(samples):.1f} MB")
+    print()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ITERATIONS
+    non_tail = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_NON_TAIL_ITERATIONS
+    
+    repl = REPL()
+    repl._load_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tail_loop.pl'))
+    print(f"Baseline memory: {current_memory_mb():.1f} MB")
+    print()
+    
+    run_loop(repl, 'count', iterations)
+    run_loop(repl, 'countBack', non_tail)
+
+
+if __name__ == "__main__":
+    main()
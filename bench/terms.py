@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Term representation benchmark.
+Builds a Tarski world (six facts per object, see indexing.py) and a table
+of records whose ground parts repeat, and reports the memory held by each
+database. Then times building, hashing and comparing ground terms that
+were built separately.
+
+Usage: python bench/terms.py [objects]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, Clause
+from terms import Atom, Variable, Compound, List as ListTerm
+from indexing import build_world
+
+DEFAULT_OBJECTS = 50000
+TERM_REPEATS = 200000
+
+
+def build_records(database: Database, count: int):
+    """Add (record I (date Y M D) [tags...]) facts with few distinct dates and tag lists."""
+    tags = [ListTerm(tuple(Atom(tag) for tag in combination))
+            for combination in (('new',), ('new', 'sale'), ('sale',), ('used', 'sale'))]
+    for i in range(count):
+        date = Compound('date', (Atom(2000 + i % 25), Atom(1 + i % 12), Atom(1 + i % 28)))
+        database.add_clause(Clause(Compound('record', (Atom(i), date, tags[i % len(tags)]))))
+
+
+def database_memory(build, count: int):
+    """Return (bytes allocated, clauses, seconds to build) for a database filled by build."""
+    tracemalloc.start()
+    database = Database()
+    build(database, count)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    clauses = len(database)
+    
+    # Time a second build (without tracing), once the first one is gone
+    del database
+    start = time.perf_counter()
+    build(Database(), count)
+    elapsed = time.perf_counter() - start
+    return allocated, clauses, elapsed
+
+
+def make_term(i: int):
+    """A small ground term, e.g. (position o7 [7 0])."""
+    return Compound('position', (Atom(f"o{i % 100}"), ListTerm((Atom(i % 100), Atom(0)))))
+
+
+def make_open_term(i: int):
+    """A small term with fresh variables, e.g. (position X [7 Y])."""
+    return Compound('position', (Variable('X'), ListTerm((Atom(i % 100), Variable('Y')))))
+
+
+def time_terms():
+    """Time building, hashing and comparing ground terms, and building open ones; microseconds per term."""
+    start = time.perf_counter()
+    first = [make_term(i) for i in range(TERM_REPEATS)]
+    build = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(TERM_REPEATS):
+        make_open_term(i)
+    build_open = time.perf_counter() - start
+    second = [make_term(i) for i in range(TERM_REPEATS)]
+    
+    start = time.perf_counter()
+    for term in first:
+        hash(term)
+    hashing = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for a, b in zip(first, second):
+        assert a == b
+    compare = time.perf_counter() - start
+    
+    scale = 1e6 / TERM_REPEATS
+    return build * scale, hashing * scale, compare * scale, build_open * scale
+
+
+def main():
+    objects = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_OBJECTS
+    
+    for name, build, count in (('world', build_world, objects), ('records', build_records, 6 * objects)):
+        allocated, clauses, elapsed = database_memory(build, count)
+        print(f"{name}: {clauses} clauses, {allocated / 2**20:.1f} MB, {allocated / clauses:.0f} bytes "
+              f"and {elapsed / clauses * 1e6:.1f}us per clause")
+    
+    build, hashing, compare, build_open = time_terms()
+    print(f"ground terms: build {build:.2f}us, hash {hashing:.2f}us, compare {compare:.2f}us")
+    print(f"terms with variables: build {build_open:.2f}us")
+
+
+if __name__ == "__main__":
+    main()
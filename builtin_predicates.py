@@ -1,16 +1,102 @@
 """
 Built-in predicates for microPROLOG.
 """
-from typing import Generator
-from terms import Term, Atom, Variable, Compound, List as ListTerm
-from unification import Substitution, unify
+import time
+from typing import Generator, Optional
+from terms import Term, Atom, Variable, Compound, List as ListTerm, EMPTY_LIST
+from unification import BindingStore, copy_resolved, copy_term, deref, unify, unifiable
+from database import ClauseList, clause_from_term, predicate_key
+from arithmetic import COMPARISONS, EVALUATION_ERRORS, evaluate
+from tabling import variant_key
+
+
+# Control constructs, with their arities. The engines run them as part of
+# the search rather than as builtins (see InferenceEngine._control and
+# ClauseCompiler.compile_control). A goal written ((G1) (G2) ...) parses
+# as a compound with the empty functor: the conjunction of G1, G2, ...
+CONTROL_CONSTRUCTS = {';': 2, '->': 2, '\\+': 1, 'not': 1, 'once': 1, 'ignore': 1}
+
+
+def is_control(goal: Term) -> bool:
+    """Check if a dereferenced goal is a control construct or a conjunction."""
+    return isinstance(goal, Compound) and (
+        goal.functor == '' or CONTROL_CONSTRUCTS.get(goal.functor) == len(goal.args))
+
+
+def standard_order_key(term: Term) -> tuple:
+    """
+    Return a key that sorts terms in the standard order of terms.
+    
+    Variables come first (oldest first), then numbers by value, atoms
+    alphabetically and compound terms by arity, name and arguments. A
+    list sorts as nested '[|]'/2 terms ending in the atom [].
+    """
+    term = deref(term)
+    if isinstance(term, Atom):
+        value = term.value
+        if isinstance(value, str):
+            return (3, value)
+        return (1, value, type(value) is int)  # 1.0 before 1
+    
+    elif isinstance(term, Variable):
+        return (0, term.serial)
+    
+    elif isinstance(term, Compound):
+        return (4, len(term.args), term.functor) + tuple(standard_order_key(arg) for arg in term.args)
+    
+    elif isinstance(term, ListTerm):
+        # The key of a tail is spliced in rather than nested, which sorts
+        # the same as nesting it and keeps long lists flat
+        key = []
+        while isinstance(term, ListTerm):
+            for elem in term.elements:
+                key.extend((4, 2, '[|]', standard_order_key(elem)))
+            term = deref(term.tail) if term.tail else None
+        key.extend((3, '[]') if term is None else standard_order_key(term))
+        return tuple(key)
+    
+    return (3, str(term))
+
+
+def _term_variables(term: Term, found: dict):
+    """Add the unbound variables of term to found (keyed by id), in order."""
+    pending = [term]  # Subterms still to look in, the next one last
+    while pending:
+        term = deref(pending.pop())
+        if isinstance(term, Variable):
+            found.setdefault(id(term), term)
+        elif isinstance(term, Compound) and not term.ground:
+            pending.extend(reversed(term.args))
+        elif isinstance(term, ListTerm) and not term.ground:
+            if term.tail:
+                pending.append(term.tail)
+            pending.extend(reversed(term.elements))
 
 
 class BuiltinRegistry:
-    """Registry of built-in predicates."""
+    """
+    Registry of built-in predicates.
+    
+    A builtin in ``builtins`` is deterministic: it returns True or False.
+    One in ``searches`` may succeed several times: it returns a generator
+    that yields the store once per solution, and the engine keeps it on
+    its choicepoint stack to ask for the next solution on backtracking.
+    Such generators must not hold a sub-search open across a yield, since
+    a cut can drop them at any time. A search may instead return True or
+    False for a call that can only succeed once, which leaves no
+    choicepoint.
     
-    def __init__(self):
+    Builtins that run goals (findall and the like) use the engine's
+    solutions(goal, store), a nested search that undoes its bindings when
+    it ends or is closed. The ones that change the database tell the
+    engine with clauses_changed(key).
+    """
+    
+    def __init__(self, engine=None):
+        self.engine = engine  # Runs the sub-searches of findall and the like
         self.builtins = {
+            'true': self._true,
+            'fail': self._fail,
             '=': self._unify_builtin,
             'is': self._arithmetic_eval,
             'atom': self._is_atom,
@@ -23,195 +109,761 @@ class BuiltinRegistry:
             '>=': self._greater_or_equal,
             '<>': self._not_equal,
             '/=': self._not_unifiable,
+            'findall': self._findall,
+            'forall': self._forall,
+            'aggregate_all': self._aggregate_all,
+            'msort': self._msort,
+            'sort': self._sort,
+            'sum_list': self._sum_list,
+            'max_list': self._max_list,
+            'numlist': self._numlist,
+            'assert': self._assertz,
+            'assertz': self._assertz,
+            'asserta': self._asserta,
+            'retractall': self._retractall,
+            'statistics': self._statistics,
+        }
+        self.searches = {
+            'bagof': self._bagof,
+            'setof': self._setof,
+            'aggregate': self._aggregate,
+            'append': self._append,
+            'member': self._member,
+            'length': self._length,
+            'nth0': self._nth0,
+            'nth1': self._nth1,
+            'reverse': self._reverse,
+            'retract': self._retract,
         }
     
     def is_builtin(self, functor: str) -> bool:
         """Check if functor is a built-in predicate."""
-        return functor in self.builtins
+        return functor in self.builtins or functor in self.searches
     
-    def evaluate(self, goal: Term, subst: Substitution) -> Generator[Substitution, None, None]:
+    def evaluate(self, goal: Term, store: BindingStore) -> bool:
         """
         Evaluate built-in predicate.
         
-        Yields:
-            Substitution (success) or nothing (failure)
+        Returns:
+            True on success, with any bindings made left in store. On
+            failure the caller undoes the bindings by backtracking.
         """
         if not isinstance(goal, Compound):
-            return
+            return False
         
         functor = goal.functor
         if functor in self.builtins:
-            yield from self.builtins[functor](goal.args, subst)
+            return self.builtins[functor](goal.args, store)
+        return False
+    
+    def _true(self, args: tuple, store: BindingStore) -> bool:
+        """(true) - succeed"""
+        return not args
+    
+    def _fail(self, args: tuple, store: BindingStore) -> bool:
+        """(fail) - fail"""
+        return False
     
-    def _unify_builtin(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _unify_builtin(self, args: tuple, store: BindingStore) -> bool:
         """(= X Y) - unify X and Y"""
         if len(args) != 2:
-            return
+            return False
         
-        new_subst = unify(args[0], args[1], subst)
-        if new_subst is not None:
-            yield new_subst
+        return unify(args[0], args[1], store)
     
-    def _arithmetic_eval(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _arithmetic_eval(self, args: tuple, store: BindingStore) -> bool:
         """(is X Expr) - evaluate arithmetic expression and unify with X"""
         if len(args) != 2:
-            return
+            return False
+        
+        try:
+            result = evaluate(args[1])
+        except EVALUATION_ERRORS:
+            return False  # Evaluation failed
+        
+        # Unify with first argument
+        return unify(args[0], Atom(result), store)
+    
+    def _compare(self, args: tuple, test) -> bool:
+        """Evaluate both arguments and compare the values."""
+        if len(args) != 2:
+            return False
         
         try:
-            # Evaluate the expression
-            expr = subst.apply(args[1])
-            result = self._eval_arithmetic(expr, subst)
-            
-            # Unify with first argument
-            new_subst = unify(args[0], Atom(result), subst)
-            if new_subst is not None:
-                yield new_subst
-        except:
-            pass  # Evaluation failed
-    
-    def _eval_arithmetic(self, expr: Term, subst: Substitution) -> float:
-        """Evaluate an arithmetic expression."""
-        expr = subst.apply(expr)
-        
-        if isinstance(expr, Atom):
-            if isinstance(expr.value, (int, float)):
-                return expr.value
-            raise ValueError(f"Not a number: {expr}")
-        
-        elif isinstance(expr, Compound):
-            if expr.functor == '+' and len(expr.args) == 2:
-                left = self._eval_arithmetic(expr.args[0], subst)
-                right = self._eval_arithmetic(expr.args[1], subst)
-                return left + right
-            
-            elif expr.functor == '-' and len(expr.args) == 2:
-                left = self._eval_arithmetic(expr.args[0], subst)
-                right = self._eval_arithmetic(expr.args[1], subst)
-                return left - right
-            
-            elif expr.functor == '*' and len(expr.args) == 2:
-                left = self._eval_arithmetic(expr.args[0], subst)
-                right = self._eval_arithmetic(expr.args[1], subst)
-                return left * right
-            
-            elif expr.functor == '/' and len(expr.args) == 2:
-                left = self._eval_arithmetic(expr.args[0], subst)
-                right = self._eval_arithmetic(expr.args[1], subst)
-                if right == 0:
-                    raise ValueError("Division by zero")
-                return left / right
-            
-            raise ValueError(f"Unknown operator: {expr.functor}")
-        
-        raise ValueError(f"Cannot evaluate: {expr}")
-    
-    def _is_atom(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+            return test(evaluate(args[0]), evaluate(args[1]))
+        except EVALUATION_ERRORS:
+            return False  # Evaluation failed
+    
+    def _is_atom(self, args: tuple, store: BindingStore) -> bool:
         """(atom X) - check if X is an atom"""
         if len(args) != 1:
-            return
+            return False
         
-        term = subst.apply(args[0])
-        if isinstance(term, Atom) and isinstance(term.value, str):
-            yield subst
+        term = deref(args[0])
+        return isinstance(term, Atom) and isinstance(term.value, str)
     
-    def _is_number(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _is_number(self, args: tuple, store: BindingStore) -> bool:
         """(number X) - check if X is a number"""
         if len(args) != 1:
-            return
+            return False
         
-        term = subst.apply(args[0])
-        if isinstance(term, Atom) and isinstance(term.value, (int, float)):
-            yield subst
+        term = deref(args[0])
+        return isinstance(term, Atom) and isinstance(term.value, (int, float))
     
-    def _is_var(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _is_var(self, args: tuple, store: BindingStore) -> bool:
         """(var X) - check if X is an unbound variable"""
         if len(args) != 1:
-            return
+            return False
         
-        term = subst.apply(args[0])
-        if isinstance(term, Variable):
-            yield subst
+        term = deref(args[0])
+        return isinstance(term, Variable)
     
-    def _is_nonvar(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _is_nonvar(self, args: tuple, store: BindingStore) -> bool:
         """(nonvar X) - check if X is not an unbound variable"""
         if len(args) != 1:
-            return
+            return False
         
-        term = subst.apply(args[0])
-        if not isinstance(term, Variable):
-            yield subst
+        term = deref(args[0])
+        return not isinstance(term, Variable)
     
-    def _less_than(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
+    def _less_than(self, args: tuple, store: BindingStore) -> bool:
         """(< X Y) - check if X is less than Y"""
+        return self._compare(args, COMPARISONS['<'])
+    
+    def _greater_than(self, args: tuple, store: BindingStore) -> bool:
+        """(> X Y) - check if X is greater than Y"""
+        return self._compare(args, COMPARISONS['>'])
+    
+    def _less_or_equal(self, args: tuple, store: BindingStore) -> bool:
+        """(=< X Y) - check if X is less than or equal to Y"""
+        return self._compare(args, COMPARISONS['=<'])
+    
+    def _greater_or_equal(self, args: tuple, store: BindingStore) -> bool:
+        """(>= X Y) - check if X is greater than or equal to Y"""
+        return self._compare(args, COMPARISONS['>='])
+    
+    def _not_equal(self, args: tuple, store: BindingStore) -> bool:
+        """(<> X Y) - check if X is arithmetically not equal to Y"""
+        return self._compare(args, COMPARISONS['<>'])
+    
+    def _not_unifiable(self, args: tuple, store: BindingStore) -> bool:
+        """(/= X Y) - check if X and Y cannot be unified"""
         if len(args) != 2:
-            return
+            return False
         
-        try:
-            left = self._eval_arithmetic(args[0], subst)
-            right = self._eval_arithmetic(args[1], subst)
-            if left < right:
-                yield subst
-        except:
-            pass  # Evaluation failed
-    
-    def _greater_than(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
-        """(> X Y) - check if X is greater than Y"""
+        return not unifiable(args[0], args[1], store)
+    
+    # All solutions
+    
+    def _succeeds(self, goal: Term, store: BindingStore) -> bool:
+        """Check whether goal has a solution; its bindings are undone."""
+        solutions = self.engine.solutions(goal, store)
+        found = next(solutions, None) is not None
+        solutions.close()
+        return found
+    
+    def _findall(self, args: tuple, store: BindingStore) -> bool:
+        """(findall Template Goal List) - List holds a copy of Template for each solution of Goal"""
+        if len(args) != 3:
+            return False
+        
+        template = args[0]
+        results = [copy_resolved(template) for _ in self.engine.solutions(args[1], store)]
+        return unify(args[2], ListTerm(tuple(results)), store)
+    
+    def _forall(self, args: tuple, store: BindingStore) -> bool:
+        """(forall Condition Action) - Action succeeds for every solution of Condition"""
         if len(args) != 2:
+            return False
+        
+        solutions = self.engine.solutions(args[0], store)
+        try:
+            for _ in solutions:
+                if not self._succeeds(args[1], store):
+                    return False
+            return True
+        finally:
+            solutions.close()
+    
+    def _bagof(self, args: tuple, store: BindingStore, sort: bool = False) -> Generator[BindingStore, None, None]:
+        """
+        (bagof Template Goal List) - like findall, but fails without
+        solutions, and gives one List per binding of the variables of Goal
+        that are free: neither in Template nor marked with (^ Var Goal).
+        """
+        if len(args) != 3:
             return
         
+        template, goal, result = args
+        witness, goal = _free_variables(template, goal)
+        
+        # Group the solutions by the values of the free variables, copied
+        # together with the template so that they share their variables
+        groups = {}
+        for _ in self.engine.solutions(goal, store):
+            mapping = {}
+            values = copy_resolved(witness, mapping)
+            key = variant_key(values)
+            if key not in groups:
+                groups[key] = []
+            groups[key].append((values, copy_resolved(template, mapping)))
+        
+        mark = store.mark()
+        for group in sorted(groups.values(), key=lambda group: standard_order_key(group[0][0])):
+            if all(unify(witness, values, store) for values, _ in group):
+                items = [item for _, item in group]
+                if sort:
+                    items = _sorted_unique(items)
+                if unify(result, ListTerm(tuple(items)), store):
+                    yield store
+            store.undo_to(mark)
+    
+    def _setof(self, args: tuple, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """(setof Template Goal List) - bagof with each List sorted and without duplicates"""
+        return self._bagof(args, store, sort=True)
+    
+    # Aggregation
+    
+    def _aggregate_all(self, args: tuple, store: BindingStore) -> bool:
+        """
+        (aggregate_all Spec Goal Result) - fold the solutions of Goal as
+        they are found: Spec is count, (count), (count Expr), (sum Expr),
+        (max Expr), (min Expr), (max Expr Witness), (min Expr Witness),
+        (bag Template) or (set Template)
+        """
+        if len(args) != 3:
+            return False
+        
+        aggregate = Aggregate.from_spec(args[0])
+        if aggregate is None:
+            return False
+        
+        solutions = self.engine.solutions(args[1], store)
         try:
-            left = self._eval_arithmetic(args[0], subst)
-            right = self._eval_arithmetic(args[1], subst)
-            if left > right:
-                yield subst
-        except:
-            pass  # Evaluation failed
-    
-    def _less_or_equal(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
-        """(=< X Y) - check if X is less than or equal to Y"""
-        if len(args) != 2:
+            for _ in solutions:
+                aggregate.add()
+        except EVALUATION_ERRORS:
+            return False
+        finally:
+            solutions.close()
+        
+        result = aggregate.result()
+        return result is not None and unify(args[2], result, store)
+    
+    def _aggregate(self, args: tuple, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """
+        (aggregate Spec Goal Result) - aggregate_all for each binding of the
+        free variables of Goal, as bagof groups them; fails without solutions
+        """
+        if len(args) != 3:
+            return
+        
+        spec = deref(args[0])
+        if Aggregate.from_spec(spec) is None:
             return
+        witness, goal = _free_variables(spec, args[1])
         
+        # One running aggregate per group, not a list of solutions
+        groups = {}
+        solutions = self.engine.solutions(goal, store)
         try:
-            left = self._eval_arithmetic(args[0], subst)
-            right = self._eval_arithmetic(args[1], subst)
-            if left <= right:
-                yield subst
-        except:
-            pass  # Evaluation failed
-    
-    def _greater_or_equal(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
-        """(>= X Y) - check if X is greater than or equal to Y"""
+            for _ in solutions:
+                key = variant_key(witness)
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = (copy_resolved(witness), Aggregate.from_spec(spec))
+                group[1].add()
+        except EVALUATION_ERRORS:
+            return
+        finally:
+            solutions.close()
+        
+        mark = store.mark()
+        for values, aggregate in sorted(groups.values(), key=lambda group: standard_order_key(group[0])):
+            result = aggregate.result()
+            if result is not None and unify(witness, values, store) and unify(args[2], result, store):
+                yield store
+            store.undo_to(mark)
+    
+    # Lists
+    #
+    # These work on the tuples of terms.List rather than cell by cell.
+    # The ones in searches return True or False when the call can only
+    # succeed once, and a generator of solutions otherwise. They bind
+    # nothing before returning the generator, so that every binding is
+    # made under the generator's choicepoint.
+    
+    def _append(self, args: tuple, store: BindingStore):
+        """(append X Y Z) - Z is the elements of X followed by Y"""
+        if len(args) != 3:
+            return False
+        
+        first, second, whole = args
+        elements, end = _list_parts(first)
+        if end is None:
+            return unify(whole, _make_list(elements, second), store)
+        if not isinstance(end, Variable):
+            return False
+        
+        whole_elements, whole_end = _list_parts(whole)
+        if whole_end is None:
+            second_elements, second_end = _list_parts(second)
+            if second_end is None:
+                # Both lengths are known, so there is one split
+                split = len(whole_elements) - len(second_elements)
+                return split >= 0 and (unify(first, ListTerm(tuple(whole_elements[:split])), store) and
+                                       unify(second, ListTerm(tuple(whole_elements[split:])), store))
+            return self._append_splits(first, second, whole_elements, len(elements), store)
+        if not isinstance(whole_end, Variable):
+            return False
+        return self._append_lengths(first, second, whole, len(elements), store)
+    
+    def _append_splits(self, first: Term, second: Term, elements: list, start: int,
+                       store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Split a proper list in every way, the shortest first part first."""
+        mark = store.mark()
+        for split in range(start, len(elements) + 1):
+            if (unify(first, ListTerm(tuple(elements[:split])), store) and
+                    unify(second, _make_list(elements[split:], None), store)):
+                yield store
+            store.undo_to(mark)
+    
+    def _append_lengths(self, first: Term, second: Term, whole: Term, start: int,
+                        store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Try every length of first from start up; endless if whole is partial too."""
+        mark = store.mark()
+        length = start
+        while True:
+            prefix = _fresh_variables(length)
+            if unify(first, ListTerm(prefix), store) and unify(whole, _make_list(prefix, second), store):
+                yield store
+            store.undo_to(mark)
+            length += 1
+    
+    def _member(self, args: tuple, store: BindingStore):
+        """(member X List) - X is an element of List"""
+        if len(args) != 2:
+            return False
+        
+        elements, end = _list_parts(args[1])
+        if end is None and not elements:
+            return False
+        if end is not None and not isinstance(end, Variable):
+            return False
+        return self._members(args[0], elements, end, store)
+    
+    def _members(self, item: Term, elements: list, end: Optional[Variable],
+                 store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Unify item with each element in turn, then place it past a partial list's end."""
+        mark = store.mark()
+        for elem in elements:
+            if unify(item, elem, store):
+                yield store
+            store.undo_to(mark)
+        if end is None:
+            return
+        length = 0
+        while True:
+            if unify(end, ListTerm(_fresh_variables(length) + (item,), Variable('_')), store):
+                yield store
+            store.undo_to(mark)
+            length += 1
+    
+    def _length(self, args: tuple, store: BindingStore):
+        """(length List N) - List has N elements"""
         if len(args) != 2:
+            return False
+        
+        elements, end = _list_parts(args[0])
+        count = deref(args[1])
+        if not (isinstance(count, Variable) or _is_integer(count)):
+            return False
+        if end is None:
+            return unify(count, Atom(len(elements)), store)
+        if not isinstance(end, Variable):
+            return False
+        if isinstance(count, Atom):
+            extra = count.value - len(elements)
+            return extra >= 0 and unify(end, ListTerm(_fresh_variables(extra)), store)
+        return self._lengths(end, count, len(elements), store)
+    
+    def _lengths(self, end: Variable, count: Variable, start: int,
+                 store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Close a partial list with ever more elements."""
+        mark = store.mark()
+        length = start
+        while True:
+            if (unify(end, ListTerm(_fresh_variables(length - start)), store) and
+                    unify(count, Atom(length), store)):
+                yield store
+            store.undo_to(mark)
+            length += 1
+    
+    def _nth0(self, args: tuple, store: BindingStore, base: int = 0):
+        """(nth0 Index List Elem) - Elem is at Index in List, counting from 0"""
+        if len(args) != 3:
+            return False
+        
+        index, items, item = args
+        index = deref(index)
+        elements, end = _list_parts(items)
+        if end is not None and not isinstance(end, Variable):
+            return False
+        
+        if isinstance(index, Variable):
+            return self._nths(index, elements, end, item, base, store)
+        if not _is_integer(index) or index.value < base:
+            return False
+        position = index.value - base
+        if position < len(elements):
+            return unify(item, elements[position], store)
+        if end is None:
+            return False
+        padding = _fresh_variables(position - len(elements))
+        return unify(end, ListTerm(padding + (item,), Variable('_')), store)
+    
+    def _nth1(self, args: tuple, store: BindingStore):
+        """(nth1 Index List Elem) - Elem is at Index in List, counting from 1"""
+        return self._nth0(args, store, base=1)
+    
+    def _nths(self, index: Variable, elements: list, end: Optional[Variable], item: Term, base: int,
+              store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Enumerate the positions of item, like _members."""
+        mark = store.mark()
+        for position, elem in enumerate(elements):
+            if unify(item, elem, store) and unify(index, Atom(position + base), store):
+                yield store
+            store.undo_to(mark)
+        if end is None:
             return
+        position = len(elements)
+        while True:
+            padding = _fresh_variables(position - len(elements))
+            if (unify(end, ListTerm(padding + (item,), Variable('_')), store) and
+                    unify(index, Atom(position + base), store)):
+                yield store
+            store.undo_to(mark)
+            position += 1
+    
+    def _reverse(self, args: tuple, store: BindingStore):
+        """(reverse List Reversed) - Reversed has the elements of List in reverse order"""
+        if len(args) != 2:
+            return False
         
+        elements, end = _list_parts(args[0])
+        if end is None:
+            return unify(args[1], ListTerm(tuple(reversed(elements))), store)
+        reversed_elements, reversed_end = _list_parts(args[1])
+        if reversed_end is None:
+            return unify(args[0], ListTerm(tuple(reversed(reversed_elements))), store)
+        if not (isinstance(end, Variable) and isinstance(reversed_end, Variable)):
+            return False
+        return self._reversals(args[0], args[1], max(len(elements), len(reversed_elements)), store)
+    
+    def _reversals(self, items: Term, reversed_items: Term, start: int,
+                   store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Try both partial lists at every length from start up."""
+        mark = store.mark()
+        length = start
+        while True:
+            elements = _fresh_variables(length)
+            if (unify(items, ListTerm(elements), store) and
+                    unify(reversed_items, ListTerm(elements[::-1]), store)):
+                yield store
+            store.undo_to(mark)
+            length += 1
+    
+    def _msort(self, args: tuple, store: BindingStore) -> bool:
+        """(msort List Sorted) - Sorted is List in the standard order, duplicates kept"""
+        if len(args) != 2:
+            return False
+        
+        elements, end = _list_parts(args[0])
+        if end is not None:
+            return False
+        return unify(args[1], ListTerm(tuple(sorted(elements, key=standard_order_key))), store)
+    
+    def _sort(self, args: tuple, store: BindingStore) -> bool:
+        """(sort List Sorted) - Sorted is List in the standard order without duplicates"""
+        if len(args) != 2:
+            return False
+        
+        elements, end = _list_parts(args[0])
+        if end is not None:
+            return False
+        return unify(args[1], ListTerm(tuple(_sorted_unique(elements))), store)
+    
+    def _sum_list(self, args: tuple, store: BindingStore) -> bool:
+        """(sum_list List Sum) - Sum is the sum of the values of the elements of List"""
+        if len(args) != 2:
+            return False
+        
+        elements, end = _list_parts(args[0])
+        if end is not None:
+            return False
         try:
-            left = self._eval_arithmetic(args[0], subst)
-            right = self._eval_arithmetic(args[1], subst)
-            if left >= right:
-                yield subst
-        except:
-            pass  # Evaluation failed
-    
-    def _not_equal(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
-        """(<> X Y) - check if X is arithmetically not equal to Y"""
+            total = sum(evaluate(elem) for elem in elements)
+        except EVALUATION_ERRORS:
+            return False
+        return unify(args[1], Atom(total), store)
+    
+    def _max_list(self, args: tuple, store: BindingStore) -> bool:
+        """(max_list List Max) - Max is the largest value of the elements of List"""
         if len(args) != 2:
-            return
+            return False
         
+        elements, end = _list_parts(args[0])
+        if end is not None or not elements:
+            return False
         try:
-            left = self._eval_arithmetic(args[0], subst)
-            right = self._eval_arithmetic(args[1], subst)
-            if left != right:
-                yield subst
-        except:
-            pass  # Evaluation failed
-    
-    def _not_unifiable(self, args: tuple, subst: Substitution) -> Generator[Substitution, None, None]:
-        """(/= X Y) - check if X and Y cannot be unified"""
+            largest = max(evaluate(elem) for elem in elements)
+        except EVALUATION_ERRORS:
+            return False
+        return unify(args[1], Atom(largest), store)
+    
+    def _numlist(self, args: tuple, store: BindingStore) -> bool:
+        """(numlist Low High List) - List is [Low Low+1 ... High]"""
+        if len(args) != 3:
+            return False
+        
+        low, high = deref(args[0]), deref(args[1])
+        if not (_is_integer(low) and _is_integer(high)) or low.value > high.value:
+            return False
+        numbers = tuple(Atom(n) for n in range(low.value, high.value + 1))
+        return unify(args[2], ListTerm(numbers), store)
+    
+    # Database
+    
+    def _asserta(self, args: tuple, store: BindingStore, first: bool = True) -> bool:
+        """(asserta Clause) - add Clause before the clauses of its predicate"""
+        if len(args) != 1:
+            return False
+        
+        # The clause keeps the current values of its variables
+        clause = clause_from_term(copy_resolved(args[0]))
+        key = predicate_key(clause.head)
+        if key is None or not isinstance(key[0], str):
+            return False  # Not a callable head
+        self.engine.database.add_clause(clause, first)
+        self.engine.clauses_changed(key)
+        return True
+    
+    def _assertz(self, args: tuple, store: BindingStore) -> bool:
+        """(assertz Clause) or (assert Clause) - add Clause after the clauses of its predicate"""
+        return self._asserta(args, store, first=False)
+    
+    def _retract(self, args: tuple, store: BindingStore):
+        """
+        (retract Clause) - remove a clause that unifies with Clause, a fact
+        or ((Head) Body...); removes the next one on backtracking
+        """
+        if len(args) != 1:
+            return False
+        
+        pattern = clause_from_term(deref(args[0]))
+        head = deref(pattern.head)
+        if predicate_key(head) is None:
+            return False
+        
+        # Only the clauses there are now, as for a call
+        clauses = self.engine.database.get_clauses(head)
+        return self._retractions(head, pattern.body, clauses, len(clauses), store)
+    
+    def _retractions(self, head: Term, body: tuple, clauses: ClauseList, end: int,
+                     store: BindingStore) -> Generator[BindingStore, None, None]:
+        """
+        Erase the clauses of clauses[:end] that unify with head and body, one
+        per solution. A body of one goal also matches a longer body as the
+        conjunction ((G1) (G2)...), so ((p X) B) matches any rule for p.
+        """
+        database = self.engine.database
+        key = predicate_key(head)
+        mark = store.mark()
+        for i in range(clauses.start, end):
+            clause = clauses[i]
+            if clause.erased:
+                continue
+            if len(clause.body) == len(body):
+                pairs = zip(body, clause.body)
+            elif len(body) == 1 and clause.body:
+                pairs = ((body[0], Compound('', tuple(clause.body))),)
+            else:
+                continue
+            variables = {}
+            if unify(head, copy_term(clause.head, variables), store) and all(
+                    unify(goal, copy_term(clause_goal, variables), store)
+                    for goal, clause_goal in pairs):
+                database.erase(clause)
+                self.engine.clauses_changed(key)
+                yield store
+            store.undo_to(mark)
+    
+    def _retractall(self, args: tuple, store: BindingStore) -> bool:
+        """(retractall Head) - remove every clause whose head unifies with Head"""
+        if len(args) != 1:
+            return False
+        
+        head = deref(args[0])
+        key = predicate_key(head)
+        if key is None:
+            return False
+        
+        database = self.engine.database
+        clauses = database.get_clauses(head)
+        for i in range(clauses.start, len(clauses)):
+            clause = clauses[i]
+            if not clause.erased and unifiable(head, copy_term(clause.head), store):
+                database.erase(clause)
+                self.engine.clauses_changed(key)
+        return True
+    
+    # Statistics
+    
+    def _statistics(self, args: tuple, store: BindingStore) -> bool:
+        """
+        (statistics Key Value) - Value is the engine's counter Key (see
+        counters.Counters), or for cputime the process's CPU seconds
+        """
         if len(args) != 2:
-            return
+            return False
         
-        new_subst = unify(args[0], args[1], subst)
-        if new_subst is None:
-            # Unification failed - they are not unifiable
-            yield subst
+        key = deref(args[0])
+        if not isinstance(key, Atom):
+            return False
+        if key.value == 'cputime':
+            return unify(args[1], Atom(time.process_time()), store)
+        
+        counters = self.engine.counters
+        if counters is None or key.value not in counters.__slots__:
+            return False  # Counting is off, or no such counter
+        return unify(args[1], Atom(getattr(counters, key.value)), store)
+
+
+def _free_variables(template: Term, goal: Term) -> tuple:
+    """
+    Return the free variables of goal as a list term, and goal without
+    its (^ Var Goal) wrappers. Variables of template or marked with ^
+    are not free.
+    """
+    bound = {}
+    _term_variables(template, bound)
+    goal = deref(goal)
+    while isinstance(goal, Compound) and goal.functor == '^' and len(goal.args) == 2:
+        _term_variables(goal.args[0], bound)
+        goal = deref(goal.args[1])
+    free = {}
+    _term_variables(goal, free)
+    return ListTerm(tuple(var for key, var in free.items() if key not in bound)), goal
+
+
+def _sorted_unique(terms: list) -> list:
+    """Sort terms in standard order, dropping duplicates."""
+    keyed = sorted(((standard_order_key(term), term) for term in terms), key=lambda pair: pair[0])
+    unique = []
+    last = None
+    for key, term in keyed:
+        if key != last or not unique:
+            unique.append(term)
+            last = key
+    return unique
+
+
+def _list_parts(term: Term) -> tuple:
+    """
+    Return the elements of a list and what ends it: None for a proper
+    list, an unbound variable for a partial list, or any other term if
+    term is not a list.
+    """
+    elements = []
+    term = deref(term)
+    while isinstance(term, ListTerm):
+        elements.extend(term.items[term.start:])
+        if not term.tail:
+            return elements, None
+        term = deref(term.tail)
+    return elements, term
+
+
+def _make_list(elements, tail: Term) -> Term:
+    """Return the list of elements followed by tail (None for [])."""
+    if tail is not None:
+        tail = deref(tail)
+        if isinstance(tail, ListTerm) and not tail.size and not tail.tail:
+            tail = None  # The empty list
+    if not elements:
+        return EMPTY_LIST if tail is None else tail
+    return ListTerm(tuple(elements), tail)
+
+
+def _fresh_variables(count: int) -> tuple:
+    """Return a tuple of count new variables."""
+    return tuple(Variable('_') for _ in range(count))
+
+
+def _is_integer(term: Term) -> bool:
+    """Check if a dereferenced term is an integer."""
+    return isinstance(term, Atom) and type(term.value) is int
+
+
+class Aggregate:
+    """
+    The running result of an aggregation, for aggregate_all and aggregate.
+    
+    add() is called once per solution, while the solution's bindings are
+    in place, and only keeps what the result needs: a count, a sum or
+    the best value so far. Only bag and set keep the solutions.
+    """
+    __slots__ = ('kind', 'expr', 'witness', 'value', 'best')
+    
+    KINDS = ('count', 'sum', 'max', 'min', 'bag', 'set')
+    
+    def __init__(self, kind: str, expr: Term = None, witness: Term = None):
+        self.kind = kind
+        self.expr = expr
+        self.witness = witness
+        self.value = [] if kind in ('bag', 'set') else 0 if kind in ('count', 'sum') else None
+        self.best = None  # Copy of the witness of the best value
+    
+    @classmethod
+    def from_spec(cls, spec: Term) -> Optional['Aggregate']:
+        """Return a new aggregate for a specification, or None if it is not one."""
+        spec = deref(spec)
+        if isinstance(spec, Atom) and spec.value == 'count':
+            return cls('count')
+        if isinstance(spec, Compound) and spec.functor in cls.KINDS:
+            if not spec.args and spec.functor == 'count':
+                return cls('count')  # (count) as count
+            if len(spec.args) == 1:
+                return cls(spec.functor, spec.args[0])
+            if len(spec.args) == 2 and spec.functor in ('max', 'min'):
+                return cls(spec.functor, spec.args[0], spec.args[1])
+        return None
+    
+    def add(self):
+        """Take in the current solution."""
+        kind = self.kind
+        if kind == 'count':
+            self.value += 1
+        elif kind == 'sum':
+            self.value += evaluate(self.expr)
+        elif kind == 'max' or kind == 'min':
+            value = evaluate(self.expr)
+            if self.value is None or (value > self.value if kind == 'max' else value < self.value):
+                self.value = value
+                if self.witness is not None:
+                    self.best = copy_resolved(self.witness)
+        else:
+            self.value.append(copy_resolved(self.expr))
+    
+    def result(self) -> Optional[Term]:
+        """Return the aggregated term, or None if there is none (max of nothing)."""
+        kind = self.kind
+        if kind == 'bag':
+            return ListTerm(tuple(self.value))
+        if kind == 'set':
+            return ListTerm(tuple(_sorted_unique(self.value)))
+        if self.value is None:
+            return None
+        if self.witness is not None:
+            return Compound(kind, (Atom(self.value), self.best))
+        return Atom(self.value)
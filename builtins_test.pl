@@ -5,35 +5,77 @@
 % ===== Test Data =====
 
 % Some facts for testing
-(value five 5)
-(value ten 10)
-(name person tom)
-(name person mary)
+(value five 5).
+(value ten 10).
+(name person tom).
+(name person mary).
+
+% Facts for the all-solutions tests
+(age peter 7).
+(age ann 11).
+(age pat 8).
+(age tom 5).
+(age mike 11).
+(likes mary wine).
+(likes john beer).
+(likes mary beer).
+(likes ann wine).
+
+% Facts for the database tests, which change them: run those in order
+(item 1).
+(item 2).
+(item 3).
+(seen 1).
+(seen 2).
+(seen 3).
+(step 1).
+(step 2).
+(mark a).
+(gval 1).
+((grow) (gval X) (is Y (+ X 10)) (assertz (gval Y)) (fail)).
+((twogoals a) (value five X) (value ten Y)).
+((twogoals b) (value ten X) (value five Y)).
+
+% A cut in a goal called through a variable
+(pick 1).
+(pick 2).
+((vcall X) (= G ((pick X) !)) G).
+((vcall X) (= X 13)).
+
+% A tabled predicate whose answers are one list split in different ways
+(table two 1).
+((join [] L L)).
+((join [H|T] L [H|R]) (join T L R)).
+((two L) (join [1] [2] L)).
+((two [1 2])).
+((two [1 2 | []])).
+(split a [1 2]).
+(split b [1 | [2]]).
 
 % ===== Test Rules Using Built-ins =====
 
 % Rule 1: Check if something is a valid number value
-((isNumberValue X) (value X Y) (number Y))
+((isNumberValue X) (value X Y) (number Y)).
 
 % Rule 2: Check if something is a name
-((isName X) (name person X) (atom X))
+((isName X) (name person X) (atom X)).
 
 % Rule 3: Compute double of a number
-((double X Result) (is Result (* X 2)))
+((double X Result) (is Result (* X 2))).
 
 % Rule 4: Compute sum of two stored values
 ((sumOf Name1 Name2 Result) 
  (value Name1 V1) 
  (value Name2 V2) 
- (is Result (+ V1 V2)))
+ (is Result (+ V1 V2))).
 
 % Rule 5: Check if result of calculation is bound
 ((calcBound X Result)
  (is Result (+ X 10))
- (nonvar Result))
+ (nonvar Result)).
 
 % Rule 6: Check if input is unbound variable
-((testVar X) (var X))
+((testVar X) (var X)).
 
 % ===== TESTS TO RUN IN REPL =====
 
@@ -135,3 +177,243 @@
 % ok
 % &- ? (testAll X Y Z)
 % Expected: X = 10, Y = 15, Z = 30
+
+% TEST 10: Lists - append and member
+% With the first two arguments unbound, append gives every split on backtracking
+% &- ? (append X Y [1 2 3])
+% Expected: X = [], Y = [1 2 3] ; X = [1], Y = [2 3] ; X = [1 2], Y = [3] ; X = [1 2 3], Y = []
+
+% &- ? (append [1 2] [3] X)
+% Expected: X = [1 2 3]
+
+% &- ? (append X [3] [1 2 3])
+% Expected: X = [1 2]
+
+% &- ? (member X [a b c])
+% Expected: X = a ; X = b ; X = c
+
+% &- ? (member b [a b c])
+% Expected: yes
+
+% A list with an unbound tail grows on backtracking
+% &- ? (member x L)
+% Expected: L = [x | _] ; L = [_ x | _] ; L = [_ _ x | _] ; ...
+
+% TEST 11: Lists - length
+% &- ? (length [a b c] N)
+% Expected: N = 3
+
+% &- ? (length L 2)
+% Expected: L = [_ _]
+
+% &- ? (length [a | T] 3)
+% Expected: T = [_ _]
+
+% With both unbound, ever longer lists on backtracking
+% &- ? (length L N)
+% Expected: L = [], N = 0 ; L = [_], N = 1 ; L = [_ _], N = 2 ; ...
+
+% TEST 12: Lists - nth0 and nth1
+% &- ? (nth0 1 [a b c] E)
+% Expected: E = b
+
+% &- ? (nth1 3 [a b] E)
+% Expected: no
+
+% With the index unbound, each position of the element
+% &- ? (nth0 I [a b a] a)
+% Expected: I = 0 ; I = 2
+
+% &- ? (nth1 I [a b a] E)
+% Expected: I = 1, E = a ; I = 2, E = b ; I = 3, E = a
+
+% TEST 13: Lists - reverse, sorting, sums and ranges
+% &- ? (reverse [1 2 3] R)
+% Expected: R = [3 2 1]
+
+% &- ? (msort [b a c a] S)
+% Expected: S = [a a b c]
+
+% &- ? (sort [b a c a] S)
+% Expected: S = [a b c]
+
+% &- ? (sum_list [1 2 (* 2 3)] S)
+% Expected: S = 9
+
+% &- ? (max_list [3 9 4] M)
+% Expected: M = 9
+
+% &- ? (numlist 1 5 L)
+% Expected: L = [1 2 3 4 5]
+
+% &- ? (numlist 5 1 L)
+% Expected: no
+
+% TEST 14: All solutions - findall
+% &- ? (findall X (age X A) L)
+% Expected: L = [peter ann pat tom mike]
+
+% &- ? (findall (- N A) (age N A) L)
+% Expected: L = [(- peter 7) (- ann 11) (- pat 8) (- tom 5) (- mike 11)]
+
+% &- ? (findall X (age X 99) L)
+% Expected: L = []
+
+% TEST 15: All solutions - bagof
+% A variable free in the goal gives one list per binding, in order of the binding
+% &- ? (bagof X (likes X D) L)
+% Expected: D = beer, L = [john mary] ; D = wine, L = [mary ann]
+
+% (^ D Goal) leaves D out of the grouping
+% &- ? (bagof X (^ D (likes X D)) L)
+% Expected: L = [mary john mary ann]
+
+% Unlike findall, bagof fails without solutions
+% &- ? (bagof X (age X 99) L)
+% Expected: no
+
+% TEST 16: All solutions - setof
+% Sorted in the standard order, without duplicates
+% &- ? (setof A (^ N (age N A)) L)
+% Expected: L = [5 7 8 11]
+
+% &- ? (setof (- A N) (age N A) L)
+% Expected: L = [(- 5 tom) (- 7 peter) (- 8 pat) (- 11 ann) (- 11 mike)]
+
+% &- ? (setof X (likes X D) L)
+% Expected: D = beer, L = [john mary] ; D = wine, L = [ann mary]
+
+% &- ? (setof X (member X [c a b a]) L)
+% Expected: L = [a b c]
+
+% &- ? (setof X (age X 99) L)
+% Expected: no
+
+% TEST 17: All solutions - forall
+% &- ? (forall (age X A) (> A 4))
+% Expected: yes
+
+% &- ? (forall (age X A) (> A 7))
+% Expected: no
+
+% &- ? (forall (likes X wine) (likes X beer))
+% Expected: no
+
+% TEST 18: Database - assert, asserta and assertz
+% &- ? (assertz (item 4))
+% Expected: yes
+
+% &- ? (asserta (item 0))
+% Expected: yes
+
+% &- ? (findall X (item X) L)
+% Expected: L = [0 1 2 3 4]
+
+% A rule is written as in a program
+% &- ? (assert ((bigitem X) (item X) (> X 2)))
+% Expected: yes
+
+% &- ? (findall X (bigitem X) L)
+% Expected: L = [3 4]
+
+% TEST 19: Database - retract and retractall
+% &- ? (retract (item 0))
+% Expected: yes
+
+% &- ? (retract (item 9))
+% Expected: no
+
+% &- ? (retract ((bigitem X) (item X) (> X 2)))
+% Expected: yes
+
+% &- ? (findall X (bigitem X) L)
+% Expected: L = []
+
+% retract removes the next matching clause on backtracking
+% &- ? (findall X (retract (item X)) L)
+% Expected: L = [1 2 3 4]
+
+% &- ? (findall X (item X) L)
+% Expected: L = []
+
+% &- ? (assertz (pair a 1)) (assertz (pair b 2)) (assertz (pair a 3))
+% Expected: yes
+
+% &- ? (retractall (pair a N))
+% Expected: yes
+
+% &- ? (findall (- K V) (pair K V) L)
+% Expected: L = [(- b 2)]
+
+% retractall succeeds even when nothing matches
+% &- ? (retractall (nothing X))
+% Expected: yes
+
+% A body of one goal matches a longer body as a conjunction
+% &- ? (retract ((twogoals a) B))
+% Expected: B = ( (value five X) (value ten Y))
+
+% &- ? (retract ((twogoals K) ((value ten V) G)))
+% Expected: K = b, V = X, G = (value five Y)
+
+% &- ? (findall K (twogoals K) L)
+% Expected: L = []
+
+% TEST 20: Database - logical update view
+% A running call still sees the clauses retracted after it started
+% &- ? (findall X ((seen X) (retractall (seen Y))) L)
+% Expected: L = [1 2 3]
+
+% &- ? (findall X (seen X) L)
+% Expected: L = []
+
+% ... and does not see the clauses added after it started
+% &- ? (findall X ((step X) (is Y (+ X 10)) (assertz (step Y))) L)
+% Expected: L = [1 2]
+
+% &- ? (findall X (step X) L)
+% Expected: L = [1 2 11 12]
+
+% &- ? (findall X ((mark X) (asserta (mark new))) L)
+% Expected: L = [a]
+
+% &- ? (findall X (mark X) L)
+% Expected: L = [new a]
+
+% So a rule that adds to the predicate it is reading terminates
+% &- ? (grow)
+% Expected: no
+
+% &- ? (findall X (gval X) L)
+% Expected: L = [1 11]
+
+% TEST 21: Cut inside a goal called through a variable
+% The cut only cuts the called goal, so vcall's second clause still runs
+% &- ? (findall X (vcall X) L)
+% Expected: L = [1 13]
+
+% &- ? (= G !) G (= X 1)
+% Expected: X = 1
+
+% TEST 22: Answers that differ only in how a list is split
+% [1 2], [1 | [2]] and [1 2 | []] are the same answer, found once
+% &- ? (findall L (two L) Ls)
+% Expected: Ls = [[1 2]]
+
+% ... and the same group for bagof
+% &- ? (bagof K (split K L) Ks)
+% Expected: L = [1 2], Ks = [a b]
+
+% TEST 23: Aggregation - the forms of count
+% &- ? (aggregate_all count (age X A) N)
+% Expected: N = 5
+
+% &- ? (aggregate_all (count) (age X A) N)
+% Expected: N = 5
+
+% &- ? (aggregate_all (count X) (likes X wine) N)
+% Expected: N = 2
+
+% (count X) leaves X out of the groups, as a bagof template does
+% &- ? (findall (- A N) (aggregate (count X) (age X A) N) L)
+% Expected: L = [(- 5 1) (- 7 1) (- 8 1) (- 11 2)]
@@ -0,0 +1,82 @@
+"""
+Work counters for queries: inferences, clauses tried, choicepoints and time.
+"""
+import time
+from typing import Generator, Iterator
+from terms import Term, Variable
+from unification import BindingStore
+
+
+class Counters:
+    """
+    What the queries run while counting was on have done, summed.
+    
+    Set an engine's counters attribute to a Counters to turn counting on;
+    with it None (the default) the engines do no counting at all.
+    
+    inferences counts the goals called, clauses the clauses tried and
+    unifications the ones whose head unified. choicepoints counts those
+    left behind by calls, searching builtins and disjunctions; which calls
+    leave one depends on the engine. max_depth is the deepest call nesting
+    (last calls do not nest) and bindings the variables bound. wall and
+    cpu are the seconds spent finding solutions, not the time between them.
+    """
+    __slots__ = ('inferences', 'clauses', 'unifications', 'choicepoints', 'max_depth', 'bindings',
+                 'wall', 'cpu')
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """Set everything back to zero."""
+        self.inferences = 0
+        self.clauses = 0
+        self.unifications = 0
+        self.choicepoints = 0
+        self.max_depth = 0
+        self.bindings = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+    
+    def as_dict(self) -> dict:
+        """The counters by name."""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    @property
+    def lips(self) -> float:
+        """Logical inferences per CPU second."""
+        return self.inferences / self.cpu if self.cpu else 0.0
+    
+    def summary(self) -> str:
+        """One line in the style of the time/1 of classic Prologs."""
+        usage = f"{self.cpu / self.wall:.0%}" if self.wall else "-"
+        return (f"% {self.inferences:,} inferences, {self.cpu:.3f} CPU in {self.wall:.3f} seconds "
+                f"({usage} CPU, {self.lips:,.0f} Lips)")
+    
+    def timed(self, solutions: Iterator) -> Generator:
+        """Yield from solutions, adding the time spent on each step to wall and cpu."""
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                solution = next(solutions, None)
+            finally:
+                self.wall += time.perf_counter() - wall
+                self.cpu += time.process_time() - cpu
+            if solution is None:
+                return
+            yield solution
+
+
+class CountingStore(BindingStore):
+    """A BindingStore that counts the bindings it makes."""
+    
+    def __init__(self, counters: Counters):
+        super().__init__()
+        self.counters = counters
+    
+    def bind(self, var: Variable, term: Term):
+        """Bind an unbound variable to a term, trailing it if needed."""
+        self.counters.bindings += 1
+        var.ref = term
+        if var.serial < self.boundary:
+            self.trail.append(var)
@@ -1,16 +1,96 @@
 """
 Clause database for storing and retrieving facts and rules.
 """
-from typing import List, Optional
-from terms import Term, Compound
+from itertools import islice
+from typing import List, Optional, Hashable
+from terms import Term, Atom, Variable, Compound, List as ListTerm, Slot
+from arithmetic import Arithmetic, compile_goal
+
+
+# Index keys for list arguments, distinct from any atom or functor key
+EMPTY_LIST_KEY = ('[]',)
+LIST_KEY = ('[|]',)
+
+
+def predicate_key(term: Term) -> Optional[tuple]:
+    """Return (functor, arity) for a goal or head, (atom, None) for an atom."""
+    if isinstance(term, Compound):
+        return (term.functor, len(term.args))
+    if isinstance(term, Atom):
+        return (term.value, None)
+    return None
+
+
+def argument_key(term: Term) -> Optional[Hashable]:
+    """
+    Return the principal value of an argument for indexing.
+    
+    That is the atom or number itself, (functor, arity) for a compound, or
+    one of the list keys. Returns None for an unbound variable, which
+    matches anything.
+    """
+    while isinstance(term, Variable):
+        if term.ref is None:
+            return None
+        term = term.ref
+    
+    if isinstance(term, Atom):
+        return term.value
+    
+    elif isinstance(term, Compound):
+        return (term.functor, len(term.args))
+    
+    elif isinstance(term, ListTerm):
+        if term.size:
+            return LIST_KEY
+        if term.tail:
+            return argument_key(term.tail)  # [| T] is just T
+        return EMPTY_LIST_KEY
+    
+    return None
+
+
+def _variable_names(term: Term, names: set):
+    """Add the names of the variables in term to names."""
+    if term.ground:
+        return
+    if isinstance(term, Variable):
+        names.add(term.name)
+    elif isinstance(term, Compound):
+        for arg in term.args:
+            _variable_names(arg, names)
+    elif isinstance(term, ListTerm):
+        for elem in term.elements:
+            _variable_names(elem, names)
+        if term.tail:
+            _variable_names(term.tail, names)
 
 
 class Clause:
-    """Represents a fact or rule."""
+    """
+    Represents a fact or rule.
+    
+    ``ground`` is set when the clause has no variables, and
+    ``variable_count`` is the number of distinct variables in it.
+    ``erased`` is 0 while the clause is in the database, and the
+    database generation it was retracted in after that.
+    """
+    __slots__ = ('head', 'body', 'erased', 'template', 'ground', 'variable_count')
     
     def __init__(self, head: Term, body: Optional[List[Term]] = None):
         self.head = head
-        self.body = body if body is not None else []
+        self.body = body if body else ()  # Facts share the empty tuple
+        self.erased = 0  # Generation the clause was retracted in
+        self.template = None  # Set by Database.add_clause
+        self.ground = head.ground and all(goal.ground for goal in self.body)
+        if self.ground:
+            self.variable_count = 0
+        else:
+            names = set()
+            _variable_names(head, names)
+            for goal in self.body:
+                _variable_names(goal, names)
+            self.variable_count = len(names)
     
     def is_fact(self) -> bool:
         """Check if this is a fact (no body)."""
@@ -28,67 +108,450 @@ class Clause:
         return f"({self.head} {body_str})"
 
 
+def clause_from_term(term: Term) -> Clause:
+    """
+    Return the clause a term stands for: ((head) body...) is a rule,
+    anything else a fact.
+    """
+    if isinstance(term, Compound) and term.functor == "" and term.args and isinstance(term.args[0], Compound):
+        return Clause(term.args[0], list(term.args[1:]))
+    return Clause(term)
+
+
+class ClauseTemplate:
+    """
+    A clause with its variables replaced by numbered slots.
+    
+    Built once when the clause is added to the database. Renaming the
+    clause for a call is then a single frame allocation: the head is
+    matched against the goal directly, and the body is only built after
+    the head has unified (see InferenceEngine._resume).
+    """
+    
+    __slots__ = ('head', 'body', 'linear', 'slot_count', 'cells')
+    
+    def __init__(self, clause: Clause):
+        if clause.ground:
+            # Nothing to replace: share the clause's terms
+            self.head = clause.head
+            self.body = clause.body
+            self.linear = True
+            self.slot_count = 0
+            self.cells = 0
+            return
+        
+        slots = {}
+        self.head = _compile(clause.head, slots)
+        # A head in which no variable occurs twice never needs occurs check:
+        # its variables are fresh, and a linear term unifies with any term
+        # sharing no variables with it without creating a cycle.
+        self.linear = len(slots) == _variable_occurrences(clause.head)
+        self.body = _compile_arithmetic(self.head, [_compile(goal, slots) for goal in clause.body])
+        self.slot_count = len(slots)
+        # Compound terms and lists built each time the body is (see QueryLimits.bindings)
+        self.cells = sum(_cells(goal) for goal in self.body if not isinstance(goal, Arithmetic))
+
+
+def _compile(term: Term, slots: dict):
+    """Replace the variables of a term with slots, numbered in slots by name."""
+    if term.ground:
+        return term
+    
+    if isinstance(term, Variable):
+        if term.name not in slots:
+            slots[term.name] = Slot(len(slots), term.name)
+        return slots[term.name]
+    
+    elif isinstance(term, Compound):
+        return Compound(term.functor, tuple(_compile(arg, slots) for arg in term.args))
+    
+    elif isinstance(term, ListTerm):
+        new_elements = tuple(_compile(elem, slots) for elem in term.elements)
+        new_tail = _compile(term.tail, slots) if term.tail else None
+        return ListTerm(new_elements, new_tail)
+    
+    return term
+
+
+def _cells(template) -> int:
+    """Return the number of compound terms and lists instantiate() builds for a template."""
+    if template.ground:
+        return 0
+    if isinstance(template, Compound):
+        return 1 + sum(_cells(arg) for arg in template.args)
+    if isinstance(template, ListTerm):
+        return 1 + sum(_cells(elem) for elem in template.elements) + (_cells(template.tail) if template.tail else 0)
+    return 0
+
+
+def _compile_arithmetic(head, body: list) -> tuple:
+    """
+    Replace the arithmetic goals of a body template with compiled ones.
+    
+    The other goals are built when the clause is entered, so the result
+    of (is X Expr) can go straight into the frame when X occurs neither
+    before the goal nor in a later goal that is built.
+    """
+    compiled = [compile_goal(goal) for goal in body]
+    earlier = _slot_indexes(head)
+    for i, goal in enumerate(body):
+        if compiled[i] is not None and goal.functor == 'is' and isinstance(goal.args[0], Slot):
+            index = goal.args[0].index
+            if index not in earlier and not any(
+                    compiled[j] is None and index in _slot_indexes(body[j]) for j in range(i + 1, len(body))):
+                compiled[i] = compile_goal(goal, fresh=True)
+        earlier |= _slot_indexes(goal)
+    return tuple(goal if arithmetic is None else arithmetic for goal, arithmetic in zip(body, compiled))
+
+
+def _slot_indexes(template) -> set:
+    """Return the indexes of the slots in a template."""
+    if template.ground:
+        return set()
+    if isinstance(template, Slot):
+        return {template.index}
+    if isinstance(template, Compound):
+        return set().union(*(_slot_indexes(arg) for arg in template.args))
+    if isinstance(template, ListTerm):
+        indexes = set().union(*(_slot_indexes(elem) for elem in template.elements))
+        return indexes | _slot_indexes(template.tail) if template.tail else indexes
+    return set()
+
+
+def _variable_occurrences(term: Term) -> int:
+    """Count the variable occurrences in term."""
+    if term.ground:
+        return 0
+    if isinstance(term, Variable):
+        return 1
+    if isinstance(term, Compound):
+        return sum(_variable_occurrences(arg) for arg in term.args)
+    if isinstance(term, ListTerm):
+        count = sum(_variable_occurrences(elem) for elem in term.elements)
+        return count + (_variable_occurrences(term.tail) if term.tail else 0)
+    return 0
+
+
+# An argument position gets an index once this many calls with it bound
+# would have had to try at least JIT_MIN_CANDIDATES clauses
+JIT_THRESHOLD = 8
+JIT_MIN_CANDIDATES = 8
+
+
+class ClauseList(list):
+    """
+    A list of clauses that may still contain erased ones (tombstones).
+    
+    Clauses are never removed from a list or moved within it: assertz
+    appends, and asserta fills a free slot in front of ``start`` (see
+    prepend). A call tries the positions from start up to the length
+    the list had when it was made, and skips the clauses erased before
+    then, so it sees the clauses as they were at the call however the
+    database changes meanwhile (the logical update view). The first
+    ``free`` slots are None, and the ones from there to start are erased.
+    """
+    __slots__ = ('start', 'free')
+    
+    def __init__(self, clauses=(), free: int = 0):
+        super().__init__([None] * free)
+        self.extend(clauses)
+        self.start = free
+        self.free = free
+    
+    def __iter__(self):
+        return islice(list.__iter__(self), self.start, None)
+    
+    @property
+    def size(self) -> int:
+        """The number of clauses, erased ones included."""
+        return len(self) - self.free
+    
+    def first_live(self) -> int:
+        """Return the position of the first clause that may be live."""
+        start = self.start
+        while start < len(self) and self[start].erased:
+            start += 1
+        self.start = start
+        return start
+    
+    def live(self) -> 'ClauseList':
+        """Return a new list without the erased clauses."""
+        return ClauseList(clause for clause in self if not clause.erased)
+    
+    def prepend(self, clause: Clause) -> 'ClauseList':
+        """
+        Put clause in front, returning the list to use from now on.
+        
+        When no slot is free the clauses are copied into a new list with
+        as many free slots as clauses, so prepending is O(1) amortized.
+        Calls still trying the old list are not affected.
+        """
+        clauses = self
+        if not clauses.free:
+            clauses = ClauseList(list.__iter__(self), free=max(len(self), 4))
+        clauses.free -= 1
+        clauses[clauses.free] = clause
+        clauses.start = clauses.free
+        return clauses
+
+
+# The clauses of a predicate that has none
+NO_CLAUSES = ClauseList()
+
+
+class ArgumentIndex:
+    """
+    Clauses of one predicate indexed on one argument position.
+    
+    Each bucket holds, in database order, the clauses whose argument has
+    that key together with those whose argument is a variable, so a lookup
+    is a single dictionary access.
+    """
+    
+    def __init__(self, position: int):
+        self.position = position
+        self.var_clauses = ClauseList()  # Argument is a variable
+        self.buckets: dict = {}
+    
+    def add(self, clause: Clause, first: bool = False):
+        """Add a clause after the existing ones, or before them if first."""
+        key = argument_key(clause.head.args[self.position])
+        buckets = self.buckets
+        
+        if key is None:
+            if first:
+                self.var_clauses = self.var_clauses.prepend(clause)
+                for bucket_key, bucket in buckets.items():
+                    buckets[bucket_key] = bucket.prepend(clause)
+            else:
+                self.var_clauses.append(clause)
+                for bucket in buckets.values():
+                    bucket.append(clause)
+        elif key in buckets:
+            if first:
+                buckets[key] = buckets[key].prepend(clause)
+            else:
+                buckets[key].append(clause)
+        elif first:
+            buckets[key] = ClauseList([clause, *self.var_clauses])
+        else:
+            buckets[key] = ClauseList([*self.var_clauses, clause])
+    
+    def lookup(self, key: Hashable) -> List[Clause]:
+        """Return the clauses whose argument may match key."""
+        return self.buckets.get(key, self.var_clauses)
+
+
+class PredicateIndex:
+    """
+    The clauses of one predicate and their argument indexes.
+    
+    The first argument is always indexed. Other positions are indexed on
+    demand, once calls with that argument bound keep having to try many
+    clauses (see JIT_THRESHOLD). Each lookup uses whichever index leaves
+    the fewest candidates.
+    
+    Retracted clauses stay in the lists as tombstones until they make up
+    half of them; then the lists are rebuilt without them.
+    """
+    
+    def __init__(self, arity: Optional[int]):
+        self.clauses = ClauseList()
+        self.erased = 0  # Tombstones in self.clauses
+        self.indexes: dict = {}  # Argument position -> ArgumentIndex
+        self.demand: dict = {}  # Argument position -> calls that wanted an index
+        self.lookups: dict = {}  # Argument position used, or None -> calls
+        if arity:
+            self.indexes[0] = ArgumentIndex(0)
+    
+    def add(self, clause: Clause, first: bool = False):
+        """Add a clause after the existing ones, or before them if first."""
+        if first:
+            self.clauses = self.clauses.prepend(clause)
+        else:
+            self.clauses.append(clause)
+        for index in self.indexes.values():
+            index.add(clause, first)
+    
+    def lookup(self, goal: Term) -> List[Clause]:
+        """Return the clauses whose arguments may match goal's."""
+        best = self.clauses
+        used = None
+        
+        if self.indexes and isinstance(goal, Compound):
+            keys = [argument_key(arg) for arg in goal.args]
+            
+            for position, index in self.indexes.items():
+                if keys[position] is not None:
+                    candidates = index.lookup(keys[position])
+                    if len(candidates) < len(best):
+                        best, used = candidates, position
+            
+            if len(best) >= JIT_MIN_CANDIDATES:
+                for position, key in enumerate(keys):
+                    if key is None or position in self.indexes:
+                        continue
+                    self.demand[position] = self.demand.get(position, 0) + 1
+                    if self.demand[position] >= JIT_THRESHOLD:
+                        candidates = self._build_index(position).lookup(key)
+                        if len(candidates) < len(best):
+                            best, used = candidates, position
+        
+        self.lookups[used] = self.lookups.get(used, 0) + 1
+        return best
+    
+    def remove(self, clause: Clause):
+        """Count a clause of this predicate as erased."""
+        self.erased += 1
+        if self.erased * 2 > self.clauses.size:
+            self.clauses = self.clauses.live()
+            self.erased = 0
+            for position in self.indexes:
+                self._build_index(position)
+    
+    def _build_index(self, position: int) -> ArgumentIndex:
+        """Index all clauses on an argument position."""
+        index = ArgumentIndex(position)
+        for clause in self.clauses:
+            index.add(clause)
+        self.indexes[position] = index
+        return index
+
+
 class Database:
     """Stores and retrieves clauses."""
     
     def __init__(self):
-        self.clauses: List[Clause] = []
-        self._index: dict = {}  # Index by functor for efficiency
-    
-    def add_clause(self, clause: Clause):
-        """Add a fact or rule to the database."""
-        self.clauses.append(clause)
-        self._update_index(clause)
-    
-    def _update_index(self, clause: Clause):
-        """Update the functor index."""
-        functor = self._get_functor(clause.head)
-        if functor:
-            if functor not in self._index:
-                self._index[functor] = []
-            self._index[functor].append(clause)
-    
-    def _get_functor(self, term: Term) -> Optional[str]:
-        """Get the functor of a term."""
-        if isinstance(term, Compound):
-            return term.functor
-        return None
+        self.clauses = ClauseList()
+        self.erased = 0  # Tombstones in self.clauses
+        self._index: dict = {}  # (functor, arity) -> PredicateIndex
+        self.tabled: set = set()  # Keys of predicates declared with (table name arity)
+        self.occurs_checks: dict = {}  # Key -> mode set with (occurs_check name arity mode)
+        self.generation = 0  # Incremented on every change
+    
+    def add_clause(self, clause: Clause, first: bool = False):
+        """Add a fact or rule to the database, after the clauses of its predicate or before them if first."""
+        clause.template = ClauseTemplate(clause)
+        if first:
+            self.clauses = self.clauses.prepend(clause)
+        else:
+            self.clauses.append(clause)
+        self._update_index(clause, first)
+        self.generation += 1
+    
+    def table(self, name: str, arity: int):
+        """Declare a predicate tabled: its answers are memoized per call variant."""
+        self.tabled.add((name, arity))
+        if arity == 0:
+            self.tabled.add((name, None))  # Also called as a plain atom
+        self.generation += 1
+    
+    def set_occurs_check(self, name: str, arity: int, mode: str):
+        """Set the occurs check mode ('full', 'off' or 'auto') for one predicate."""
+        from unification import OCCURS_CHECK_MODES
+        
+        if mode not in OCCURS_CHECK_MODES:
+            raise ValueError(f"Unknown occurs check mode: {mode}")
+        self.occurs_checks[(name, arity)] = mode
+        if arity == 0:
+            self.occurs_checks[(name, None)] = mode  # Also called as a plain atom
+        self.generation += 1
+    
+    def _update_index(self, clause: Clause, first: bool):
+        """Add a clause to the index of its predicate."""
+        key = predicate_key(clause.head)
+        if key is not None:
+            if key not in self._index:
+                self._index[key] = PredicateIndex(key[1])
+            self._index[key].add(clause, first)
+    
+    def predicate_clauses(self, key: tuple) -> List[Clause]:
+        """Return all clauses of the predicate with this (functor, arity) key."""
+        index = self._index.get(key)
+        return index.clauses.live() if index is not None else []
     
     def get_clauses(self, goal: Term) -> List[Clause]:
-        """Retrieve clauses that might unify with goal."""
-        functor = self._get_functor(goal)
+        """
+        Retrieve clauses that might unify with goal.
+        
+        Only clauses of the goal's predicate are returned, and of those only
+        the ones whose first argument can match the goal's. A call that gets
+        a single clause back is deterministic. The list may contain erased
+        clauses, which callers skip, and is only ever added to (see
+        ClauseList).
+        """
+        key = predicate_key(goal)
         
-        if functor and functor in self._index:
-            return self._index[functor]
+        if key is None:
+            # Unbound goal: any clause might match
+            return self.clauses
         
-        # If no functor or not indexed, return all clauses
-        return self.clauses
+        index = self._index.get(key)
+        if index is None:
+            return NO_CLAUSES
+        return index.lookup(goal)
     
     def clear(self):
         """Remove all clauses from the database."""
-        self.clauses.clear()
+        self.clauses = ClauseList()
+        self.erased = 0
         self._index.clear()
+        self.tabled.clear()
+        self.occurs_checks.clear()
+        self.generation += 1
     
     def retract(self, pattern: Term) -> bool:
         """Remove first clause matching pattern. Returns True if removed."""
-        from unification import unify, Substitution
+        from unification import unify_head, copy_term, BindingStore
         
-        for i, clause in enumerate(self.clauses):
-            if unify(clause.head, pattern, Substitution()) is not None:
-                removed_clause = self.clauses.pop(i)
-                self._rebuild_index()
+        store = BindingStore()
+        pattern = copy_term(pattern)
+        candidates = self.get_clauses(pattern)
+        
+        for i in range(candidates.first_live() if candidates else 0, len(candidates)):
+            clause = candidates[i]
+            if clause.erased:
+                continue
+            
+            frame = [None] * clause.template.slot_count
+            matched = unify_head(clause.template.head, pattern, frame, store)
+            store.undo_to(0)
+            if matched:
+                self.erase(clause)
                 return True
         
         return False
     
-    def _rebuild_index(self):
-        """Rebuild the functor index."""
-        self._index.clear()
-        for clause in self.clauses:
-            self._update_index(clause)
+    def erase(self, clause: Clause):
+        """Tombstone a clause; only the lists it is in are compacted, and only now and then."""
+        self.generation += 1
+        clause.erased = self.generation  # Calls made before now still see it
+        self._index[predicate_key(clause.head)].remove(clause)
+        self.erased += 1
+        if self.erased * 2 > self.clauses.size:
+            self.clauses = self.clauses.live()
+            self.erased = 0
+    
+    def index_statistics(self) -> dict:
+        """
+        Report the indexes of each predicate and how often each was used.
+        
+        Keys are 'functor/arity'. Argument positions count from 1, and
+        'none' counts calls that could not use any index.
+        """
+        report = {}
+        for (functor, arity), index in self._index.items():
+            name = f"{functor}/{arity or 0}"
+            report[name] = {
+                'clauses': index.clauses.size - index.erased,
+                'indexed': sorted(position + 1 for position in index.indexes),
+                'lookups': {('none' if position is None else f"arg{position + 1}"): count
+                            for position, count in index.lookups.items()},
+            }
+        return report
     
     def __len__(self):
-        return len(self.clauses)
+        return self.clauses.size - self.erased
     
     def __iter__(self):
-        return iter(self.clauses)
+        return (clause for clause in self.clauses if not clause.erased)
@@ -0,0 +1,37 @@
+% Tabling
+% Demonstrates (table name arity) declarations in microPROLOG
+
+% Tabled predicates remember their answers, so left-recursive rules
+% terminate and repeated subgoals are only solved once.
+(table ancestor 2).
+(table path 2).
+(table fib 2).
+
+% Base facts
+(parent alice bob).
+(parent bob charlie).
+(parent charlie diana).
+
+% Left-recursive ancestor: loops forever without the table declaration
+((ancestor X Y) (ancestor X Z) (parent Z Y)).
+((ancestor X Y) (parent X Y)).
+
+% Paths in a graph with a cycle
+(edge a b).
+(edge b c).
+(edge c a).
+(edge c d).
+
+((path X Y) (edge X Y)).
+((path X Y) (path X Z) (edge Z Y)).
+
+% Fibonacci numbers: each (fib N F) is computed once
+((fib 0 0)).
+((fib 1 1)).
+((fib N F)
+  (> N 1)
+  (is N1 (- N 1))
+  (is N2 (- N 2))
+  (fib N1 F1)
+  (fib N2 F2)
+  (is F (+ F1 F2))).
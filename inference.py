@@ -1,127 +1,560 @@
 """
 Inference engine with SLD resolution and backtracking.
 """
-from typing import List, Generator
-from terms import Term, Variable, Compound, Atom
-from database import Database, Clause
-from unification import Substitution, unify
-from builtin_predicates import BuiltinRegistry
+from typing import List, Generator, Iterator, Optional
+from terms import Term, Variable, Compound, Atom, variable_serials
+from database import Database, Clause, predicate_key
+from unification import (BindingStore, Substitution, OCCURS_CHECK_MODES, copy_term, deref,
+                         instantiate, unify_head)
+from builtin_predicates import BuiltinRegistry, is_control
+from arithmetic import Arithmetic
+from tabling import Tables
+from limits import QueryLimits, LimitedStore
+from counters import Counters, CountingStore
+from profiler import Profiler, Port
 
 
-class CutException(Exception):
-    """Exception raised when cut (!) is encountered."""
-    pass
+# Returned in place of a continuation when a goal fails
+FAIL = object()
+
+CUT = Atom('!')
+FAILURE = Compound('fail', ())
+
+
+class Goal:
+    """
+    One cell of a goal continuation: a goal and the goals that follow it.
+    
+    Continuations are linked lists, so a clause body is prepended to the
+    caller's continuation without copying the goals after it.
+    """
+    __slots__ = ('term', 'next', 'depth', 'cut_barrier', 'frame')
+    
+    def __init__(self, term: Term, next: 'Goal', depth: int, cut_barrier: int, frame: list = None):
+        self.term = term
+        self.next = next
+        self.depth = depth  # Number of calls this goal is nested in
+        self.cut_barrier = cut_barrier  # Choicepoint stack height to cut back to
+        self.frame = frame  # Clause frame of a compiled arithmetic goal
+
+
+class ChoicePoint:
+    """
+    Clause alternatives still to try for a call, and where to resume.
+    
+    For a builtin that can succeed more than once, solutions holds the
+    generator that produces its solutions instead (see BuiltinRegistry).
+    For the other branch of a control construct, clauses is None and
+    cont is the branch itself. port is only set while profiling (see
+    InferenceEngine._profile_call).
+    """
+    __slots__ = ('goal', 'cont', 'clauses', 'index', 'end', 'generation', 'trail_mark', 'boundary',
+                 'solutions', 'port')
+    
+    def __init__(self, goal: Term, cont: Goal, clauses: List[Clause], trail_mark: int,
+                 solutions: Optional[Iterator] = None, start: int = 0, generation: int = 0):
+        self.goal = goal
+        self.cont = cont  # The call's own continuation cell
+        self.clauses = clauses
+        self.index = start  # Next clause to try
+        # The logical update view: clauses added after the call lie past
+        # end, and the ones retracted since its generation are still tried
+        self.end = len(clauses) if clauses else 0
+        self.generation = generation
+        self.trail_mark = trail_mark
+        self.solutions = solutions
+        # Variables created from here on need no trailing for this choicepoint
+        self.boundary = next(variable_serials)
+
+
+class ChoicePointStack(list):
+    """
+    The choicepoints of one run of the resolution loop, newest last.
+    
+    A run nested in another one (see InferenceEngine._evaluate) starts
+    from the trail mark and boundary of the outer run, so cutting all of
+    its own choicepoints restores those rather than an empty state.
+    """
+    __slots__ = ('base_mark', 'base_boundary')
+    
+    def __init__(self, base_mark: int = 0, base_boundary: int = 0):
+        super().__init__()
+        self.base_mark = base_mark
+        self.base_boundary = base_boundary
 
 
 class InferenceEngine:
-    """SLD resolution with backtracking."""
+    """
+    SLD resolution with backtracking.
+    
+    The search runs as a loop over an explicit goal continuation and a
+    stack of choicepoints rather than as recursive generators, so deep
+    recursion in a program does not use Python stack.
+    
+    A choicepoint is only kept while a call has clauses left to try, and
+    a clause body replaces the goal that called it. So once the last
+    goal of a body is called with no choicepoint left, nothing refers to
+    the caller's frame any more: tail-recursive loops run in constant
+    memory and do not count towards depth_limit.
     
-    def __init__(self, database: Database):
+    occurs_check sets how unification treats cyclic bindings (see
+    OCCURS_CHECK_MODES); predicates can override it in the database.
+    With rational_trees, answers are printed safely even when a binding
+    made without the check created a cyclic term.
+    """
+    
+    def __init__(self, database: Database, occurs_check: str = 'auto', rational_trees: bool = True):
+        if occurs_check not in OCCURS_CHECK_MODES:
+            raise ValueError(f"Unknown occurs check mode: {occurs_check}")
         self.database = database
-        self.depth_limit = 1000  # Prevent infinite recursion
-        self._var_counter = 0  # Counter for variable renaming
-        self.builtins = BuiltinRegistry()  # Built-in predicates
+        self.occurs_check = occurs_check
+        self.rational_trees = rational_trees
+        self.depth_limit = 200000  # Maximum call nesting, prevents infinite recursion
+        self.counters: Optional[Counters] = None  # Work done by queries, counted when set
+        self.profiler: Optional[Profiler] = None  # Ports and time per predicate, recorded when set
+        self.builtins = BuiltinRegistry(self)  # Built-in predicates
+        
+        self._tables = Tables(database.generation)  # Answers of tabled predicates
     
-    def solve(self, goals: List[Term], subst: Substitution = None, depth: int = 0) -> Generator[Substitution, None, None]:
+    def clauses_changed(self, key: tuple):
+        """
+        A builtin added or erased a clause of a predicate. Nothing is cached
+        per predicate here: calls already running see the clauses their
+        choicepoints snapshotted, later calls the new ones.
         """
-        Generator that yields all solutions (substitutions) for given goals.
+    
+    def solve(self, goals: List[Term], limits: Optional[QueryLimits] = None) -> Generator[Substitution, None, None]:
+        """
+        Generator that yields all solutions for given goals.
         
         Args:
             goals: List of Terms to prove
-            subst: Current substitution
-            depth: Current recursion depth
-            
+            limits: Inference, time and binding limits and a cancel token;
+                raises limits.ResourceError when one is hit
+        
         Yields:
-            Substitution objects (solutions)
-        """
-        if depth > self.depth_limit:
-            return
-        
-        if subst is None:
-            subst = Substitution()
-        
-        # Base case: no more goals - success!
-        if not goals:
-            yield subst
-            return
-        
-        # Take first goal
-        goal = subst.apply(goals[0])
-        remaining_goals = goals[1:]
-        
-        # Check for cut (!)
-        if isinstance(goal, Atom) and goal.value == '!':
-            # Cut succeeds and continues with remaining goals
-            # But we raise CutException after yielding solutions to prevent backtracking
-            yielded_any = False
-            for solution in self.solve(remaining_goals, subst, depth + 1):
-                yielded_any = True
-                yield solution
-            # Only prevent backtracking if cut was actually reached (solutions were yielded)
-            if yielded_any:
-                raise CutException()
-        
-        # Check if goal is a built-in predicate
-        elif isinstance(goal, Compound) and self.builtins.is_builtin(goal.functor):
-            # Evaluate built-in predicate
-            for new_subst in self.builtins.evaluate(goal, subst):
-                # Continue with remaining goals
-                yield from self.solve(remaining_goals, new_subst, depth + 1)
+            Substitution snapshots binding the query's variables (solutions)
+        """
+        self._tables.refresh(self.database.generation)  # Clauses changed: tabled answers may be wrong now
+        
+        # Variables with the same name are the same variable in a query
+        query_vars = {}
+        goals = [copy_term(goal, query_vars) for goal in goals]
+        
+        cont = None
+        for goal in reversed(goals):
+            cont = Goal(goal, cont, 0, 0)
+        
+        counters = self.counters
+        if limits is not None and limits.bindings is not None:
+            store = LimitedStore()  # Counts bindings, and in counters if set
+            store.counters = counters
         else:
-            # Try to match with each clause in database
-            for clause in self.database.get_clauses(goal):
-                # Rename variables in clause to avoid conflicts
-                renamed_clause = self._rename_variables(clause)
-                
-                # Try to unify goal with clause head
-                new_subst = unify(goal, renamed_clause.head, subst)
-                
-                if new_subst is not None:
-                    # Add clause body to goals (prepend to remaining goals)
-                    new_goals = renamed_clause.body + remaining_goals
-                    
-                    # Recursively solve new goals
-                    try:
-                        yield from self.solve(new_goals, new_subst, depth + 1)
-                    except CutException:
-                        # Cut encountered - stop trying alternative clauses
-                        return
-    
-    def _rename_variables(self, clause: Clause) -> Clause:
-        """Rename all variables in a clause to avoid conflicts."""
-        self._var_counter += 1
-        suffix = f"_{self._var_counter}"
-        
-        rename_map = {}
-        
-        def rename_term(term: Term) -> Term:
-            """Recursively rename variables in a term."""
-            from terms import Atom, Variable, Compound, List as ListTerm
+            store = BindingStore() if counters is None else CountingStore(counters)
+        store.boundary = 0  # No choicepoints yet, so nothing needs trailing
+        store.occurs_check = self.occurs_check != 'off'  # For builtins such as =
+        store.budget = limits.start() if limits is not None else None
+        cyclic = self.rational_trees and (
+            self.occurs_check == 'off' or 'off' in self.database.occurs_checks.values())
+        solutions = self._run(cont, store)
+        if counters is not None:
+            solutions = counters.timed(solutions)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.current = profiler.root
+            profiler.start()
+        try:
+            for _ in solutions:
+                if profiler is not None:
+                    profiler.stop()  # The time until the next solution is asked for is not the query's
+                yield store.snapshot(query_vars.values(), cyclic)
+                if profiler is not None:
+                    profiler.start()
+            if profiler is not None:
+                profiler.stop()
+        finally:
+            self._tables.abandon()  # If stopped by an error in the middle of a tabled evaluation
+    
+    def _run(self, cont: Goal, store: BindingStore,
+             choicepoints: Optional[ChoicePointStack] = None) -> Generator[BindingStore, None, None]:
+        """
+        Run the resolution loop for a continuation.
+        
+        Yields:
+            The store once per solution, with its bindings in place.
+        """
+        if choicepoints is None:
+            choicepoints = ChoicePointStack()
+        budget = store.budget
+        counters = store.counters
+        profiler = self.profiler
+        
+        while True:
+            if cont is FAIL:
+                cont = self._backtrack(choicepoints, store)
+                if cont is FAIL:
+                    return
             
-            if isinstance(term, Atom):
-                return term
+            # No more goals - success!
+            if cont is None:
+                yield store
+                cont = FAIL  # Backtrack for the next solution
+                continue
             
-            elif isinstance(term, Variable):
-                if term.name not in rename_map:
-                    rename_map[term.name] = Variable(term.name + suffix)
-                return rename_map[term.name]
+            if budget is not None:
+                budget.step(store)
+            if counters is not None:
+                counters.inferences += 1
             
-            elif isinstance(term, Compound):
-                new_args = tuple(rename_term(arg) for arg in term.args)
-                return Compound(term.functor, new_args)
+            goal = cont.term
+            if isinstance(goal, Variable):
+                # A variable called as a goal: a cut in it is local to it
+                goal = deref(goal)
+                cont = Goal(goal, cont.next, cont.depth, len(choicepoints), cont.frame)
             
-            elif isinstance(term, ListTerm):
-                new_elements = tuple(rename_term(elem) for elem in term.elements)
-                new_tail = rename_term(term.tail) if term.tail else None
-                return ListTerm(new_elements, new_tail)
+            # Arithmetic compiled with the clause runs on the clause's frame
+            if type(goal) is Arithmetic:
+                if budget is not None:
+                    budget.bindings += goal.cells
+                cont = cont.next if goal.run(cont.frame, store) else FAIL
             
-            return term
+            # Cut (!) drops every choicepoint made since the clause was entered
+            elif isinstance(goal, Atom) and goal.value == '!':
+                self._cut(choicepoints, cont.cut_barrier, store)
+                cont = cont.next
+            
+            elif is_control(goal):
+                cont = self._control(goal, cont, choicepoints, store)
+            
+            # Check if goal is a built-in predicate
+            elif isinstance(goal, Compound) and self.builtins.is_builtin(goal.functor):
+                search = self.builtins.searches.get(goal.functor)
+                if search is not None:
+                    solutions = search(goal.args, store)
+                    if type(solutions) is bool:
+                        cont = cont.next if solutions else FAIL  # Deterministic call
+                    else:
+                        # May succeed again: resumed from a choicepoint
+                        choicepoint = ChoicePoint(goal, cont, None, store.mark(), solutions)
+                        if profiler is not None:
+                            choicepoint.port = Port('resume', profiler.current, None)
+                        cont = self._resume(choicepoint, choicepoints, store)
+                        if counters is not None and choicepoints and choicepoints[-1] is choicepoint:
+                            counters.choicepoints += 1
+                elif self.builtins.evaluate(goal, store):
+                    cont = cont.next
+                else:
+                    cont = FAIL
+            
+            elif type(goal) is Port:
+                profiler.port(goal)
+                cont = cont.next if goal.kind == 'exit' else FAIL
+            
+            elif cont.depth >= self.depth_limit:
+                cont = FAIL
+            
+            else:
+                tabled = self.database.tabled
+                if tabled and predicate_key(goal) in tabled:
+                    clauses = self._tables.answers(goal, self._evaluate, store)
+                    start = 0
+                else:
+                    clauses = self.database.get_clauses(goal)
+                    start = clauses.start
+                choicepoint = ChoicePoint(goal, cont, clauses, store.mark(), None, start, self.database.generation)
+                if counters is not None:
+                    counters.max_depth = max(counters.max_depth, cont.depth)
+                if profiler is not None:
+                    self._profile_call(choicepoint, choicepoints, store)
+                cont = self._resume(choicepoint, choicepoints, store)
+                if counters is not None and choicepoints and choicepoints[-1] is choicepoint:
+                    counters.choicepoints += 1
+    
+    def _backtrack(self, choicepoints: ChoicePointStack, store: BindingStore) -> Goal:
+        """Resume the newest choicepoint that still has a matching clause."""
+        while choicepoints:
+            choicepoint = choicepoints.pop()
+            store.undo_to(choicepoint.trail_mark)
+            store.boundary = choicepoints[-1].boundary if choicepoints else choicepoints.base_boundary
+            if self.profiler is not None:
+                self._profile_redo(choicepoint)
+            cont = self._resume(choicepoint, choicepoints, store)
+            if cont is not FAIL:
+                return cont
+        return FAIL
+    
+    def _cut(self, choicepoints: ChoicePointStack, height: int, store: BindingStore):
+        """
+        Drop the choicepoints above height.
         
-        # Rename head and body
-        new_head = rename_term(clause.head)
-        new_body = [rename_term(goal) for goal in clause.body]
+        height is the stack height recorded when the clause was entered
+        (Goal.cut_barrier), so this is a single truncation of the stack.
+        Trail entries that only the dropped choicepoints needed go too.
+        """
+        del choicepoints[height:]
+        if choicepoints:
+            store.boundary = choicepoints[-1].boundary
+            store.tidy(choicepoints[-1].trail_mark)
+        else:
+            store.boundary = choicepoints.base_boundary
+            store.tidy(choicepoints.base_mark)
+    
+    def _resume(self, choicepoint: ChoicePoint, choicepoints: ChoicePointStack, store: BindingStore) -> Goal:
+        """
+        Try the remaining clauses of a call until one head unifies.
+        
+        The choicepoint is on the stack only while a clause is being tried
+        that is not the last one. Returns the new continuation, or FAIL if
+        no clause matched.
+        """
+        if choicepoint.solutions is not None:
+            return self._next_solution(choicepoint, choicepoints, store)
+        if choicepoint.clauses is None:
+            return choicepoint.cont  # The other branch of a control construct
+        
+        goal = choicepoint.goal
+        clauses = choicepoint.clauses
+        caller = choicepoint.cont
+        cut_barrier = len(choicepoints)
+        end = choicepoint.end
+        last = end - 1
+        generation = choicepoint.generation
+        counters = store.counters
+        first = choicepoint.index
+        
+        mode = self.occurs_check
+        if self.database.occurs_checks:
+            mode = self.database.occurs_checks.get(predicate_key(goal), mode)
+        body_check = store.occurs_check
+        
+        for i in range(choicepoint.index, end):
+            clause = clauses[i]
+            if clause.erased and clause.erased <= generation:
+                continue  # Retracted before the call
+            
+            if i < last:
+                if len(choicepoints) == cut_barrier:
+                    choicepoints.append(choicepoint)
+                    store.boundary = choicepoint.boundary
+            elif len(choicepoints) > cut_barrier:
+                # Last alternative: the call becomes deterministic
+                self._cut(choicepoints, cut_barrier, store)
+            
+            # The clause's variables live in a fresh frame, which renames them
+            template = clause.template
+            frame = [None] * template.slot_count
+            
+            # Try to unify goal with clause head
+            store.occurs_check = mode == 'full' or (mode == 'auto' and not template.linear)
+            matched = unify_head(template.head, goal, frame, store)
+            store.occurs_check = body_check
+            if counters is not None:
+                counters.clauses += 1
+                counters.unifications += matched
+            if matched:
+                choicepoint.index = i + 1
+                
+                # The body replaces the goal in the caller's continuation.
+                # If that goal was the last of its clause the caller's frame
+                # is finished, so the body is no deeper than the caller.
+                cont = caller.next
+                depth = (cont.depth if cont is not None else 0) + 1
+                if self.profiler is not None:
+                    port = self._profile_clauses(choicepoint, i + 1 - first)
+                    if port is not None:
+                        cont = self._profile_exit(port, cont, depth)
+                if store.budget is not None:
+                    store.budget.bindings += template.cells
+                for term in reversed(template.body):
+                    if type(term) is Arithmetic:
+                        cont = Goal(term, cont, depth, cut_barrier, frame)
+                    else:
+                        cont = Goal(instantiate(term, frame), cont, depth, cut_barrier)
+                return cont
+            
+            store.undo_to(choicepoint.trail_mark)
+        
+        if len(choicepoints) > cut_barrier:
+            # The clauses after the last one tried were all retracted
+            self._cut(choicepoints, cut_barrier, store)
+        if self.profiler is not None:
+            self._profile_clauses(choicepoint, end - first)
+        return FAIL
+    
+    def _profile_call(self, choicepoint: ChoicePoint, choicepoints: ChoicePointStack, store: BindingStore):
+        """
+        Record a call port. A choicepoint under the call, which only
+        backtracking out of the call reaches, records its fail port.
+        
+        A predicate calling itself when the newest choicepoint is already
+        such a catcher for it, as a deterministic tail-recursive call does,
+        adds a fail port to that catcher instead of pushing another one.
+        """
+        caller = self.profiler.current
+        node = self.profiler.call(predicate_key(choicepoint.goal))
+        choicepoint.port = Port('exit', node, caller)
+        
+        if node is caller and choicepoints:
+            top = choicepoints[-1]
+            fail = top.cont.term if top.clauses is None and top.cont is not None else None
+            if type(fail) is Port and fail.kind == 'fail' and fail.node is node:
+                top.cont = Goal(Port('fail', node, fail.caller, fail.count + 1), None, 0, 0)
+                return
+        
+        catcher = ChoicePoint(None, Goal(Port('fail', node, caller), None, 0, 0), None, store.mark())
+        catcher.port = Port('resume', node, None)
+        choicepoints.append(catcher)
+        store.boundary = catcher.boundary
+    
+    def _profile_exit(self, port: Port, cont: Goal, depth: int) -> Goal:
+        """
+        Put a call's exit port before cont, the goals after the call. A
+        predicate calling itself as the last goal of its body finds its
+        own exit port there, which then counts this exit too, so tail
+        recursion does not grow the continuation.
+        """
+        after = cont.term if cont is not None else None
+        if type(after) is Port and after.kind == 'exit' and after.node is port.node and port.caller is port.node:
+            return Goal(Port('exit', port.node, after.caller, after.count + 1), cont.next, cont.depth, 0)
+        return Goal(port, cont, depth - 1, 0)  # As deep as the goals after it
+    
+    def _profile_redo(self, choicepoint: ChoicePoint):
+        """Backtracking resumes choicepoint: a redo port if it is a call's."""
+        port = getattr(choicepoint, 'port', None)
+        if port is None:
+            return  # Made by a tabled evaluation
+        if port.kind == 'exit':
+            self.profiler.redo(port.node)
+        else:
+            self.profiler.switch(port.node)
+    
+    def _profile_clauses(self, choicepoint: ChoicePoint, tried: int) -> Optional[Port]:
+        """Count the clauses a call tried, and return its exit port, to put after the clause body."""
+        port = getattr(choicepoint, 'port', None)
+        if port is not None:
+            port.node.profile.clauses += tried
+        return port
+    
+    def _control(self, goal: Compound, cont: Goal, choicepoints: ChoicePointStack,
+                 store: BindingStore) -> Goal:
+        """
+        Expand a control construct into the goals that run it.
+        
+        A branch that is tried on backtracking gets a choicepoint whose
+        continuation is that branch. The condition of (-> Cond Then) is
+        followed by a cut back to the stack height before the construct,
+        which commits to its first solution and drops the other branch;
+        a cut inside Cond itself only reaches back to Cond's start. Cuts
+        in the other branches cut the clause, as they would outside.
+        """
+        functor, args = goal.functor, goal.args
+        after, depth, barrier = cont.next, cont.depth, cont.cut_barrier
+        height = len(choicepoints)
+        
+        if functor == '':
+            for term in reversed(args):
+                after = Goal(term, after, depth, barrier)
+            return after
+        
+        if functor == ';':
+            left = deref(args[0])
+            self._push_branch(Goal(args[1], after, depth, barrier), choicepoints, store)
+            if isinstance(left, Compound) and left.functor == '->' and len(left.args) == 2:
+                then = Goal(CUT, Goal(left.args[1], after, depth, barrier), depth, height)
+                return Goal(left.args[0], then, depth, height + 1)
+            return Goal(left, after, depth, barrier)
+        
+        if functor == '->':
+            then = Goal(CUT, Goal(args[1], after, depth, barrier), depth, height)
+            return Goal(args[0], then, depth, height)
+        
+        if functor == 'once':
+            return Goal(args[0], Goal(CUT, after, depth, height), depth, height)
+        
+        # \+, not and ignore: on failure go on after the construct
+        self._push_branch(after, choicepoints, store)
+        if functor == 'ignore':
+            return Goal(args[0], Goal(CUT, after, depth, height), depth, height + 1)
+        return Goal(args[0], Goal(CUT, Goal(FAILURE, None, depth, barrier), depth, height), depth, height + 1)
+    
+    def _push_branch(self, branch: Goal, choicepoints: ChoicePointStack, store: BindingStore):
+        """Push a choicepoint that continues with branch on backtracking."""
+        choicepoint = ChoicePoint(None, branch, None, store.mark())
+        choicepoints.append(choicepoint)
+        store.boundary = choicepoint.boundary
+        if store.counters is not None:
+            store.counters.choicepoints += 1
+        if self.profiler is not None:
+            choicepoint.port = Port('resume', self.profiler.current, None)
+    
+    def _next_solution(self, choicepoint: ChoicePoint, choicepoints: ChoicePointStack,
+                       store: BindingStore) -> Goal:
+        """Ask a builtin's generator for its next solution; FAIL if there is none."""
+        choicepoints.append(choicepoint)
+        store.boundary = choicepoint.boundary
+        if next(choicepoint.solutions, None) is None:
+            choicepoints.pop()
+            store.boundary = choicepoints[-1].boundary if choicepoints else choicepoints.base_boundary
+            return FAIL
+        return choicepoint.cont.next
+    
+    def solutions(self, goal: Term, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """
+        Prove goal in a nested resolution loop, for builtins such as findall.
         
-        return Clause(new_head, new_body)
+        Yields the store once per solution, with the bindings in place. A
+        cut in goal is local to it. All bindings are undone when the search
+        ends or the generator is closed.
+        """
+        mark = store.mark()
+        boundary = store.boundary
+        body_check = store.occurs_check
+        store.boundary = next(variable_serials)  # Trail every binding, so all can be undone
+        profiler = self.profiler
+        caller = profiler.current if profiler is not None else None
+        try:
+            for _ in self._run(Goal(goal, None, 0, 0), store, ChoicePointStack(mark, store.boundary)):
+                if profiler is None:
+                    yield store
+                    continue
+                inner = profiler.current
+                profiler.switch(caller)  # The caller runs until the next solution is asked for
+                yield store
+                profiler.switch(inner)
+            if profiler is not None:
+                profiler.switch(caller)
+        finally:
+            store.undo_to(mark)
+            store.boundary = boundary
+            store.occurs_check = body_check
+    
+    def _evaluate(self, goal: Term, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Resolve goal against its clauses for a tabled evaluation, yielding once per solution."""
+        mark = store.mark()
+        boundary = store.boundary
+        
+        choicepoints = ChoicePointStack(mark, boundary)
+        clauses = self.database.get_clauses(goal)
+        choicepoint = ChoicePoint(goal, Goal(goal, None, 0, 0), clauses, mark, None, clauses.start,
+                                  self.database.generation)
+        caller = self.profiler.current if self.profiler is not None else None
+        cont = self._resume(choicepoint, choicepoints, store)
+        yield from self._run(cont, store, choicepoints)
+        
+        store.undo_to(mark)
+        store.boundary = boundary
+        if caller is not None:
+            self.profiler.switch(caller)
+    
+    def statistics(self) -> dict:
+        """
+        Return engine statistics. 'indexes' shows which clause indexes calls
+        used; with counters set, their values are included too.
+        """
+        statistics = {'indexes': self.database.index_statistics()}
+        if self.counters is not None:
+            statistics.update(self.counters.as_dict())
+        return statistics
     
     def query(self, goal: Term) -> Generator[Substitution, None, None]:
         """
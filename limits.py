@@ -0,0 +1,124 @@
+"""
+Per-query resource limits: inference budgets, timeouts and cancellation.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from terms import Term, Variable
+from unification import BindingStore
+
+
+CHECK_INTERVAL = 1000  # Inferences between checks of the clock, the trail and cancellation
+
+
+class ResourceError(Exception):
+    """
+    A query ran out of a resource or was cancelled.
+    
+    resource is 'inferences', 'time', 'bindings' or 'cancelled'. The
+    query's bindings are gone, the database is as the query left it.
+    """
+    
+    def __init__(self, resource: str, message: str):
+        super().__init__(message)
+        self.resource = resource
+
+
+class CancelToken:
+    """
+    Cancels a running query. Safe to use from another thread or a signal handler.
+    """
+    __slots__ = ('_event',)
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """Ask the query to stop; it raises ResourceError at its next check."""
+        self._event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+@dataclass(frozen=True)
+class QueryLimits:
+    """
+    Limits for one query, None meaning no limit.
+    
+    inferences counts the goals the engine calls and seconds is
+    wall-clock time. bindings limits the heap the query builds: it counts
+    the variables bound, and the compound terms, lists and is results
+    built for the goals of clause bodies, whether backtracking dropped
+    them since or not. All but inferences are checked
+    every CHECK_INTERVAL inferences, so a single builtin call is never
+    interrupted.
+    """
+    inferences: Optional[int] = None
+    seconds: Optional[float] = None
+    bindings: Optional[int] = None
+    cancel: Optional[CancelToken] = None
+    
+    def start(self) -> 'Budget':
+        """Start counting for a query."""
+        return Budget(self)
+
+
+class Budget:
+    """
+    What a running query has used of its limits.
+    
+    The engines call step() once per inference. It only counts down;
+    the limits are checked when the count reaches zero. With a binding
+    limit, the engines add the terms they build for clause bodies to
+    bindings, and a LimitedStore adds the variables it binds.
+    """
+    __slots__ = ('limits', 'inferences', 'left', 'interval', 'deadline', 'bindings')
+    
+    def __init__(self, limits: QueryLimits):
+        self.limits = limits
+        self.inferences = 0  # Inferences up to the last check
+        self.bindings = 0
+        self.deadline = time.monotonic() + limits.seconds if limits.seconds is not None else None
+        self.interval = self.left = self._next_interval()
+    
+    def step(self, store):
+        """Count one inference."""
+        self.left -= 1
+        if self.left <= 0:
+            self.check(store)
+    
+    def check(self, store):
+        """Raise ResourceError if a limit has been passed."""
+        limits = self.limits
+        self.inferences += self.interval - self.left
+        if limits.cancel is not None and limits.cancel.cancelled:
+            raise ResourceError('cancelled', "Query cancelled")
+        if limits.inferences is not None and self.inferences > limits.inferences:
+            raise ResourceError('inferences', f"Inference limit of {limits.inferences} exceeded")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise ResourceError('time', f"Time limit of {limits.seconds} seconds exceeded")
+        if limits.bindings is not None and self.bindings > limits.bindings:
+            raise ResourceError('bindings', f"Binding limit of {limits.bindings} exceeded")
+        self.interval = self.left = self._next_interval()
+    
+    def _next_interval(self) -> int:
+        """Inferences until the next check: the one after the last allowed is always checked."""
+        if self.limits.inferences is None:
+            return CHECK_INTERVAL
+        return max(1, min(CHECK_INTERVAL, self.limits.inferences + 1 - self.inferences))
+
+
+class LimitedStore(BindingStore):
+    """A BindingStore that counts its bindings against the query's binding limit."""
+    
+    def bind(self, var: Variable, term: Term):
+        """Bind an unbound variable to a term, trailing it if needed."""
+        self.budget.bindings += 1
+        if self.counters is not None:
+            self.counters.bindings += 1
+        var.ref = term
+        if var.serial < self.boundary:
+            self.trail.append(var)
@@ -5,15 +5,43 @@ Main entry point.
 """
 import sys
 from repl import REPL
+from wam import WamEngine
+from limits import QueryLimits
 
 
 def main():
     """Start the microPROLOG REPL."""
-    repl = REPL()
+    args = sys.argv[1:]
+    
+    # --occurs-check=full|off|auto sets how unification treats cyclic bindings
+    # --max-inferences=N, --timeout=SECONDS and --max-bindings=N limit each query
+    options = {}
+    limits = {}
+    for arg in list(args):
+        if arg.startswith('--occurs-check='):
+            args.remove(arg)
+            options['occurs_check'] = arg.split('=', 1)[1]
+        elif arg.startswith('--max-inferences='):
+            args.remove(arg)
+            limits['inferences'] = int(arg.split('=', 1)[1])
+        elif arg.startswith('--timeout='):
+            args.remove(arg)
+            limits['seconds'] = float(arg.split('=', 1)[1])
+        elif arg.startswith('--max-bindings='):
+            args.remove(arg)
+            limits['bindings'] = int(arg.split('=', 1)[1])
+    options['limits'] = QueryLimits(**limits)
+    
+    # --wam runs queries on the compiled WAM-style engine
+    if '--wam' in args:
+        args.remove('--wam')
+        repl = REPL(WamEngine, **options)
+    else:
+        repl = REPL(**options)
     
     # Check if a file was provided as command line argument
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
+    if args:
+        filename = args[0]
         print(f"microPROLOG v1.0")
         print(f"Loading {filename}...")
         print()
@@ -3,7 +3,7 @@ Parser and tokenizer for microPROLOG syntax.
 """
 import re
 from typing import List, Tuple, Optional
-from terms import Atom, Variable, Compound, List as ListTerm, Term
+from terms import Atom, Variable, Compound, List as ListTerm, EMPTY_LIST, Term
 
 
 class TokenType:
@@ -129,13 +129,19 @@ class Tokenizer:
                 tokens.append(Token(TokenType.PIPE, '|'))
                 self.advance()
             
-            # Cut operator
-            elif self.current_char == '!':
-                tokens.append(Token(TokenType.ATOM, '!'))
+            # Cut operator and disjunction
+            elif self.current_char in '!;':
+                tokens.append(Token(TokenType.ATOM, self.current_char))
                 self.advance()
             
+            # Negative numbers: a minus sign directly followed by a digit
+            elif self.current_char == '-' and (self.peek() or '').isdigit():
+                self.advance()
+                token = self.read_number()
+                tokens.append(Token(TokenType.NUMBER, -token.value))
+            
             # Operator symbols (handle multi-character operators)
-            elif self.current_char in '+-*/=<>\\':
+            elif self.current_char in '+-*/=<>\\^':
                 op = self.current_char
                 self.advance()
                 # Check for multi-character operators
@@ -154,6 +160,12 @@ class Tokenizer:
                 elif op == '\\' and self.current_char == '+':
                     op = '\\+'
                     self.advance()
+                elif op == '-' and self.current_char == '>':
+                    op = '->'
+                    self.advance()
+                elif (op + (self.current_char or '')) in ('**', '//', '/\\', '\\/', '<<', '>>'):
+                    op += self.current_char
+                    self.advance()
                 tokens.append(Token(TokenType.ATOM, op))
             
             # Numbers
@@ -265,7 +277,7 @@ class Parser:
             # Empty list
             if self.current_token.type == TokenType.RBRACKET:
                 self.advance()
-                return ListTerm(tuple())
+                return EMPTY_LIST
             
             # Parse elements
             elements = []
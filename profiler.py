@@ -0,0 +1,182 @@
+"""
+Per-predicate profiler: port counts, self and cumulative time, and
+collapsed stacks for flamegraph tools.
+"""
+import time
+from typing import Dict, List, Optional, TextIO
+
+
+class PredicateProfile:
+    """Port counts, clauses tried and self time of one predicate."""
+    __slots__ = ('key', 'calls', 'exits', 'redos', 'fails', 'clauses', 'self_time', 'cumulative')
+    
+    def __init__(self, key: tuple):
+        self.key = key
+        self.calls = 0
+        self.exits = 0
+        self.redos = 0
+        self.fails = 0
+        self.clauses = 0
+        self.self_time = 0.0
+        self.cumulative = 0.0  # Filled in by Profiler.predicates()
+    
+    @property
+    def name(self) -> str:
+        functor, arity = self.key
+        return f"{functor}/{arity or 0}"
+
+
+class Node:
+    """
+    A predicate in the calling context tree: one node per call path.
+    A predicate calling itself directly stays in the same node.
+    """
+    __slots__ = ('profile', 'parent', 'children', 'self_time')
+    
+    def __init__(self, profile: Optional[PredicateProfile], parent: Optional['Node']):
+        self.profile = profile
+        self.parent = parent
+        self.children: Dict[tuple, Node] = {}
+        self.self_time = 0.0
+
+
+class Port:
+    """
+    A goal the engine puts in a continuation to see a port of a call:
+    'exit' after the clause body, 'fail' in the choicepoint under the call.
+    A choicepoint also keeps a port: the call's exit port, or a 'resume'
+    port with the node that was running when it was made. One port can
+    stand for count ports of the same node in a row, as in tail recursion.
+    """
+    __slots__ = ('kind', 'node', 'caller', 'count')
+    
+    def __init__(self, kind: str, node: Node, caller: Node, count: int = 1):
+        self.kind = kind
+        self.node = node
+        self.caller = caller  # Node to go back to on exit
+        self.count = count
+
+
+class Profiler:
+    """
+    Records the ports of every call of a predicate, and charges the time
+    between two events to the node that was running.
+    
+    Set InferenceEngine.profiler to a Profiler to turn profiling on. Time
+    is charged to the predicate whose clause body is running, builtins
+    included; time between the solutions of a query is not counted.
+    """
+    
+    def __init__(self):
+        self.root = Node(None, None)
+        self.current = self.root
+        self._predicates: Dict[tuple, PredicateProfile] = {}
+        self._last = time.perf_counter()
+    
+    # Events, called by the engine
+    
+    def start(self):
+        """Start the clock, after the engine was paused."""
+        self._last = time.perf_counter()
+    
+    def stop(self):
+        """Charge the time so far, before the engine pauses."""
+        self.switch(self.current)
+    
+    def switch(self, node: Node):
+        """Charge the time since the last event to the current node, and make node current."""
+        now = time.perf_counter()
+        self.current.self_time += now - self._last
+        self._last = now
+        self.current = node
+    
+    def call(self, key: tuple) -> Node:
+        """A call of the predicate with this key: return its node, now current."""
+        caller = self.current
+        if caller.profile is not None and caller.profile.key == key:
+            node = caller
+        else:
+            node = caller.children.get(key)
+            if node is None:
+                profile = self._predicates.get(key)
+                if profile is None:
+                    profile = self._predicates[key] = PredicateProfile(key)
+                node = caller.children[key] = Node(profile, caller)
+        node.profile.calls += 1
+        self.switch(node)
+        return node
+    
+    def port(self, port: Port):
+        """The engine reached an exit or fail port."""
+        if port.kind == 'exit':
+            port.node.profile.exits += port.count
+            self.switch(port.caller)
+        else:
+            port.node.profile.fails += port.count
+            self.switch(port.node)
+    
+    def redo(self, node: Node):
+        """Backtracking tries the next clause of a call."""
+        node.profile.redos += 1
+        self.switch(node)
+    
+    # Results
+    
+    def predicates(self) -> List[PredicateProfile]:
+        """The profile of every predicate called, slowest first by self time."""
+        for profile in self._predicates.values():
+            profile.self_time = 0.0
+            profile.cumulative = 0.0
+        
+        # Cumulative time counts a subtree only at the outermost node of
+        # its predicate, so recursion is not counted twice
+        totals = {}
+        active: Dict[PredicateProfile, int] = {}
+        for node, entering in self._walk():
+            profile = node.profile
+            if entering:
+                if profile is not None:
+                    profile.self_time += node.self_time
+                    active[profile] = active.get(profile, 0) + 1
+                continue
+            totals[node] = node.self_time + sum(totals.pop(child) for child in node.children.values())
+            if profile is not None:
+                active[profile] -= 1
+                if not active[profile]:
+                    profile.cumulative += totals[node]
+        return sorted(self._predicates.values(), key=lambda profile: profile.self_time, reverse=True)
+    
+    def table(self, limit: Optional[int] = None) -> str:
+        """The predicates as a table, slowest first."""
+        lines = [f"{'predicate':<24} {'calls':>9} {'exits':>9} {'redos':>9} {'fails':>9} "
+                 f"{'clauses':>10} {'self (s)':>10} {'total (s)':>10}"]
+        for profile in self.predicates()[:limit]:
+            lines.append(f"{profile.name:<24} {profile.calls:>9} {profile.exits:>9} {profile.redos:>9} "
+                         f"{profile.fails:>9} {profile.clauses:>10} {profile.self_time:>10.4f} "
+                         f"{profile.cumulative:>10.4f}")
+        return '\n'.join(lines)
+    
+    def write_collapsed(self, file: TextIO):
+        """
+        Write one line per call path, 'query;p/1;q/2 123', with the self
+        time in microseconds: the input of flamegraph.pl and speedscope.
+        """
+        names = []
+        for node, entering in self._walk():
+            if not entering:
+                names.pop()
+                continue
+            names.append(node.profile.name if node.profile is not None else 'query')
+            micros = round(node.self_time * 1e6)
+            if micros:
+                file.write(f"{';'.join(names)} {micros}\n")
+    
+    def _walk(self):
+        """Walk the tree depth first: yield (node, True) on the way down and (node, False) on the way up."""
+        stack = [(self.root, True)]
+        while stack:
+            node, entering = stack.pop()
+            yield node, entering
+            if entering:
+                stack.append((node, False))
+                stack.extend((child, True) for child in node.children.values())
@@ -1,22 +1,30 @@
 """
 REPL (Read-Eval-Print Loop) for microPROLOG.
 """
+import signal
+import threading
+from contextlib import contextmanager
+from dataclasses import replace
 from typing import Optional
-from terms import Term, Variable, Compound, List as ListTerm
+from terms import Term, Atom, Variable, Compound, List as ListTerm
 from parser import parse_text, parse_query
-from database import Database, Clause
+from database import Database, Clause, clause_from_term
 from inference import InferenceEngine
 from builtin_predicates import BuiltinRegistry
 from unification import Substitution
+from limits import CancelToken, QueryLimits, ResourceError
+from counters import Counters
+from profiler import Profiler
 
 
 class REPL:
     """Interactive REPL for microPROLOG."""
     
-    def __init__(self):
+    def __init__(self, engine_class=InferenceEngine, limits: Optional[QueryLimits] = None, **engine_options):
         self.database = Database()
-        self.engine = InferenceEngine(self.database)
+        self.engine = engine_class(self.database, **engine_options)
         self.builtins = BuiltinRegistry()
+        self.limits = limits if limits is not None else QueryLimits()  # For every query
     
     def run(self):
         """Main REPL loop."""
@@ -69,6 +77,13 @@ class REPL:
                 # Query (starts with ?)
                 elif line.startswith('?'):
                     self._handle_query(line[1:].strip())
+                # Timed query: time ? (goal)
+                elif line.startswith('time ') and line[5:].strip().startswith('?'):
+                    self._time_query(line[5:].strip()[1:].strip())
+                # Profiled query: profile [file] ? (goal)
+                elif line.startswith('profile ') and '?' in line:
+                    filename, query_text = line[8:].split('?', 1)
+                    self._profile_query(query_text.strip(), filename.strip() or None)
                 # Clause (fact or rule) - check if complete
                 elif line.startswith('('):
                     # Accumulate lines until we get a period
@@ -91,7 +106,7 @@ class REPL:
                 else:
                     print(f"Unknown command: {line}")
                     print("Type 'help' for available commands")
-                    
+            
             except KeyboardInterrupt:
                 print("\nInterrupted")
             except EOFError:
@@ -105,7 +120,14 @@ class REPL:
         print("microPROLOG Commands:")
         print("  (fact args...).         - Add a fact (note the period!)")
         print("  ((head) (body)...).     - Add a rule (note the period!)")
+        print("  (table name arity).     - Declare a tabled (memoized) predicate")
+        print("  (occurs_check name arity full|off|auto).")
+        print("                          - Set the occurs check for one predicate")
         print("  ? (query args...)       - Query the database")
+        print("  time ? (query args...)  - Query and report inferences, time and LIPS")
+        print("  profile [file] ? (query args...)")
+        print("                          - Query and show the time and ports of each predicate,")
+        print("                            writing collapsed stacks for flamegraphs to file")
         print("  listing                 - Show all clauses")
         print("  clear                   - Clear database")
         print("  consult <file>          - Load clauses from file")
@@ -125,10 +147,15 @@ class REPL:
     
     def _show_database(self):
         """Display all clauses in the database."""
-        if len(self.database) == 0:
+        if len(self.database) == 0 and not self.database.tabled and not self.database.occurs_checks:
             print("Database is empty")
             return
         
+        for name, arity in self._table_declarations():
+            print(f"(table {name} {arity})")
+        for name, arity, mode in self._occurs_check_declarations():
+            print(f"(occurs_check {name} {arity} {mode})")
+        
         for clause in self.database:
             if clause.is_fact():
                 print(str(clause.head))
@@ -137,35 +164,42 @@ class REPL:
                 parts = [str(clause.head)] + [str(goal) for goal in clause.body]
                 print(f"({' '.join(parts)})")
     
+    def _table_declarations(self) -> list:
+        """Return (name, arity) of the tabled predicates, sorted."""
+        return sorted((name, arity) for name, arity in self.database.tabled if arity is not None)
+    
+    def _occurs_check_declarations(self) -> list:
+        """Return (name, arity, mode) of the predicates with their own occurs check mode, sorted."""
+        return sorted((name, arity, mode) for (name, arity), mode in self.database.occurs_checks.items()
+                      if arity is not None)
+    
     def _handle_clause(self, clause_text: str):
         """Parse and add a clause to the database."""
         try:
-            term = parse_text(clause_text)
-            
-            # Check if it's a rule: ((head) (body1) (body2) ...)
-            if isinstance(term, Compound) and len(term.args) > 0:
-                # First argument is head, rest are body
-                first_arg = term.args[0]
-                
-                # If first arg is a compound, this might be a rule
-                if isinstance(first_arg, Compound) and term.functor == "":
-                    # This is a rule (empty functor means rule syntax)
-                    head = first_arg
-                    body = list(term.args[1:])  # Body might be empty
-                    clause = Clause(head, body)
-                else:
-                    # This is a fact
-                    clause = Clause(term)
-            else:
-                # This is a fact
-                clause = Clause(term)
-            
-            self.database.add_clause(clause)
+            # A rule is ((head) (body1) (body2) ...), anything else a fact
+            clause = clause_from_term(parse_text(clause_text))
+            self._add_clause(clause)
             print("ok")
-            
+        
         except Exception as e:
             print(f"Error parsing clause: {e}")
     
+    def _add_clause(self, clause: Clause):
+        """Add a clause to the database, or record a table declaration."""
+        head = clause.head
+        if (clause.is_fact() and isinstance(head, Compound) and head.functor == 'table'
+                and len(head.args) == 2 and isinstance(head.args[0], Atom)
+                and isinstance(head.args[1], Atom) and isinstance(head.args[1].value, int)):
+            # (table name arity) declares name/arity tabled
+            self.database.table(head.args[0].value, head.args[1].value)
+        elif (clause.is_fact() and isinstance(head, Compound) and head.functor == 'occurs_check'
+                and len(head.args) == 3 and all(isinstance(arg, Atom) for arg in head.args)
+                and isinstance(head.args[1].value, int)):
+            # (occurs_check name arity mode) sets the occurs check of name/arity
+            self.database.set_occurs_check(head.args[0].value, head.args[1].value, head.args[2].value)
+        else:
+            self.database.add_clause(clause)
+    
     def _handle_query(self, query_text: str):
         """Process a query and display solutions."""
         try:
@@ -181,10 +215,42 @@ class REPL:
             else:
                 # Multiple goals or non-builtin - use regular query
                 self._handle_regular_query(goals)
-                
+        
+        except ResourceError as e:
+            print(e)
         except Exception as e:
             print(f"Error processing query: {e}")
     
+    def _time_query(self, query_text: str):
+        """Run a query with the engine counting, then print what it did."""
+        previous = self.engine.counters
+        counters = self.engine.counters = Counters()
+        try:
+            self._handle_query(query_text)
+        finally:
+            self.engine.counters = previous
+        print(counters.summary())
+    
+    def _profile_query(self, query_text: str, filename: Optional[str] = None):
+        """Run a query with the profiler on, then print its table and write collapsed stacks."""
+        if not hasattr(self.engine, 'profiler'):
+            print("Profiling is supported by InferenceEngine only")
+            return
+        previous = self.engine.profiler
+        profiler = self.engine.profiler = Profiler()
+        try:
+            self._handle_query(query_text)
+        finally:
+            self.engine.profiler = previous
+        print(profiler.table(limit=20))
+        if filename:
+            try:
+                with open(filename, 'w') as f:
+                    profiler.write_collapsed(f)
+                print(f"Collapsed stacks written to {filename}")
+            except Exception as e:
+                print(f"Error saving file: {e}")
+    
     def _handle_builtin_query(self, goal: Term):
         """Handle a built-in predicate query."""
         # Collect all variables in the goal
@@ -192,7 +258,7 @@ class REPL:
         
         solution_count = 0
         
-        for subst in self.builtins.evaluate(goal, Substitution()):
+        for subst in self._solutions([goal]):
             solution_count += 1
             
             # Display variable bindings
@@ -227,7 +293,7 @@ class REPL:
         solution_count = 0
         
         # Query with all goals
-        for subst in self.engine.solve(goals):
+        for subst in self._solutions(goals):
             solution_count += 1
             
             # Display variable bindings
@@ -245,6 +311,21 @@ class REPL:
         else:
             print("no more solutions")
     
+    def _solutions(self, goals: list):
+        """
+        Solve goals under the REPL's limits. Ctrl-C while a solution is
+        being searched for cancels the query, not the REPL; pressing it
+        again interrupts right away.
+        """
+        token = CancelToken()
+        solutions = self.engine.solve(goals, replace(self.limits, cancel=token))
+        while True:
+            with _cancel_on_interrupt(token):
+                subst = next(solutions, None)
+            if subst is None:
+                return
+            yield subst
+    
     def _collect_variables(self, term: Term) -> list:
         """Collect all unique variables in a term."""
         variables = []
@@ -319,26 +400,10 @@ class REPL:
                     
                     try:
                         # Parse and add the clause
-                        term = parse_text(clause_text)
-                        
-                        # Check if it's a rule or fact
-                        if isinstance(term, Compound) and len(term.args) > 0:
-                            first_arg = term.args[0]
-                            if isinstance(first_arg, Compound) and term.functor == "":
-                                # This is a rule (empty functor means rule syntax)
-                                head = first_arg
-                                body = list(term.args[1:])
-                                clause = Clause(head, body)
-                            else:
-                                # This is a fact
-                                clause = Clause(term)
-                        else:
-                            # This is a fact
-                            clause = Clause(term)
-                        
-                        self.database.add_clause(clause)
+                        clause = clause_from_term(parse_text(clause_text))
+                        self._add_clause(clause)
                         clause_count += 1
-                        
+                    
                     except Exception as e:
                         print(f"Warning: Error on line {start_line}: {e}")
                     
@@ -351,7 +416,7 @@ class REPL:
                 print(f"Warning: Incomplete clause at end of file (starting line {start_line})")
             
             print(f"Loaded {clause_count} clause(s) from {filename}")
-            
+        
         except FileNotFoundError:
             print(f"Error: File '{filename}' not found")
         except Exception as e:
@@ -364,6 +429,11 @@ class REPL:
                 f.write("% microPROLOG database\n")
                 f.write(f"% Saved clauses: {len(self.database)}\n\n")
                 
+                for name, arity in self._table_declarations():
+                    f.write(f"(table {name} {arity}).\n")
+                for name, arity, mode in self._occurs_check_declarations():
+                    f.write(f"(occurs_check {name} {arity} {mode}).\n")
+                
                 for clause in self.database:
                     if clause.is_fact():
                         f.write(str(clause.head) + '\n')
@@ -373,7 +443,7 @@ class REPL:
                         f.write(f"({' '.join(parts)})\n")
             
             print(f"Saved {len(self.database)} clause(s) to {filename}")
-            
+        
         except Exception as e:
             print(f"Error saving file: {e}")
     
@@ -401,7 +471,7 @@ class REPL:
             print(f"\nTarski's World: {filename}")
             print(f"Objects: {len(objects)}")
             visualize_board(objects)
-            
+        
         except ImportError:
             print("Error: Visualization requires world/visualize_world.py")
             print("This command only works for Tarski's World files.")
@@ -413,3 +483,22 @@ class REPL:
             # Clean up sys.path
             if world_dir in sys.path:
                 sys.path.remove(world_dir)
+
+
+@contextmanager
+def _cancel_on_interrupt(token: CancelToken):
+    """Make SIGINT cancel token instead of raising KeyboardInterrupt, the first time."""
+    if threading.current_thread() is not threading.main_thread():
+        yield  # Only the main thread can handle signals
+        return
+    
+    def interrupt(signum, frame):
+        if token.cancelled:
+            raise KeyboardInterrupt
+        token.cancel()
+    
+    previous = signal.signal(signal.SIGINT, interrupt)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
@@ -0,0 +1,196 @@
+"""
+Tabling (memoized resolution) for microPROLOG.
+
+Calls to predicates declared with (table name arity) are answered from a
+table of answers kept per call variant. Either engine fills a table (see
+Tables) by evaluating the call against the clauses and re-evaluating it
+until no new answers appear, so left-recursive definitions terminate and
+repeated subgoals are looked up instead of recomputed.
+"""
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+from terms import Term, Atom, Variable, Compound, List as ListTerm
+from database import Clause, ClauseTemplate
+from unification import BindingStore, deref
+
+
+def variant_key(term: Term, numbering: Optional[Dict[int, int]] = None) -> Hashable:
+    """
+    Return a hashable key that is equal for variants of a term.
+    
+    Two terms are variants if they are equal up to renaming of variables,
+    so variables are numbered by where they first occur. A list has the
+    same key however its spine is split: [1 2], [1 | [2]] and [1 2 | []]
+    are one answer, although they are different hash-consed terms.
+    """
+    if numbering is None:
+        numbering = {}
+    
+    while isinstance(term, Variable) and term.ref is not None:
+        term = term.ref
+    
+    if isinstance(term, Atom):
+        return term.value
+    
+    elif isinstance(term, Variable):
+        return ('$VAR', numbering.setdefault(id(term), len(numbering)))
+    
+    elif isinstance(term, Compound):
+        return ('()', term.functor) + tuple(variant_key(arg, numbering) for arg in term.args)
+    
+    elif isinstance(term, ListTerm):
+        # Bound tails are spliced in, and [] ends a list like no tail
+        elements = []
+        while isinstance(term, ListTerm):
+            elements.extend(variant_key(elem, numbering) for elem in term.elements)
+            term = deref(term.tail) if term.tail else None
+        tail = variant_key(term, numbering) if term is not None else None
+        return ('[]', tuple(elements), tail)
+    
+    return term
+
+
+def variant_copy(term: Term, mapping: Optional[Dict[int, Variable]] = None) -> Term:
+    """
+    Copy a term with its bindings resolved and fresh variables.
+    
+    Unlike copy_term, variables are told apart by identity, not by name,
+    and the copies are named _G0, _G1, ... in order of appearance.
+    """
+    if mapping is None:
+        mapping = {}
+    
+    while isinstance(term, Variable) and term.ref is not None:
+        term = term.ref
+    
+    if term.ground:
+        return term
+    
+    elif isinstance(term, Variable):
+        if id(term) not in mapping:
+            mapping[id(term)] = Variable(f"_G{len(mapping)}")
+        return mapping[id(term)]
+    
+    elif isinstance(term, Compound):
+        return Compound(term.functor, tuple(variant_copy(arg, mapping) for arg in term.args))
+    
+    elif isinstance(term, ListTerm):
+        new_elements = tuple(variant_copy(elem, mapping) for elem in term.elements)
+        new_tail = variant_copy(term.tail, mapping) if term.tail else None
+        return ListTerm(new_elements, new_tail)
+    
+    return term
+
+
+class Table:
+    """
+    The answers found so far for one variant of a tabled call.
+    
+    Answers are kept as fact clauses, so the engine can resolve a call
+    against them exactly as it would against the database.
+    """
+    
+    def __init__(self):
+        self.answers: List[Clause] = []
+        self._keys = set()
+        self.complete = False  # All answers are known
+        self.index: Optional[int] = None  # Position on the evaluation stack while being evaluated
+        self.low: Optional[int] = None  # Oldest evaluation this one has used answers from
+    
+    def add(self, answer: Term) -> bool:
+        """Add an answer unless a variant of it is already known."""
+        key = variant_key(answer)
+        if key in self._keys:
+            return False
+        
+        self._keys.add(key)
+        clause = Clause(variant_copy(answer))
+        clause.template = ClauseTemplate(clause)
+        self.answers.append(clause)
+        return True
+
+
+class Tables:
+    """
+    The tables of one engine, and the fixpoint that fills them.
+    
+    An engine answers a call of a tabled predicate with answers(), giving
+    it a function that resolves a goal against the predicate's clauses.
+    Calls in there go through answers() again, so this is shared by both
+    engines however they run the clauses.
+    """
+    
+    def __init__(self, generation: int):
+        self.tables: Dict[Hashable, Table] = {}  # Call variant -> Table
+        self.generation = generation  # Database generation the answers were found in
+        self.stack: List[Table] = []  # Tables being evaluated, oldest first
+        self.incomplete: List[Table] = []  # Evaluated tables waiting to be completed
+        self.answer_count = 0  # Answers added to any table
+    
+    def refresh(self, generation: int):
+        """Forget the answers if the clauses changed since they were found."""
+        if self.generation != generation:
+            self.tables.clear()
+            self.generation = generation
+    
+    def abandon(self):
+        """Drop the tables of evaluations stopped by an error."""
+        if self.incomplete:
+            self.tables = {key: table for key, table in self.tables.items() if table.complete}
+            self.stack.clear()
+            self.incomplete.clear()
+    
+    def answers(self, goal: Term, evaluate: Callable[[Term, BindingStore], Iterator],
+                store: BindingStore) -> List[Clause]:
+        """
+        Return the answers to a call of a tabled predicate, as fact clauses.
+        
+        A new call variant is evaluated against the clauses again and again
+        until a round adds no answer to any table: evaluate(goal, store)
+        yields once per solution, with goal's variables bound. A call to a
+        variant that is still being evaluated further up gets the answers
+        found so far. Evaluations that used such answers complete together
+        with the oldest evaluation they depend on.
+        """
+        key = variant_key(goal)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = Table()
+        elif table.complete:
+            return table.answers
+        elif table.index is not None:
+            # Recursive call of a variant being evaluated
+            caller = self.stack[-1]
+            caller.low = min(caller.low, table.index)
+            return list(table.answers)
+        
+        stack = self.stack
+        table.index = table.low = len(stack)
+        stack.append(table)
+        pending = len(self.incomplete)
+        self.incomplete.append(table)
+        
+        try:
+            while True:
+                found = self.answer_count
+                # A fresh copy each round: the caller's variables are never
+                # bound, and untrailed bindings of the last round do not leak
+                copy = variant_copy(goal)
+                for _ in evaluate(copy, store):
+                    if table.add(copy):
+                        self.answer_count += 1
+                if self.answer_count == found:
+                    break
+        finally:
+            stack.pop()
+            table.index = None
+        
+        if table.low == len(stack):
+            # Depends on nothing older: everything evaluated since is final
+            for evaluated in self.incomplete[pending:]:
+                evaluated.complete = True
+            del self.incomplete[pending:]
+            return table.answers
+        
+        caller = stack[-1]
+        caller.low = min(caller.low, table.low)
+        return list(table.answers)
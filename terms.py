@@ -1,14 +1,89 @@
 """
 Core data structures for microPROLOG terms.
 """
-from dataclasses import dataclass
-from typing import Union, List, Any
+import itertools
+import weakref
+from dataclasses import dataclass, field
+from typing import Union, List as List_, Dict, Any
+
+
+# Serial numbers give variables a creation order (see BindingStore.bind)
+variable_serials = itertools.count()
+
+
+class TermTable:
+    """
+    The hash-consing table of ground compound terms and lists.
+    
+    A term is found by its parts: (functor, args) for a compound term and
+    (elements, tail) for a list. The table refers to terms weakly, so a
+    term leaves it as soon as the program drops it; the key only refers to
+    the parts, which are interned terms themselves.
+    """
+    
+    def __init__(self):
+        self.terms = weakref.WeakValueDictionary()
+    
+    def get(self, key: tuple):
+        """Return the term with these parts, or None."""
+        return self.terms.get(key)
+    
+    def add(self, key: tuple, term):
+        """Add a term under its parts."""
+        self.terms[key] = term
+    
+    def __len__(self):
+        return len(self.terms)
+
+
+# Symbol table: every symbol atom exists once and is numbered in order of
+# first use. Ground compound terms and lists are hash-consed in ground_terms,
+# so building an equal ground term returns the existing one.
+symbols: List_['Atom'] = []
+_symbol_atoms: Dict[str, 'Atom'] = {}
+ground_terms = TermTable()
 
 
-@dataclass(frozen=True)
 class Atom:
-    """Represents atomic values: atoms (strings) or numbers."""
-    value: Union[str, int, float]
+    """
+    Represents atomic values: atoms (strings) or numbers.
+    
+    Symbols are interned: Atom('tom') always returns the same object, and
+    ``symbol`` is its number in the symbol table. Numbers are not
+    interned and have ``symbol`` None.
+    """
+    __slots__ = ('value', 'symbol', '_hash')
+    ground = True
+    interned = True  # Hashed in O(1), so terms made of atoms can be hash-consed
+    
+    def __new__(cls, value: Union[str, int, float]):
+        if type(value) is str:
+            atom = _symbol_atoms.get(value)
+            if atom is None:
+                atom = object.__new__(cls)
+                atom.value = value
+                atom.symbol = len(symbols)
+                atom._hash = hash(value)
+                symbols.append(atom)
+                _symbol_atoms[value] = atom
+            return atom
+        
+        atom = object.__new__(cls)
+        atom.value = value
+        atom.symbol = None
+        atom._hash = hash(value)
+        return atom
+    
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not Atom:
+            return NotImplemented
+        # 1 and 1.0 are different atoms
+        return type(self.value) is type(other.value) and self.value == other.value
+    
+    def __hash__(self):
+        return self._hash
     
     def __repr__(self):
         return f"Atom({self.value!r})"
@@ -17,10 +92,25 @@ class Atom:
         return str(self.value)
 
 
-@dataclass(frozen=True)
+@dataclass(eq=False, slots=True)
 class Variable:
-    """Represents logical variables (uppercase names or underscore)."""
+    """
+    Represents logical variables (uppercase names or underscore).
+    
+    Unlike the other terms a variable is mutable: it is its own binding
+    cell. ``ref`` is None while the variable is unbound and holds the bound
+    term otherwise. It is only set through a BindingStore (see
+    unification.py), which trails the binding so it can be undone.
+    ``serial`` orders variables by creation time.
+    """
     name: str
+    ref: Any = field(default=None, repr=False)
+    serial: int = field(default_factory=variable_serials.__next__, repr=False)
+    
+    # Class attributes, not fields: terms containing a variable are neither
+    # ground nor hash-consed
+    ground = False
+    interned = False
     
     def __repr__(self):
         return f"Variable({self.name!r})"
@@ -29,28 +119,147 @@ class Variable:
         return self.name
 
 
-@dataclass(frozen=True)
 class Compound:
-    """Represents compound terms: (functor arg1 arg2 ...)"""
-    functor: str
-    args: tuple  # Tuple of Terms for immutability
+    """
+    Represents compound terms: (functor arg1 arg2 ...)
+    
+    A compound term without variables is hash-consed: there is only one
+    such term per functor and arguments, so interned terms are equal
+    exactly when they are the same object. The hash is computed once.
+    ``ground`` is set when the term has no variables and ``interned`` when
+    it was hash-consed, which it is unless an argument is a list view.
+    """
+    __slots__ = ('functor', 'args', 'ground', 'interned', '_hash', '__weakref__')
+    
+    def __new__(cls, functor: str, args: tuple):
+        for arg in args:
+            if not arg.interned:
+                term = object.__new__(cls)
+                term.functor = functor
+                term.args = args  # Tuple of Terms for immutability
+                term.ground = arg.ground and all(arg.ground for arg in args)
+                term.interned = False
+                term._hash = None
+                return term
+        
+        key = (functor, args)
+        term = ground_terms.get(key)
+        if term is not None:
+            return term
+        term = object.__new__(cls)
+        term.functor = functor
+        term.args = args
+        term.ground = True
+        term.interned = True
+        term._hash = hash(key)
+        ground_terms.add(key, term)
+        return term
+    
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not Compound:
+            return NotImplemented
+        if self.interned and other.interned:
+            return False  # Hash-consed, so equal terms are identical
+        return self.functor == other.functor and self.args == other.args
+    
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.functor, self.args))
+        return self._hash
     
     def __repr__(self):
         args_repr = ", ".join(repr(arg) for arg in self.args)
         return f"Compound({self.functor!r}, ({args_repr}))"
     
     def __str__(self):
-        if not self.args:
-            return f"({self.functor})"
-        args_str = " ".join(str(arg) for arg in self.args)
-        return f"({self.functor} {args_str})"
+        return _text(self)
 
 
-@dataclass(frozen=True)
 class List:
-    """Represents lists: [] or [head|tail]"""
-    elements: tuple  # Tuple of Terms
-    tail: Any = None  # Can be Variable, another List, or None
+    """
+    Represents lists: [] or [head|tail]
+    
+    The elements are ``items[start:]``. rest() drops elements from the
+    front by making a view that shares items with a larger start, so
+    taking the tail of [H | T] costs the same for any length of list.
+    Lists without variables are hash-consed like compound terms; views
+    are not, since that would mean hashing all their elements.
+    """
+    __slots__ = ('items', 'start', 'tail', 'ground', 'interned', '_hash', '__weakref__')
+    
+    def __new__(cls, elements: tuple, tail: Any = None):
+        # elements is a tuple of Terms; tail can be a Variable, another List, or None
+        interned = tail is None or tail.interned
+        if interned:
+            for elem in elements:
+                if not elem.interned:
+                    interned = False
+                    break
+        
+        if not interned:
+            term = object.__new__(cls)
+            term.items = elements
+            term.start = 0
+            term.tail = tail
+            term.ground = (tail is None or tail.ground) and all(elem.ground for elem in elements)
+            term.interned = False
+            term._hash = None
+            return term
+        
+        key = (elements, tail)
+        term = ground_terms.get(key)
+        if term is not None:
+            return term
+        term = object.__new__(cls)
+        term.items = elements
+        term.start = 0
+        term.tail = tail
+        term.ground = True
+        term.interned = True
+        term._hash = hash(key)
+        ground_terms.add(key, term)
+        return term
+    
+    @property
+    def elements(self) -> tuple:
+        """The elements before the tail (a copy for views)."""
+        return self.items[self.start:] if self.start else self.items
+    
+    @property
+    def size(self) -> int:
+        """The number of elements before the tail."""
+        return len(self.items) - self.start
+    
+    def rest(self, n: int):
+        """Return the list after its first n elements, sharing them."""
+        if n == 0:
+            return self
+        if n == len(self.items) - self.start:
+            return self.tail if self.tail else EMPTY_LIST
+        view = object.__new__(List)
+        view.items = self.items
+        view.start = self.start + n
+        view.tail = self.tail
+        view.ground = self.ground
+        view.interned = False
+        view._hash = None
+        return view
+    
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not List:
+            return NotImplemented
+        if self.interned and other.interned:
+            return False  # Hash-consed, so equal terms are identical
+        return self.elements == other.elements and self.tail == other.tail
+    
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.elements, self.tail))
+        return self._hash
     
     def __repr__(self):
         if self.tail:
@@ -58,13 +267,70 @@ class List:
         return f"List({self.elements!r})"
     
     def __str__(self):
-        if not self.elements and not self.tail:
-            return "[]"
-        if self.tail:
-            elements_str = " ".join(str(e) for e in self.elements)
-            return f"[{elements_str} | {self.tail}]"
-        elements_str = " ".join(str(e) for e in self.elements)
-        return f"[{elements_str}]"
+        return _text(self)
+
+
+EMPTY_LIST = List(())
+
+
+def _text(term) -> str:
+    """
+    The text of a compound term or list, written with a stack of the
+    pieces still to write instead of recursing, so deep terms print.
+    """
+    out = []
+    pending = [term]  # Terms and strings still to write, the next one last
+    while pending:
+        item = pending.pop()
+        if type(item) is str:
+            out.append(item)
+        elif isinstance(item, Compound):
+            if not item.args:
+                out.append(f"({item.functor})")
+                continue
+            out.append(f"({item.functor}")
+            pending.append(")")
+            for arg in reversed(item.args):
+                pending.append(arg)
+                pending.append(" ")
+        elif isinstance(item, List):
+            # A list tail continues the list: [1 | [2 3]] prints as [1 2 3]
+            elements = list(item.elements)
+            tail = item.tail
+            while isinstance(tail, List):
+                elements.extend(tail.elements)
+                tail = tail.tail
+            out.append("[")
+            pending.append("]")
+            if tail:
+                pending.append(tail)
+                pending.append(" | ")
+            for i in range(len(elements) - 1, -1, -1):
+                pending.append(elements[i])
+                if i:
+                    pending.append(" ")
+        else:
+            out.append(str(item))
+    return "".join(out)
+
+
+class Slot:
+    """
+    A numbered variable slot in a precompiled clause template.
+    
+    Slots are not terms: a template is turned into terms by filling a
+    frame, a list with one entry per slot (see unification.instantiate).
+    """
+    __slots__ = ('index', 'name')
+    ground = False
+    interned = False
+    
+    def __init__(self, index: int, name: str):
+        self.index = index
+        self.name = name  # Name of the clause variable
+    
+    def __repr__(self):
+        return f"Slot({self.index}, {self.name!r})"
 
 
 # Type alias for any term
@@ -1,22 +1,274 @@
 """
-Unification algorithm and substitution management for microPROLOG.
+Unification algorithm and binding management for microPROLOG.
 """
-from typing import Optional, Dict
-from terms import Term, Atom, Variable, Compound, List as ListTerm
+import math
+from typing import Callable, Optional, Dict, Iterable
+from terms import Term, Atom, Variable, Compound, List as ListTerm, EMPTY_LIST, Slot, variable_serials
+
+
+# How unification treats binding a variable to a term that contains it:
+# 'full' always checks, 'off' never does (such bindings make cyclic terms),
+# 'auto' only checks where a clause head repeats a variable.
+OCCURS_CHECK_MODES = ('full', 'off', 'auto')
+
+
+def deref(term: Term) -> Term:
+    """Follow variable bindings until an unbound variable or a non-variable."""
+    while isinstance(term, Variable) and term.ref is not None:
+        term = term.ref
+    return term
+
+
+def _apply_all(bindings, terms: tuple) -> Optional[tuple]:
+    """Apply bindings to each of terms; None if none of them changed."""
+    changed = None
+    for i, term in enumerate(terms):
+        new = bindings.apply(term)
+        if changed is None:
+            if new is term:
+                continue
+            changed = list(terms[:i])
+        changed.append(new)
+    return None if changed is None else tuple(changed)
+
+
+def _unbound(var: Variable) -> Variable:
+    """An unbound variable stands for itself in BindingStore.apply."""
+    return var
+
+
+def resolve(term: Term, unbound: Callable[[Variable], Term]) -> Term:
+    """
+    Return term with its bound variables replaced by their values, and
+    each unbound variable by unbound(variable).
+    
+    Compound terms and lists are walked with a stack instead of
+    recursing, so terms of any depth can be resolved. Bound list tails
+    are spliced in, so a list built cell by cell comes out as one list.
+    Parts that do not change are returned as the same object.
+    """
+    term = deref(term)
+    if term.ground:
+        return term
+    if isinstance(term, Variable):
+        return unbound(term)
+    if not isinstance(term, (Compound, ListTerm)):
+        return term
+    
+    # Each entry: the term, its parts (arguments, or a list's elements
+    # and then its tail), their values so far, and whether it changed
+    stack = [_resolving(term)]
+    while True:
+        entry = stack[-1]
+        parts, values = entry[1], entry[2]
+        if len(values) < len(parts):
+            part = deref(parts[len(values)])
+            if part.ground:
+                values.append(part)
+            elif isinstance(part, Variable):
+                values.append(unbound(part))
+            elif isinstance(part, (Compound, ListTerm)):
+                stack.append(_resolving(part))
+            else:
+                values.append(part)
+            continue
+        
+        stack.pop()
+        term, changed = entry[0], entry[3]
+        if changed or any(value is not part for value, part in zip(values, parts)):
+            if isinstance(term, Compound):
+                term = Compound(term.functor, tuple(values))
+            elif entry[4]:
+                term = ListTerm(tuple(values[:-1]), values[-1])
+            else:
+                term = ListTerm(tuple(values), None)
+        if not stack:
+            return term
+        stack[-1][2].append(term)
+
+
+def _resolving(term: Term) -> list:
+    """
+    Start resolving a compound term or list for resolve(): [term, parts,
+    values, changed, has tail]. A list's bound tails are followed here.
+    """
+    if isinstance(term, Compound):
+        return [term, term.args, [], False, False]
+    
+    parts = list(term.elements)
+    changed = False
+    tail = term.tail
+    while tail is not None:
+        value = deref(tail)
+        if not isinstance(value, ListTerm):
+            break
+        parts.extend(value.elements)
+        tail = value.tail
+        changed = True  # Spliced in
+    if tail is None:
+        return [term, parts, [], changed, False]
+    parts.append(tail)
+    return [term, parts, [], changed, True]
+
+
+class BindingStore:
+    """
+    Mutable variable bindings with a trail.
+    
+    Variables are bound in place (``Variable.ref``) and bindings are pushed
+    on the trail. Backtracking takes a ``mark()`` and later calls
+    ``undo_to(mark)`` to reset everything bound since then.
+    
+    Only variables with a serial below ``boundary`` are trailed. The
+    inference engine sets it to the serial taken by its newest choicepoint:
+    variables created after that are unreachable once it backtracks there,
+    so their bindings never need undoing. This keeps the trail from
+    growing in deterministic loops. The default trails every binding.
+    
+    ``occurs_check`` decides whether unify() refuses to bind a variable
+    to a term containing it. The inference engine switches it per clause
+    according to its occurs check mode.
+    
+    ``budget`` holds the limits of the query the store belongs to (see
+    limits.Budget), so nested searches count against them too, and
+    ``counters`` its work counters when counting is on (see counters.py).
+    """
+    
+    def __init__(self):
+        self.trail: list = []
+        self.boundary = math.inf
+        self.occurs_check = True
+        self.budget = None
+        self.counters = None
+    
+    def bind(self, var: Variable, term: Term):
+        """Bind an unbound variable to a term, trailing it if needed."""
+        var.ref = term
+        if var.serial < self.boundary:
+            self.trail.append(var)
+    
+    def mark(self) -> int:
+        """Return the current trail position."""
+        return len(self.trail)
+    
+    def undo_to(self, mark: int):
+        """Undo all bindings made since mark was taken."""
+        trail = self.trail
+        while len(trail) > mark:
+            trail.pop().ref = None
+    
+    def tidy(self, mark: int):
+        """
+        Drop trail entries above mark that no longer need undoing.
+        
+        Called after a cut, with mark and boundary taken from the newest
+        remaining choicepoint: variables created after it cannot be
+        reached once it backtracks, so their entries can go.
+        """
+        trail = self.trail
+        if len(trail) > mark:
+            boundary = self.boundary
+            kept = [var for var in trail[mark:] if var.serial < boundary]
+            del trail[mark:]
+            trail.extend(kept)
+    
+    def lookup(self, var: Variable) -> Optional[Term]:
+        """Look up a variable, following the binding chain."""
+        term = var.ref
+        if term is None:
+            return None
+        
+        # Follow chain of variable bindings
+        while isinstance(term, Variable) and term.ref is not None:
+            term = term.ref
+        
+        return term
+    
+    def apply(self, term: Term) -> Term:
+        """
+        Return term with all bound variables replaced by their values.
+        
+        Used for answers and printing; unification only dereferences. Any
+        part of term that contains no bound variable is returned as the
+        same object, so applying to an unbound term allocates nothing.
+        """
+        if term.ground:
+            return term
+        return resolve(term, _unbound)
+    
+    def apply_cyclic(self, term: Term, expanding: Optional[set] = None) -> Term:
+        """
+        Like apply, but safe for cyclic (rational) terms.
+        
+        Without occurs check a variable can be bound to a term containing
+        it. A variable met again inside its own value is left as it is, so
+        X = (f X) comes out as (f X) instead of recursing forever.
+        """
+        if term.ground:
+            return term
+        
+        if expanding is None:
+            expanding = set()
+        
+        if isinstance(term, Variable):
+            bound = self.lookup(term)
+            if bound is None or id(term) in expanding:
+                return term
+            expanding.add(id(term))
+            value = self.apply_cyclic(bound, expanding)
+            expanding.discard(id(term))
+            return value
+        
+        elif isinstance(term, Compound):
+            return Compound(term.functor, tuple(self.apply_cyclic(arg, expanding) for arg in term.args))
+        
+        elif isinstance(term, ListTerm):
+            # Follow the tails in a loop, expanding each tail variable once
+            elements = []
+            entered = []
+            tail = term
+            while isinstance(tail, ListTerm):
+                elements.extend(self.apply_cyclic(elem, expanding) for elem in tail.elements)
+                tail = tail.tail
+                while isinstance(tail, Variable) and tail.ref is not None and id(tail) not in expanding:
+                    expanding.add(id(tail))
+                    entered.append(id(tail))
+                    tail = tail.ref
+            if tail is not None and not isinstance(tail, Variable):
+                tail = self.apply_cyclic(tail, expanding)
+            for var_id in entered:
+                expanding.discard(var_id)
+            return ListTerm(tuple(elements), tail)
+        
+        return term
+    
+    def snapshot(self, variables: Iterable[Variable], cyclic: bool = False) -> 'Substitution':
+        """
+        Capture the current values of variables as a Substitution.
+        
+        The snapshot holds fully applied terms, so it stays valid after
+        the store backtracks past the bindings it was taken from.
+        Unbound variables are left out. Pass cyclic=True when bindings may
+        have been made without occurs check (see apply_cyclic).
+        """
+        apply = self.apply_cyclic if cyclic else self.apply
+        bindings = {}
+        for var in variables:
+            value = apply(var)
+            if value is not var:
+                bindings[var.name] = value
+        return Substitution(bindings)
+    
+    def __repr__(self):
+        return f"BindingStore({len(self.trail)} bindings)"
 
 
 class Substitution:
-    """Represents variable bindings."""
+    """An immutable set of variable bindings, keyed by variable name."""
     
     def __init__(self, bindings: Optional[Dict[str, Term]] = None):
         self.bindings = bindings if bindings is not None else {}
     
-    def bind(self, var_name: str, term: Term) -> 'Substitution':
-        """Create a new substitution with an additional binding."""
-        new_bindings = self.bindings.copy()
-        new_bindings[var_name] = term
-        return Substitution(new_bindings)
-    
     def lookup(self, var_name: str) -> Optional[Term]:
         """Look up a variable, following the binding chain."""
         if var_name not in self.bindings:
@@ -31,8 +283,8 @@ class Substitution:
         return term
     
     def apply(self, term: Term) -> Term:
-        """Apply substitution to a term."""
-        if isinstance(term, Atom):
+        """Apply substitution to a term, returning unchanged parts as they are."""
+        if term.ground:
             return term
         
         elif isinstance(term, Variable):
@@ -42,13 +294,17 @@ class Substitution:
             return term
         
         elif isinstance(term, Compound):
-            new_args = tuple(self.apply(arg) for arg in term.args)
+            new_args = _apply_all(self, term.args)
+            if new_args is None:
+                return term
             return Compound(term.functor, new_args)
         
         elif isinstance(term, ListTerm):
-            new_elements = tuple(self.apply(elem) for elem in term.elements)
+            new_elements = _apply_all(self, term.elements)
             new_tail = self.apply(term.tail) if term.tail else None
-            return ListTerm(new_elements, new_tail)
+            if new_elements is None and new_tail is term.tail:
+                return term
+            return ListTerm(term.elements if new_elements is None else new_elements, new_tail)
         
         return term
     
@@ -60,116 +316,294 @@ class Substitution:
         return "{" + ", ".join(items) + "}"
 
 
-def occurs_check(var: Variable, term: Term, subst: Substitution) -> bool:
+def copy_term(term: Term, var_map: Optional[Dict[str, Variable]] = None) -> Term:
     """
-    Check if variable occurs in term (prevents infinite structures).
-    Returns True if var occurs in term.
+    Copy a term, replacing its variables with fresh unbound ones.
+    
+    Variables are matched by name, so every occurrence of X in the parsed
+    text becomes the same variable. Pass var_map to share variables
+    between several terms (e.g. the goals of one query).
     """
-    # Apply substitution first
-    term = subst.apply(term)
+    if term.ground:
+        return term
+    
+    if var_map is None:
+        var_map = {}
     
     if isinstance(term, Variable):
-        return var.name == term.name
+        if term.name not in var_map:
+            var_map[term.name] = Variable(term.name)
+        return var_map[term.name]
     
     elif isinstance(term, Compound):
-        return any(occurs_check(var, arg, subst) for arg in term.args)
+        return Compound(term.functor, tuple(copy_term(arg, var_map) for arg in term.args))
     
     elif isinstance(term, ListTerm):
-        for elem in term.elements:
-            if occurs_check(var, elem, subst):
-                return True
-        if term.tail:
-            return occurs_check(var, term.tail, subst)
-        return False
+        new_elements = tuple(copy_term(elem, var_map) for elem in term.elements)
+        new_tail = copy_term(term.tail, var_map) if term.tail else None
+        return ListTerm(new_elements, new_tail)
     
-    return False
+    return term
 
 
-def unify(term1: Term, term2: Term, subst: Optional[Substitution] = None) -> Optional[Substitution]:
+def copy_resolved(term: Term, mapping: Optional[Dict[int, Variable]] = None) -> Term:
     """
-    Unify two terms, returning updated Substitution or None if unification fails.
+    Copy a term with its bindings resolved and fresh unbound variables.
+    
+    Unlike copy_term, variables are told apart by identity rather than by
+    name, so the copy keeps its values after the bindings are undone (see
+    findall). Pass mapping to copy several terms with shared variables.
     """
-    if subst is None:
-        subst = Substitution()
+    if term.ground:
+        return term
     
-    # Apply current substitution to both terms
-    term1 = subst.apply(term1)
-    term2 = subst.apply(term2)
+    if mapping is None:
+        mapping = {}
     
-    # Both are atoms
-    if isinstance(term1, Atom) and isinstance(term2, Atom):
-        if term1.value == term2.value:
-            return subst
-        return None
+    def fresh(var: Variable) -> Variable:
+        copy = mapping.get(id(var))
+        if copy is None:
+            serial = next(variable_serials)
+            copy = mapping[id(var)] = Variable(f"_G{serial}", None, serial)
+        return copy
     
-    # term1 is a variable
-    elif isinstance(term1, Variable):
-        if isinstance(term2, Variable) and term1.name == term2.name:
-            return subst  # Same variable
-        if occurs_check(term1, term2, subst):
-            return None  # Occurs check fails
-        return subst.bind(term1.name, term2)
+    return resolve(term, fresh)
+
+
+def unifiable(term1: Term, term2: Term, store: BindingStore) -> bool:
+    """Test whether two terms unify, leaving no bindings behind."""
+    mark = store.mark()
+    boundary = store.boundary
+    store.boundary = math.inf  # Trail everything so all of it is undone
     
-    # term2 is a variable
-    elif isinstance(term2, Variable):
-        if occurs_check(term2, term1, subst):
-            return None  # Occurs check fails
-        return subst.bind(term2.name, term1)
+    result = unify(term1, term2, store)
     
-    # Both are compounds
-    elif isinstance(term1, Compound) and isinstance(term2, Compound):
-        # Functors must match
-        if term1.functor != term2.functor:
-            return None
-        
-        # Arity must match
-        if len(term1.args) != len(term2.args):
-            return None
+    store.undo_to(mark)
+    store.boundary = boundary
+    return result
+
+
+def occurs_check(var: Variable, term: Term, store: BindingStore) -> bool:
+    """
+    Check if variable occurs in term (prevents infinite structures).
+    Returns True if var occurs in term.
+    """
+    pending = [term]  # Subterms still to look in
+    while pending:
+        term = deref(pending.pop())
+        if term.ground:
+            continue
+        elif isinstance(term, Variable):
+            if var is term:
+                return True
+        elif isinstance(term, Compound):
+            pending.extend(term.args)
+        elif isinstance(term, ListTerm):
+            pending.extend(term.elements)
+            if term.tail:
+                pending.append(term.tail)
+    return False
+
+
+def unify(term1: Term, term2: Term, store: BindingStore) -> bool:
+    """
+    Unify two terms, binding variables in store.
+    
+    Returns False if unification fails. Bindings made before the failure
+    are left on the trail; callers undo them with store.undo_to().
+    
+    Variables are only dereferenced as they are reached; the terms are
+    never rebuilt with their bindings applied. Bindings are only checked
+    for cycles while store.occurs_check is set. The pairs of compound
+    arguments still to unify are kept on a stack, so deep terms do not
+    recurse.
+    """
+    pending = None  # (term1, term2) pairs still to unify, the next one last
+    while True:
+        term1 = deref(term1)
+        term2 = deref(term2)
         
-        # Unify arguments
-        for arg1, arg2 in zip(term1.args, term2.args):
-            subst = unify(arg1, arg2, subst)
-            if subst is None:
-                return None
+        if term1 is term2:
+            pass  # Same variable, or the same shared subterm
         
-        return subst
-    
-    # Both are lists
-    elif isinstance(term1, ListTerm) and isinstance(term2, ListTerm):
-        # Empty lists
-        if not term1.elements and not term1.tail and not term2.elements and not term2.tail:
-            return subst
+        # Both are atoms
+        elif isinstance(term1, Atom) and isinstance(term2, Atom):
+            if term1.value != term2.value:
+                return False
         
-        # One empty, one not
-        if (not term1.elements and not term1.tail) or (not term2.elements and not term2.tail):
-            return None
+        # term1 is a variable
+        elif isinstance(term1, Variable):
+            if store.occurs_check and occurs_check(term1, term2, store):
+                return False  # Occurs check fails
+            store.bind(term1, term2)
         
-        # Unify elements
-        min_len = min(len(term1.elements), len(term2.elements))
+        # term2 is a variable
+        elif isinstance(term2, Variable):
+            if store.occurs_check and occurs_check(term2, term1, store):
+                return False  # Occurs check fails
+            store.bind(term2, term1)
         
-        for i in range(min_len):
-            subst = unify(term1.elements[i], term2.elements[i], subst)
-            if subst is None:
-                return None
+        # Both are compounds: functors and arities must match
+        elif isinstance(term1, Compound) and isinstance(term2, Compound):
+            args1, args2 = term1.args, term2.args
+            if term1.functor != term2.functor or len(args1) != len(args2):
+                return False
+            if pending is None:
+                pending = []
+            if not _unify_args(args1, args2, store, pending):
+                return False
         
-        # Handle remaining elements and tails
-        remaining1 = term1.elements[min_len:]
-        remaining2 = term2.elements[min_len:]
+        # Both are lists: match the elements both have, then what is left
+        # of each. rest() shares the elements, so nothing is copied.
+        elif isinstance(term1, ListTerm) and isinstance(term2, ListTerm):
+            size1 = term1.size
+            size2 = term2.size
+            if size1 and size2:
+                n = min(size1, size2)
+                start1, start2 = term1.start, term2.start
+                if pending is None:
+                    pending = []
+                mark = len(pending)
+                if not _unify_args(term1.items[start1:start1 + n], term2.items[start2:start2 + n], store, pending):
+                    return False
+                if len(pending) == mark:
+                    # Nothing left among the elements: go on with the rests
+                    term1 = term1.rest(n)
+                    term2 = term2.rest(n)
+                    continue
+                pending.insert(mark, (term1.rest(n), term2.rest(n)))
+            elif not size1 and term1.tail:
+                term1 = term1.tail  # [| T] is just T
+                continue
+            elif not size2 and term2.tail:
+                term2 = term2.tail
+                continue
+            elif size1 or size2:
+                return False  # Empty only matches empty
         
-        # Construct tail for term1
-        if remaining1:
-            tail1 = ListTerm(remaining1, term1.tail)
+        # Different types - cannot unify
         else:
-            tail1 = term1.tail if term1.tail else ListTerm(tuple())
+            return False
         
-        # Construct tail for term2
-        if remaining2:
-            tail2 = ListTerm(remaining2, term2.tail)
+        if not pending:
+            return True
+        term1, term2 = pending.pop()
+
+
+def _unify_args(args1: tuple, args2: tuple, store: BindingStore, pending: list) -> bool:
+    """
+    Unify the pairs of arguments that are atoms or variables, and push
+    the others onto unify's stack, so the first of them is taken next.
+    """
+    mark = len(pending)
+    for arg1, arg2 in zip(args1, args2):
+        arg1 = deref(arg1)
+        arg2 = deref(arg2)
+        if arg1 is arg2:
+            continue
+        if isinstance(arg1, Variable):
+            if store.occurs_check and occurs_check(arg1, arg2, store):
+                return False
+            store.bind(arg1, arg2)
+        elif isinstance(arg2, Variable):
+            if store.occurs_check and occurs_check(arg2, arg1, store):
+                return False
+            store.bind(arg2, arg1)
+        elif isinstance(arg1, Atom):
+            if not isinstance(arg2, Atom) or arg1.value != arg2.value:
+                return False
         else:
-            tail2 = term2.tail if term2.tail else ListTerm(tuple())
+            pending.append((arg1, arg2))
+    if len(pending) - mark > 1:
+        pending[mark:] = reversed(pending[mark:])
+    return True
+
+
+def instantiate(template, frame: list) -> Term:
+    """
+    Build a term from a clause template.
+    
+    Slots take their value from frame; empty slots are filled with fresh
+    variables first, named after the clause variable and their serial.
+    Subterms without slots are ground and returned as they are.
+    """
+    if template.ground:
+        return template
+    
+    if isinstance(template, Slot):
+        value = frame[template.index]
+        if value is None:
+            serial = next(variable_serials)
+            value = frame[template.index] = Variable(f"{template.name}_{serial}", None, serial)
+        return value
+    
+    elif isinstance(template, Compound):
+        return Compound(template.functor, tuple(instantiate(arg, frame) for arg in template.args))
+    
+    elif isinstance(template, ListTerm):
+        new_elements = tuple(instantiate(elem, frame) for elem in template.elements)
+        new_tail = instantiate(template.tail, frame) if template.tail else None
+        return ListTerm(new_elements, new_tail)
+    
+    return template
+
+
+def unify_head(template, term: Term, frame: list, store: BindingStore) -> bool:
+    """
+    Unify a clause template with a term without building the template.
+    
+    The first occurrence of a slot simply takes the matching part of term;
+    later occurrences are unified with it. Parts of the template are only
+    built when they meet an unbound variable. Since a first occurrence
+    binds nothing, it never needs an occurs check either.
+    """
+    if isinstance(template, Slot):
+        value = frame[template.index]
+        if value is None:
+            frame[template.index] = term
+            return True
+        return unify(value, term, store)
+    
+    while isinstance(term, Variable):
+        if term.ref is None:
+            return unify(term, instantiate(template, frame), store)
+        term = term.ref
+    
+    if isinstance(template, Atom):
+        return isinstance(term, Atom) and term.value == template.value
+    
+    elif isinstance(template, Compound):
+        if not isinstance(term, Compound) or term.functor != template.functor:
+            return False
+        if len(term.args) != len(template.args):
+            return False
+        for arg_template, arg in zip(template.args, term.args):
+            if not unify_head(arg_template, arg, frame, store):
+                return False
+        return True
+    
+    elif isinstance(template, ListTerm):
+        if not isinstance(term, ListTerm):
+            return False
+        items, i = term.items, term.start
+        for n, elem_template in enumerate(template.items):
+            while i == len(items):
+                # Out of elements: continue in the tail of term
+                tail = deref(term.tail) if term.tail else None
+                if isinstance(tail, Variable):
+                    rest = ListTerm(template.items[n:], template.tail)
+                    return unify(tail, instantiate(rest, frame), store)
+                if not isinstance(tail, ListTerm) or (not tail.size and not tail.tail):
+                    return False
+                term, items, i = tail, tail.items, tail.start
+            if not unify_head(elem_template, items[i], frame, store):
+                return False
+            i += 1
         
-        # Unify tails
-        return unify(tail1, tail2, subst)
+        # The rest of term goes with the tail of the template
+        rest = term.rest(i - term.start)
+        if template.tail:
+            return unify_head(template.tail, rest, frame, store)
+        return unify(rest, EMPTY_LIST, store)
     
-    # Different types - cannot unify
-    return None
+    return unify(instantiate(template, frame), term, store)
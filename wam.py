@@ -0,0 +1,1189 @@
+"""
+WAM-style compiler and virtual machine for microPROLOG.
+
+An alternative execution backend to InferenceEngine. Each predicate in the
+database is compiled once into a list of instructions modelled on the
+Warren Abstract Machine:
+
+- get_* instructions match a call's arguments against a clause head,
+- put_* instructions load the arguments for the next call,
+- unify_* instructions walk the arguments of a structure or list,
+- call/execute/proceed pass control between predicates, and
+- try_me_else/retry_me_else/trust_me manage the choicepoint for a
+  predicate with several clauses, and
+- switch_on_term picks the clauses a call's first argument may match,
+  with try/retry/trust chaining them when there are several.
+
+A tabled predicate compiles to a single tabled instruction that answers
+calls from the tables of tabling.Tables, which both engines share; its
+clauses are only run to fill them.
+
+A clause's variables live in numbered slots of one frame list, so calling
+a clause allocates that list instead of renaming the clause. Terms, the
+binding store and the built-in predicates are shared with InferenceEngine,
+so both backends give the same answers.
+"""
+from functools import partial
+from typing import Dict, List, Generator, Iterator, Optional, Tuple
+from terms import Term, Atom, Variable, Compound, List as ListTerm, EMPTY_LIST, Slot, variable_serials
+from database import Database, Clause, ArgumentIndex, argument_key
+from unification import (BindingStore, Substitution, OCCURS_CHECK_MODES, copy_term, deref,
+                         occurs_check, unify)
+from builtin_predicates import BuiltinRegistry, is_control
+from arithmetic import COMPARISONS, compile_goal
+from limits import QueryLimits, LimitedStore
+from counters import Counters, CountingStore
+from tabling import Tables
+
+
+# Opcodes
+FRAME = 0           # n, check           new frame of n variable slots; check: occurs check in the head
+ALLOCATE = 1        #                    push an environment for a rule body
+GET_VAR_FIRST = 2   # slot, reg          first occurrence of a head variable
+GET_VALUE = 3       # slot, reg          later occurrence of a head variable
+GET_CONST = 4       # const, reg         atom, number or []
+GET_STRUCT = 5      # functor, n, reg    compound term; n unify_* follow
+GET_LIST = 6        # k, reg             list of k elements; k + 1 unify_* follow
+UNIFY_VAR_FIRST = 7  # slot
+UNIFY_VALUE = 8     # slot
+UNIFY_CONST = 9     # const
+UNIFY_VOID = 10     #                    argument that is never used again
+PUT_VAR_FIRST = 11  # slot, reg, name
+PUT_VALUE = 12      # slot, reg
+PUT_CONST = 13      # const, reg
+PUT_TERM = 14       # template, reg, cells  build a compound or list argument of cells terms
+CALL = 15           # key, n             call predicate, return after it
+EXECUTE = 16        # key, n             last call: no return
+PROCEED = 17        #                    return to the continuation
+DEALLOCATE = 18     #                    drop the environment before the last call
+BUILTIN = 19        # function, templates, cells
+CUT = 20            #
+CALL_VAR = 21       # slot               call a goal held in a variable
+TRY_ME_ELSE = 22    # label, n
+RETRY_ME_ELSE = 23  # label
+TRUST_ME = 24       #
+HALT = 25           #                    query solved
+FAIL = 26           #
+ARITH = 27          # run, cells         compiled arithmetic goal, see arithmetic.compile_goal
+SEARCH = 28         # function, templates, cells  builtin that may succeed again on backtracking
+JUMP = 29           # label              go on at label in the same code
+MARK = 30           # slot               save the choicepoint stack height in slot
+CUT_TO = 31         # slot, offset       drop the choicepoints above the height in slot plus offset
+NEW_VAR = 32        # slot, name         fresh variable in slot, before a control construct
+NECK = 33           #                    the head unified; only compiled in while counting
+SWITCH_ON_TERM = 34  # table, var, other  go to the clauses the first argument may match
+TRY = 35            # label, n           push a choicepoint that goes on at the next instruction, go to label
+RETRY = 36          # label              update it to the next instruction, go to label
+TRUST = 37          # label              drop it, go to label
+TABLED = 38         # key, code          answer the call from the predicate's table, filled by running code
+EVALUATE = 39       # code               call the clause code of a tabled predicate, not its table
+
+# Template tags for PUT_TERM and BUILTIN arguments
+T_NEW = 0    # ('new', slot, name): first occurrence, create a variable
+T_SLOT = 1   # ('slot', slot): variable already in the frame
+T_CONST = 2  # ('const', term)
+T_STRUCT = 3  # ('struct', functor, args)
+T_LIST = 4   # ('list', elements, tail)
+
+MISSING = object()  # Predicate not compiled yet
+
+TRUE = Compound('true', ())
+FAILURE = Compound('fail', ())
+
+# Predicates are keyed by (functor, arity). An atom used as a goal or as
+# a clause head has arity None, so it never matches a compound term.
+PredicateKey = Tuple[str, Optional[int]]
+
+
+def predicate_key(term: Term) -> Optional[PredicateKey]:
+    """Return the key a goal or clause head is compiled under."""
+    if isinstance(term, Compound):
+        return (term.functor, len(term.args))
+    if isinstance(term, Atom) and isinstance(term.value, str):
+        return (term.value, None)
+    return None
+
+
+def is_constant(term: Term) -> bool:
+    """Atoms, numbers and the empty list are matched by value."""
+    if isinstance(term, Atom):
+        return True
+    return isinstance(term, ListTerm) and not term.size and not term.tail
+
+
+class ClauseCompiler:
+    """Compiles one clause (or a query) into instructions."""
+    
+    def __init__(self, builtins: BuiltinRegistry):
+        self.builtins = builtins
+        self.slots: Dict[str, int] = {}  # Variable name -> frame slot
+        self.seen = set()  # Variables whose slot is filled at this point
+        self.num_slots = 0
+        self.registers = 0  # Argument registers the code needs
+        self.cut_slot: Optional[tuple] = None  # (slot, offset) a cut goes back to inside a condition
+        self.code: list = []
+    
+    def new_slot(self) -> int:
+        """Reserve a frame slot for a temporary value."""
+        self.num_slots += 1
+        return self.num_slots - 1
+    
+    def slot(self, var: Variable) -> int:
+        """Return the frame slot of a variable, reserving one if needed."""
+        if var.name not in self.slots:
+            self.slots[var.name] = self.new_slot()
+        return self.slots[var.name]
+    
+    def compile_clause(self, clause: Clause, occurs_check: bool = True, counting: bool = False) -> list:
+        """Compile a fact or rule, returning its instructions. counting adds a NECK after the head."""
+        code = self.code
+        code.append((FRAME, 0, occurs_check))  # Patched with the slot count below
+        if clause.body:
+            code.append((ALLOCATE,))
+        
+        head = clause.head
+        if isinstance(head, Compound):
+            self.compile_head(head.args)
+        if counting:
+            code.append((NECK,))
+        
+        if clause.body:
+            self.compile_body(clause.body, query=False)
+        else:
+            code.append((PROCEED,))
+        
+        code[0] = (FRAME, self.num_slots, occurs_check)
+        return code
+    
+    def compile_query(self, goals: List[Term], query_vars: Dict[str, Variable]) -> list:
+        """
+        Compile a query. Its variables are given, so that their values
+        can be read back from the frame when the query succeeds.
+        """
+        for name in query_vars:
+            self.slot(Variable(name))
+            self.seen.add(name)
+        self.code.append((ALLOCATE,))
+        self.compile_body(goals, query=True)
+        return self.code
+    
+    def compile_call(self, goal: Term, count: int) -> list:
+        """
+        Compile a goal called at run time as the body of a clause. Its
+        variables are named $0, $1, ... and their values are in the first
+        count slots of the frame.
+        """
+        for i in range(count):
+            self.slot(Variable(f'${i}'))
+            self.seen.add(f'${i}')
+        self.code.append((ALLOCATE,))
+        self.compile_body([goal], query=False)
+        return self.code
+    
+    # Clause heads
+    
+    def compile_head(self, args: tuple):
+        """Match the head arguments against argument registers."""
+        # Nested terms are matched after their parent, from a temporary
+        # slot copied into the first register the head does not use.
+        self.scratch = len(args)
+        self.registers = max(self.registers, len(args) + 1)
+        pending = []  # (slot, term) of nested terms
+        for reg, arg in enumerate(args):
+            if isinstance(arg, Variable):
+                if arg.name in self.seen:
+                    self.code.append((GET_VALUE, self.slot(arg), reg))
+                else:
+                    self.seen.add(arg.name)
+                    self.code.append((GET_VAR_FIRST, self.slot(arg), reg))
+            elif is_constant(arg):
+                self.code.append((GET_CONST, arg, reg))
+            else:
+                self.compile_get_structure(arg, ('reg', reg), pending)
+        
+        while pending:
+            slot, term = pending.pop(0)
+            self.compile_get_structure(term, ('slot', slot), pending)
+    
+    def compile_get_structure(self, term: Term, source: tuple, pending: list):
+        """Match a compound or list held in a register or slot."""
+        if source[0] == 'slot':
+            reg = self.scratch
+            self.code.append((PUT_VALUE, source[1], reg))
+        else:
+            reg = source[1]
+        
+        if isinstance(term, Compound):
+            self.code.append((GET_STRUCT, term.functor, len(term.args), reg))
+            items = list(term.args)
+        else:
+            self.code.append((GET_LIST, len(term.elements), reg))
+            items = list(term.elements) + [term.tail if term.tail else EMPTY_LIST]
+        
+        for item in items:
+            if isinstance(item, Variable):
+                if item.name in self.seen:
+                    self.code.append((UNIFY_VALUE, self.slot(item)))
+                else:
+                    self.seen.add(item.name)
+                    self.code.append((UNIFY_VAR_FIRST, self.slot(item)))
+            elif is_constant(item):
+                self.code.append((UNIFY_CONST, item))
+            else:
+                temp = self.new_slot()
+                self.code.append((UNIFY_VAR_FIRST, temp))
+                pending.append((temp, item))
+    
+    # Clause bodies
+    
+    def compile_body(self, goals: List[Term], query: bool):
+        """Compile body goals; the last user call of a rule becomes EXECUTE."""
+        if not self.compile_goals(goals, last=not query):
+            if query:
+                self.code.append((HALT,))
+            else:
+                self.code.append((DEALLOCATE,))
+                self.code.append((PROCEED,))
+    
+    def compile_goals(self, goals, last: bool) -> bool:
+        """
+        Compile a conjunction of goals. With last, its last call may be
+        an EXECUTE; returns True if the code ends with one.
+        """
+        for i, goal in enumerate(goals):
+            if self.compile_goal(goal, last and i == len(goals) - 1):
+                return True
+        return False
+    
+    def compile_goal(self, goal: Term, last: bool) -> bool:
+        """Compile one body goal; returns True if it became an EXECUTE."""
+        code = self.code
+        if isinstance(goal, Atom) and goal.value == '!':
+            code.append((CUT,) if self.cut_slot is None else (CUT_TO,) + self.cut_slot)
+        elif isinstance(goal, Variable):
+            if goal.name not in self.seen:
+                code.append((FAIL,))  # Calling an unbound variable
+            else:
+                code.append((CALL_VAR, self.slot(goal)))
+        elif is_control(goal):
+            return self.compile_control(goal, last)
+        elif self.compile_arithmetic(goal):
+            pass
+        elif isinstance(goal, Compound) and goal.functor in self.builtins.searches:
+            templates = tuple(self.template(arg) for arg in goal.args)
+            code.append((SEARCH, self.builtins.searches[goal.functor], templates, _cells(templates)))
+        elif isinstance(goal, Compound) and self.builtins.is_builtin(goal.functor):
+            templates = tuple(self.template(arg) for arg in goal.args)
+            code.append((BUILTIN, self.builtins.builtins[goal.functor], templates, _cells(templates)))
+        elif predicate_key(goal) is not None:
+            args = goal.args if isinstance(goal, Compound) else ()
+            self.registers = max(self.registers, len(args) + 1)
+            for reg, arg in enumerate(args):
+                self.compile_put(arg, reg)
+            if last:
+                code.append((DEALLOCATE,))
+                code.append((EXECUTE, predicate_key(goal), len(args)))
+                return True
+            code.append((CALL, predicate_key(goal), len(args)))
+        else:
+            code.append((FAIL,))  # Numbers and lists cannot be called
+        return False
+    
+    # Control constructs
+    
+    def compile_control(self, goal: Compound, last: bool) -> bool:
+        """
+        Compile a control construct inline, with its branches chained by
+        try_me_else/trust_me within the clause's own code.
+        
+        Variables first met inside the construct get their slot before
+        it, since a branch may run without the one that would set it.
+        """
+        self.compile_new_variables(goal)
+        args = goal.args
+        if goal.functor == '':
+            return self.compile_goals(args, last)
+        if goal.functor == ';':
+            left = args[0]
+            if isinstance(left, Compound) and left.functor == '->' and len(left.args) == 2:
+                return self.compile_branches(left.args[0], left.args[1], args[1], last)
+            return self.compile_branches(None, left, args[1], last)
+        if goal.functor == '->':
+            return self.compile_branches(args[0], args[1], None, last)
+        if goal.functor == 'once':
+            return self.compile_branches(args[0], TRUE, None, last)
+        if goal.functor == 'ignore':
+            return self.compile_branches(args[0], TRUE, TRUE, last)
+        return self.compile_branches(args[0], FAILURE, TRUE, last)  # \+ and not
+    
+    def compile_branches(self, condition: Optional[Term], then: Term, otherwise: Optional[Term],
+                         last: bool) -> bool:
+        """
+        Compile (; (-> condition then) otherwise), leaving out the parts
+        that are None: without condition it is a plain disjunction.
+        
+        A condition commits to its first solution by cutting back to the
+        stack height saved before the construct. A cut inside it only
+        reaches back to its own start (that height, above the choicepoint
+        for otherwise). Cuts in the branches cut the clause.
+        """
+        code = self.code
+        if condition is not None:
+            mark = self.new_slot()
+            code.append((MARK, mark))
+        if otherwise is not None:
+            choice = len(code)
+            code.append(None)  # TRY_ME_ELSE, filled in below
+        
+        if condition is not None:
+            outer = self.cut_slot
+            self.cut_slot = (mark, 0 if otherwise is None else 1)
+            self.compile_goal(condition, False)
+            self.cut_slot = outer
+            code.append((CUT_TO, mark, 0))
+        
+        done = self.compile_goal(then, last)
+        if otherwise is None:
+            return done
+        if not done:
+            jump = len(code)
+            code.append(None)  # JUMP past otherwise
+        code[choice] = (TRY_ME_ELSE, len(code), 0)
+        code.append((TRUST_ME,))
+        otherwise_done = self.compile_goal(otherwise, last)
+        if not done:
+            code[jump] = (JUMP, len(code))
+        return done and otherwise_done
+    
+    def compile_new_variables(self, term: Term):
+        """Give each variable of term not yet seen a fresh variable in its slot."""
+        if isinstance(term, Variable):
+            if term.name not in self.seen:
+                self.seen.add(term.name)
+                self.code.append((NEW_VAR, self.slot(term), '_' + term.name))
+        elif isinstance(term, Compound) and not term.ground:
+            for arg in term.args:
+                self.compile_new_variables(arg)
+        elif isinstance(term, ListTerm) and not term.ground:
+            for elem in term.elements:
+                self.compile_new_variables(elem)
+            if term.tail:
+                self.compile_new_variables(term.tail)
+    
+    def compile_arithmetic(self, goal: Term) -> bool:
+        """Compile (is X Expr) or a comparison to run on the frame; False if goal is not one."""
+        if not (isinstance(goal, Compound) and len(goal.args) == 2 and
+                (goal.functor == 'is' or goal.functor in COMPARISONS)):
+            return False
+        
+        # A first occurrence of X just takes the value
+        target = goal.args[0]
+        fresh = goal.functor == 'is' and isinstance(target, Variable) and target.name not in self.seen
+        compiled = compile_goal(self.slotted(goal), fresh)
+        if compiled is None:
+            return False
+        if fresh:
+            self.seen.add(target.name)
+        self.code.append((ARITH, compiled.run, compiled.cells))
+        return True
+    
+    def slotted(self, term: Term):
+        """Replace the variables of a term with slots of the frame."""
+        if isinstance(term, Variable):
+            return Slot(self.slot(term), term.name)
+        if isinstance(term, Compound) and not term.ground:
+            return Compound(term.functor, tuple(self.slotted(arg) for arg in term.args))
+        return term
+    
+    def compile_put(self, arg: Term, reg: int):
+        """Load one call argument into a register."""
+        if isinstance(arg, Variable):
+            if arg.name in self.seen:
+                self.code.append((PUT_VALUE, self.slot(arg), reg))
+            else:
+                self.seen.add(arg.name)
+                self.code.append((PUT_VAR_FIRST, self.slot(arg), reg, '_' + arg.name))
+        elif is_constant(arg):
+            self.code.append((PUT_CONST, arg, reg))
+        else:
+            template = self.template(arg)
+            self.code.append((PUT_TERM, template, reg, _cells((template,))))
+    
+    def template(self, term: Term) -> tuple:
+        """Describe how to build a term from the frame at run time."""
+        if term.ground:
+            return (T_CONST, term)  # Shared as it is, like the interned literal it is
+        if isinstance(term, Variable):
+            if term.name in self.seen:
+                return (T_SLOT, self.slot(term))
+            self.seen.add(term.name)
+            return (T_NEW, self.slot(term), '_' + term.name)
+        if isinstance(term, Compound):
+            return (T_STRUCT, term.functor, tuple(self.template(arg) for arg in term.args))
+        if isinstance(term, ListTerm) and (term.elements or term.tail):
+            elements = tuple(self.template(elem) for elem in term.elements)
+            tail = self.template(term.tail) if term.tail else None
+            return (T_LIST, elements, tail)
+        return (T_CONST, term)
+
+
+def compile_predicate(clauses: List[Clause], arity: int, builtins: BuiltinRegistry,
+                      occurs_check: str = 'full', counting: bool = False) -> Tuple[list, int]:
+    """
+    Compile the clauses of one predicate into a single instruction list.
+    
+    Several clauses are chained with try_me_else/retry_me_else/trust_me;
+    labels are positions in the returned list. When the clauses' first
+    arguments tell them apart, a switch_on_term in front sends a call
+    with a bound first argument to the clauses of its bucket in the
+    first-argument index (see database.ArgumentIndex) instead. Also
+    returns the number of argument registers the code uses. occurs_check is the predicate's
+    mode; in 'auto' only clauses whose head repeats a variable check.
+    counting compiles the code for Counters (see ClauseCompiler.compile_clause).
+    """
+    compilers = [ClauseCompiler(builtins) for _ in clauses]
+    compiled = [compiler.compile_clause(clause, occurs_check == 'full' or
+                                        (occurs_check == 'auto' and not clause.template.linear), counting)
+                for compiler, clause in zip(compilers, clauses)]
+    registers = max(compiler.registers for compiler in compilers)
+    if len(compiled) == 1:
+        return compiled[0], registers
+    
+    index = ArgumentIndex(0)
+    if arity:
+        for clause in clauses:
+            index.add(clause)
+    switch = any(len(bucket) < len(clauses) for bucket in index.buckets.values())
+    
+    code = [None] if switch else []  # switch_on_term, filled in below
+    starts = []
+    for clause_code in compiled:
+        starts.append(len(code))
+        code.append(None)  # Choice instruction, filled in below
+        code.extend(_relocate(clause_code, len(code)))
+    
+    last = len(starts) - 1
+    for i, pos in enumerate(starts):
+        if i == 0:
+            code[pos] = (TRY_ME_ELSE, starts[1], arity)
+        elif i < last:
+            code[pos] = (RETRY_ME_ELSE, starts[i + 1])
+        else:
+            code[pos] = (TRUST_ME,)
+    
+    if switch:
+        # Each clause's code follows its choice instruction in the chain above
+        entries = {id(clause): start + 1 for clause, start in zip(clauses, starts)}
+        chains = {}  # Labels of the bucket chains made so far, by their clauses
+        
+        def chain(bucket: List[Clause]) -> int:
+            """Return the label of code that tries the clauses of a bucket."""
+            if not bucket:
+                return fail
+            if len(bucket) == len(clauses):
+                return starts[0]
+            labels = tuple(entries[id(clause)] for clause in bucket)
+            if len(labels) == 1:
+                return labels[0]
+            if labels not in chains:
+                chains[labels] = len(code)
+                code.append((TRY, labels[0], arity))
+                code.extend((RETRY, label) for label in labels[1:-1])
+                code.append((TRUST, labels[-1]))
+            return chains[labels]
+        
+        fail = len(code)
+        code.append((FAIL,))
+        table = {key: chain(bucket) for key, bucket in index.buckets.items()}
+        code[0] = (SWITCH_ON_TERM, table, starts[0], chain(index.var_clauses))
+    return code, registers
+
+
+def _slot_variables(term: Term, variables: Dict[int, Tuple[Variable, Variable]]) -> Term:
+    """
+    Copy term with its unbound variables replaced by ones named $0, $1,
+    ... in order. variables maps the id of each variable found to the
+    variable and its replacement.
+    """
+    term = deref(term)
+    if isinstance(term, Variable):
+        if id(term) not in variables:
+            variables[id(term)] = (term, Variable(f'${len(variables)}'))
+        return variables[id(term)][1]
+    if isinstance(term, Compound) and not term.ground:
+        return Compound(term.functor, tuple(_slot_variables(arg, variables) for arg in term.args))
+    if isinstance(term, ListTerm) and not term.ground:
+        elements = tuple(_slot_variables(elem, variables) for elem in term.elements)
+        return ListTerm(elements, _slot_variables(term.tail, variables) if term.tail else None)
+    return term
+
+
+def _cells(templates: tuple) -> int:
+    """Return the number of compound terms and lists _build makes for templates."""
+    cells = 0
+    for template in templates:
+        if template[0] == T_STRUCT:
+            cells += 1 + _cells(template[2])
+        elif template[0] == T_LIST:
+            cells += 1 + _cells(template[1]) + (_cells((template[2],)) if template[2] is not None else 0)
+    return cells
+
+
+def _relocate(code: list, offset: int) -> list:
+    """Shift the labels of a clause's control constructs for code placed at offset."""
+    if not offset:
+        return code
+    relocated = []
+    for instr in code:
+        if instr[0] == JUMP:
+            instr = (JUMP, instr[1] + offset)
+        elif instr[0] == TRY_ME_ELSE:
+            instr = (TRY_ME_ELSE, instr[1] + offset, instr[2])
+        relocated.append(instr)
+    return relocated
+
+
+class Env:
+    """
+    The environment of a rule body: its variables and where to return.
+    depth is only set while counting.
+    """
+    __slots__ = ('frame', 'cont', 'cut_barrier', 'depth')
+    
+    def __init__(self, frame: list, cont: tuple, cut_barrier: int):
+        self.frame = frame
+        self.cont = cont  # (code, pc, env) to return to
+        self.cut_barrier = cut_barrier
+
+
+class WamChoicePoint:
+    """
+    Machine state to restore before trying a predicate's next clause.
+    
+    For a builtin that can succeed more than once, solutions holds the
+    generator of its solutions, and alt is the instruction after it.
+    """
+    __slots__ = ('code', 'alt', 'args', 'env', 'cont', 'trail_mark', 'boundary', 'solutions')
+    
+    def __init__(self, code: list, alt: int, args: list, env: Env, cont: tuple, trail_mark: int,
+                 solutions: Optional[Iterator] = None):
+        self.code = code
+        self.alt = alt  # Position of the next clause's RETRY_ME_ELSE/TRUST_ME or RETRY/TRUST
+        self.args = args
+        self.env = env
+        self.cont = cont
+        self.trail_mark = trail_mark
+        self.boundary = next(variable_serials)
+        self.solutions = solutions
+
+
+class WamEngine:
+    """
+    Runs queries on compiled predicates.
+    
+    Drop-in alternative to InferenceEngine: solve() takes the same goals
+    and yields the same Substitution snapshots.
+    """
+    
+    def __init__(self, database: Database, occurs_check: str = 'auto', rational_trees: bool = True):
+        if occurs_check not in OCCURS_CHECK_MODES:
+            raise ValueError(f"Unknown occurs check mode: {occurs_check}")
+        self.database = database
+        self.occurs_check = occurs_check
+        self.rational_trees = rational_trees
+        self.builtins = BuiltinRegistry(self)  # Built-in predicates
+        self.counters: Optional[Counters] = None  # Work done by queries, counted when set
+        self._code: Dict[PredicateKey, Optional[list]] = {}
+        self._other_code: Dict[PredicateKey, Optional[list]] = {}  # Compiled for the other counting setting
+        self._counting = False  # Whether _code is compiled for counting
+        self._generation = database.generation
+        self._registers = 1  # Argument registers needed by any compiled code
+        self._call_code: Optional[list] = None  # Calls a goal for solutions()
+        self._tables = Tables(database.generation)  # Answers of tabled predicates
+    
+    def predicate_code(self, key: PredicateKey) -> Optional[list]:
+        """Return the compiled code of a predicate, compiling it if needed."""
+        if key not in self._code:
+            clauses = self.database.predicate_clauses(key)
+            code = None
+            if clauses:
+                mode = self.database.occurs_checks.get(key, self.occurs_check)
+                code, registers = compile_predicate(clauses, key[1] or 0, self.builtins, mode, self._counting)
+                self._registers = max(self._registers, registers)
+            if key in self.database.tabled:
+                code = [(TABLED, key, code)]
+            self._code[key] = code
+        return self._code[key]
+    
+    def clauses_changed(self, key: PredicateKey):
+        """
+        A builtin added or erased a clause of a predicate: later calls
+        recompile it, calls already running keep the code they started with.
+        """
+        self._code.pop(key, None)
+        self._other_code.pop(key, None)
+        self._generation = self.database.generation
+    
+    def solve(self, goals: List[Term], limits: Optional[QueryLimits] = None) -> Generator[Substitution, None, None]:
+        """
+        Generator that yields all solutions for given goals.
+        
+        Args:
+            goals: List of Terms to prove
+            limits: Inference, time and binding limits and a cancel token;
+                raises limits.ResourceError when one is hit
+        
+        Yields:
+            Substitution snapshots binding the query's variables (solutions)
+        """
+        if self._generation != self.database.generation:
+            # The database changed: recompile predicates on next use
+            self._code.clear()
+            self._other_code.clear()
+            self._generation = self.database.generation
+        self._tables.refresh(self.database.generation)  # Clauses changed: tabled answers may be wrong now
+        counters = self.counters
+        if self._counting != (counters is not None):
+            self._code, self._other_code = self._other_code, self._code
+            self._counting = counters is not None
+        
+        query_vars: Dict[str, Variable] = {}
+        goals = [copy_term(goal, query_vars) for goal in goals]
+        compiler = ClauseCompiler(self.builtins)
+        code = compiler.compile_query(goals, query_vars)
+        self._registers = max(self._registers, compiler.registers)
+        
+        # The query's frame holds its variables in the slots compile_query
+        # gave them, which follow the order of query_vars.
+        frame = list(query_vars.values()) + [None] * (compiler.num_slots - len(query_vars))
+        if limits is not None and limits.bindings is not None:
+            store = LimitedStore()  # Counts bindings, and in counters if set
+            store.counters = counters
+        else:
+            store = BindingStore() if counters is None else CountingStore(counters)
+        store.boundary = 0  # No choicepoints yet, so nothing needs trailing
+        store.budget = limits.start() if limits is not None else None
+        cyclic = self.rational_trees and (
+            self.occurs_check == 'off' or 'off' in self.database.occurs_checks.values())
+        
+        solutions = self._run(code, frame, store)
+        if counters is not None:
+            solutions = counters.timed(solutions)
+        try:
+            for _ in solutions:
+                yield store.snapshot(query_vars.values(), cyclic)
+        finally:
+            self._tables.abandon()  # If stopped by an error in the middle of a tabled evaluation
+    
+    def solutions(self, goal: Term, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """
+        Prove goal in a nested run of the machine, for builtins such as findall.
+        
+        Yields the store once per solution, with the bindings in place. A
+        cut in goal is local to it. All bindings are undone when the search
+        ends or the generator is closed.
+        """
+        if self._call_code is None:
+            # A query that calls the goal held in its only variable
+            self._call_code = ClauseCompiler(self.builtins).compile_query([Variable('Goal')], {'Goal': None})
+        mark = store.mark()
+        boundary = store.boundary
+        body_check = store.occurs_check
+        store.boundary = next(variable_serials)  # Trail every binding, so all can be undone
+        try:
+            yield from self._run(self._call_code, [goal], store, mark, store.boundary)
+        finally:
+            store.undo_to(mark)
+            store.boundary = boundary
+            store.occurs_check = body_check
+    
+    def _evaluate(self, code: Optional[list], goal: Term, store: BindingStore) -> Generator[BindingStore, None, None]:
+        """
+        Run the clause code of a tabled predicate on goal in a nested run
+        of the machine, for Tables.answers. Yields the store once per
+        solution; all bindings are undone when the run ends.
+        """
+        if code is None:
+            return  # No clauses
+        args = goal.args if isinstance(goal, Compound) else ()
+        entry = [(ALLOCATE,)] + [(PUT_VALUE, i, i) for i in range(len(args))] + [(EVALUATE, code), (HALT,)]
+        mark = store.mark()
+        boundary = store.boundary
+        body_check = store.occurs_check
+        store.boundary = next(variable_serials)  # Trail every binding, so all can be undone
+        try:
+            yield from self._run(entry, list(args), store, mark, store.boundary)
+        finally:
+            store.undo_to(mark)
+            store.boundary = boundary
+            store.occurs_check = body_check
+    
+    def _answers(self, goal: Term, answers: List[Clause], store: BindingStore) -> Generator[BindingStore, None, None]:
+        """Unify goal with each answer from its table in turn."""
+        mark = store.mark()
+        for answer in answers:
+            if unify(goal, copy_term(answer.head, {}), store):
+                yield store
+            store.undo_to(mark)
+    
+    def statistics(self) -> dict:
+        """
+        Return engine statistics, as InferenceEngine.statistics does. Clauses
+        tried can be more than in the interpreter: the compiled code only
+        switches on the first argument.
+        """
+        statistics = {'indexes': self.database.index_statistics()}
+        if self.counters is not None:
+            statistics.update(self.counters.as_dict())
+        return statistics
+    
+    def _control_code(self, goal: Compound) -> Tuple[list, list]:
+        """
+        Compile a control construct called through a variable, as the
+        body of a clause whose variables are those of goal. Returns the
+        code and its frame.
+        """
+        variables: Dict[int, Tuple[Variable, Variable]] = {}
+        renamed = _slot_variables(goal, variables)
+        compiler = ClauseCompiler(self.builtins)
+        code = compiler.compile_call(renamed, len(variables))
+        self._registers = max(self._registers, compiler.registers)
+        frame = [var for var, _ in variables.values()] + [None] * (compiler.num_slots - len(variables))
+        return code, frame
+    
+    def _run(self, code: list, frame: list, store: BindingStore,
+             base_mark: int = 0, base_boundary: int = 0) -> Generator[BindingStore, None, None]:
+        """
+        The dispatch loop. Yields the store each time HALT is reached.
+        
+        A nested run (see solutions) starts from the trail mark and
+        boundary of the outer run, and restores those when it has cut or
+        popped all of its own choicepoints.
+        """
+        choicepoints: List[WamChoicePoint] = []
+        args = [None] * self._registers  # Argument registers
+        codes = self._code
+        env = None
+        cont = None
+        cut_barrier = 0  # Choicepoint height when the current predicate was called
+        pc = 0
+        
+        # Structure matching state for unify_* instructions
+        write = False
+        items = None  # Read mode: terms to match
+        item = 0
+        target = None  # Write mode: variable to bind to the built term
+        building = None  # Write mode: (functor or None for lists, collected items)
+        size = 0
+        
+        bind = store.bind
+        body_check = self.occurs_check != 'off'  # For builtins such as =
+        budget = store.budget  # Counts calls, arithmetic and builtins as inferences
+        counters = store.counters
+        
+        while True:
+            instr = code[pc]
+            op = instr[0]
+            pc += 1
+            ok = True
+            
+            if op == GET_VAR_FIRST:
+                frame[instr[1]] = args[instr[2]]
+            
+            elif op == GET_VALUE:
+                ok = unify(frame[instr[1]], args[instr[2]], store)
+            
+            elif op == GET_CONST:
+                value = deref(args[instr[2]])
+                if isinstance(value, Variable):
+                    bind(value, instr[1])
+                else:
+                    ok = self._same_constant(value, instr[1])
+            
+            elif op == UNIFY_VAR_FIRST:
+                if write:
+                    var = Variable('_')
+                    frame[instr[1]] = var
+                    building[1].append(var)
+                else:
+                    frame[instr[1]] = items[item]
+                    item += 1
+            
+            elif op == UNIFY_VALUE:
+                if write:
+                    building[1].append(frame[instr[1]])
+                else:
+                    ok = unify(frame[instr[1]], items[item], store)
+                    item += 1
+            
+            elif op == UNIFY_CONST:
+                if write:
+                    building[1].append(instr[1])
+                else:
+                    value = deref(items[item])
+                    item += 1
+                    if isinstance(value, Variable):
+                        bind(value, instr[1])
+                    else:
+                        ok = self._same_constant(value, instr[1])
+            
+            elif op == UNIFY_VOID:
+                if write:
+                    building[1].append(Variable('_'))
+                else:
+                    item += 1
+            
+            elif op == GET_STRUCT:
+                value = deref(args[instr[3]])
+                if isinstance(value, Variable):
+                    write = True
+                    target = value
+                    building = (instr[1], [])
+                    size = instr[2]
+                elif (isinstance(value, Compound) and value.functor == instr[1]
+                      and len(value.args) == instr[2]):
+                    write = False
+                    items = value.args
+                    item = 0
+                else:
+                    ok = False
+            
+            elif op == GET_LIST:
+                value = deref(args[instr[2]])
+                if isinstance(value, Variable):
+                    write = True
+                    target = value
+                    building = (None, [])
+                    size = instr[1] + 1
+                else:
+                    write = False
+                    items = self._split_list(value, instr[1], store)
+                    item = 0
+                    ok = items is not None
+            
+            elif op == PUT_VAR_FIRST:
+                var = Variable(instr[3])
+                frame[instr[1]] = var
+                args[instr[2]] = var
+            
+            elif op == PUT_VALUE:
+                args[instr[2]] = frame[instr[1]]
+            
+            elif op == PUT_CONST:
+                args[instr[2]] = instr[1]
+            
+            elif op == PUT_TERM:
+                args[instr[2]] = self._build(instr[1], frame)
+                if budget is not None:
+                    budget.bindings += instr[3]
+            
+            elif op == ARITH:
+                if budget is not None:
+                    budget.step(store)
+                    budget.bindings += instr[2]
+                if counters is not None:
+                    counters.inferences += 1
+                ok = instr[1](frame, store)
+            
+            elif op == SEARCH:
+                if budget is not None:
+                    budget.step(store)
+                    budget.bindings += instr[3]
+                if counters is not None:
+                    counters.inferences += 1
+                builtin_args = tuple(self._build(t, frame) for t in instr[2])
+                store.occurs_check = body_check
+                solutions = instr[1](builtin_args, store)
+                if type(solutions) is bool:
+                    ok = solutions  # Deterministic call
+                else:
+                    choicepoint = WamChoicePoint(code, pc, [], env, cont, store.mark(), solutions)
+                    ok = self._first_solution(choicepoint, choicepoints, store, base_boundary)
+                    if counters is not None and ok and choicepoints[-1] is choicepoint:
+                        counters.choicepoints += 1
+            
+            elif op == BUILTIN:
+                if budget is not None:
+                    budget.step(store)
+                    budget.bindings += instr[3]
+                if counters is not None:
+                    counters.inferences += 1
+                builtin_args = tuple(self._build(t, frame) for t in instr[2])
+                store.occurs_check = body_check
+                ok = instr[1](builtin_args, store)
+            
+            elif op == CALL or op == EXECUTE:
+                if budget is not None:
+                    budget.step(store)
+                if counters is not None:
+                    counters.inferences += 1
+                    counters.max_depth = max(counters.max_depth, env.depth)
+                if op == CALL:
+                    cont = (code, pc, env)
+                callee = codes.get(instr[1], MISSING)
+                if callee is MISSING:
+                    callee = self.predicate_code(instr[1])
+                    if len(args) < self._registers:
+                        args.extend([None] * (self._registers - len(args)))
+                if callee is None:
+                    ok = False
+                else:
+                    code = callee
+                    pc = 0
+                    cut_barrier = len(choicepoints)
+            
+            elif op == FRAME:
+                frame = [None] * instr[1] if instr[1] else None
+                store.occurs_check = instr[2]
+                if counters is not None:
+                    counters.clauses += 1
+            
+            elif op == ALLOCATE:
+                env = Env(frame, cont, cut_barrier)
+                if counters is not None:
+                    env.depth = cont[2].depth + 1 if cont is not None else 0
+            
+            elif op == DEALLOCATE:
+                cont = env.cont
+            
+            elif op == PROCEED:
+                code, pc, env = cont
+                frame = env.frame
+            
+            elif op == TRY_ME_ELSE:
+                choicepoint = WamChoicePoint(code, instr[1], args[:instr[2]], env, cont, store.mark())
+                choicepoints.append(choicepoint)
+                store.boundary = choicepoint.boundary
+                if counters is not None:
+                    counters.choicepoints += 1
+            
+            elif op == RETRY_ME_ELSE:
+                choicepoints[-1].alt = instr[1]
+            
+            elif op == TRUST_ME:
+                choicepoints.pop()
+                store.boundary = choicepoints[-1].boundary if choicepoints else base_boundary
+            
+            elif op == TABLED:
+                key = instr[1]
+                goal = Atom(key[0]) if key[1] is None else Compound(key[0], tuple(args[:key[1]]))
+                answers = self._tables.answers(goal, partial(self._evaluate, instr[2]), store)
+                store.occurs_check = body_check
+                code, pc, env = cont  # Return at once, with the choicepoint of the answers
+                frame = env.frame
+                choicepoint = WamChoicePoint(code, pc, [], env, cont, store.mark(), self._answers(goal, answers, store))
+                ok = self._first_solution(choicepoint, choicepoints, store, base_boundary)
+            
+            elif op == EVALUATE:
+                cont = (code, pc, env)
+                code = instr[1]
+                pc = 0
+                cut_barrier = len(choicepoints)
+            
+            elif op == SWITCH_ON_TERM:
+                key = argument_key(args[0])
+                pc = instr[2] if key is None else instr[1].get(key, instr[3])
+            
+            elif op == TRY:
+                choicepoint = WamChoicePoint(code, pc, args[:instr[2]], env, cont, store.mark())
+                choicepoints.append(choicepoint)
+                store.boundary = choicepoint.boundary
+                pc = instr[1]
+                if counters is not None:
+                    counters.choicepoints += 1
+            
+            elif op == RETRY:
+                choicepoints[-1].alt = pc
+                pc = instr[1]
+            
+            elif op == TRUST:
+                choicepoints.pop()
+                store.boundary = choicepoints[-1].boundary if choicepoints else base_boundary
+                pc = instr[1]
+            
+            elif op == CUT:
+                del choicepoints[env.cut_barrier:]
+                if choicepoints:
+                    store.boundary = choicepoints[-1].boundary
+                    store.tidy(choicepoints[-1].trail_mark)
+                else:
+                    store.boundary = base_boundary
+                    store.tidy(base_mark)
+            
+            elif op == CALL_VAR:
+                if budget is not None:
+                    budget.step(store)
+                if counters is not None:
+                    counters.inferences += 1
+                goal = deref(frame[instr[1]])
+                key = predicate_key(goal)
+                if isinstance(goal, Compound) and goal.functor in self.builtins.searches:
+                    store.occurs_check = body_check
+                    solutions = self.builtins.searches[goal.functor](goal.args, store)
+                    if type(solutions) is bool:
+                        ok = solutions
+                    else:
+                        choicepoint = WamChoicePoint(code, pc, [], env, cont, store.mark(), solutions)
+                        ok = self._first_solution(choicepoint, choicepoints, store, base_boundary)
+                        if counters is not None and ok and choicepoints[-1] is choicepoint:
+                            counters.choicepoints += 1
+                elif isinstance(goal, Compound) and self.builtins.is_builtin(goal.functor):
+                    store.occurs_check = body_check
+                    ok = self.builtins.evaluate(goal, store)
+                elif isinstance(goal, Atom) and goal.value == '!':
+                    pass  # Cut inside a called goal is local to it
+                elif is_control(goal):
+                    cont = (code, pc, env)
+                    code, frame = self._control_code(goal)
+                    if len(args) < self._registers:
+                        args.extend([None] * (self._registers - len(args)))
+                    pc = 0
+                    cut_barrier = len(choicepoints)
+                elif key is None:
+                    ok = False
+                else:
+                    callee = self.predicate_code(key)
+                    if len(args) < self._registers:
+                        args.extend([None] * (self._registers - len(args)))
+                    if callee is None:
+                        ok = False
+                    else:
+                        goal_args = goal.args if isinstance(goal, Compound) else ()
+                        args[:len(goal_args)] = goal_args
+                        cont = (code, pc, env)
+                        code = callee
+                        pc = 0
+                        cut_barrier = len(choicepoints)
+            
+            elif op == JUMP:
+                pc = instr[1]
+            
+            elif op == MARK:
+                frame[instr[1]] = len(choicepoints)
+            
+            elif op == CUT_TO:
+                del choicepoints[frame[instr[1]] + instr[2]:]
+                if choicepoints:
+                    store.boundary = choicepoints[-1].boundary
+                    store.tidy(choicepoints[-1].trail_mark)
+                else:
+                    store.boundary = base_boundary
+                    store.tidy(base_mark)
+            
+            elif op == NEW_VAR:
+                frame[instr[1]] = Variable(instr[2])
+            
+            elif op == HALT:
+                yield store
+                ok = False  # Backtrack for the next solution
+            
+            elif op == FAIL:
+                ok = False
+            
+            elif op == NECK:
+                counters.unifications += 1
+            
+            # Finish a structure being built in write mode
+            if write and ok and len(building[1]) == size:
+                write = False
+                functor, built = building
+                if functor is None:
+                    tail = deref(built[-1])
+                    if isinstance(tail, ListTerm) and not tail.elements and not tail.tail:
+                        tail = None
+                    built = ListTerm(tuple(built[:-1]), tail)
+                else:
+                    built = Compound(functor, tuple(built))
+                if store.occurs_check and occurs_check(target, built, store):
+                    ok = False
+                else:
+                    bind(target, built)
+            
+            if not ok:
+                # Backtrack to the newest choicepoint
+                while True:
+                    if not choicepoints:
+                        return
+                    choicepoint = choicepoints[-1]
+                    store.undo_to(choicepoint.trail_mark)
+                    store.boundary = choicepoint.boundary
+                    if choicepoint.solutions is None or next(choicepoint.solutions, None) is not None:
+                        break
+                    choicepoints.pop()  # A builtin with no more solutions
+                args[:len(choicepoint.args)] = choicepoint.args
+                env = choicepoint.env
+                cont = choicepoint.cont
+                code = choicepoint.code
+                pc = choicepoint.alt
+                cut_barrier = len(choicepoints) - 1
+                write = False
+                frame = env.frame  # A clause sets its own; a builtin or branch goes on in the body
+    
+    def _first_solution(self, choicepoint: WamChoicePoint, choicepoints: List[WamChoicePoint],
+                        store: BindingStore, base_boundary: int) -> bool:
+        """Push a builtin's choicepoint and ask its generator for a first solution."""
+        choicepoints.append(choicepoint)
+        store.boundary = choicepoint.boundary
+        if next(choicepoint.solutions, None) is None:
+            choicepoints.pop()
+            store.boundary = choicepoints[-1].boundary if choicepoints else base_boundary
+            return False
+        return True
+    
+    def _same_constant(self, value: Term, const: Term) -> bool:
+        """Compare a dereferenced non-variable with a constant."""
+        if isinstance(const, Atom):
+            return isinstance(value, Atom) and value.value == const.value
+        # The empty list
+        return isinstance(value, ListTerm) and not value.size and (
+            not value.tail or self._same_constant(deref(value.tail), const))
+    
+    def _split_list(self, value: Term, count: int, store: BindingStore) -> Optional[list]:
+        """
+        Return the first count elements of a list followed by its rest,
+        or None if value is not a list that long.
+        
+        An unbound tail is extended with fresh variables, as unifying the
+        list with [E1 ... Ecount | Rest] would do.
+        """
+        found = []
+        while len(found) < count:
+            if isinstance(value, ListTerm):
+                size = value.size
+                if not size:
+                    if not value.tail:
+                        return None  # The empty list
+                    value = deref(value.tail)
+                    continue
+                needed = min(count - len(found), size)
+                items, start = value.items, value.start
+                found.extend(items[start:start + needed])
+                value = deref(value.rest(needed))
+            elif isinstance(value, Variable):
+                fresh = tuple(Variable('_') for _ in range(count - len(found)))
+                rest = Variable('_')
+                store.bind(value, ListTerm(fresh, rest))
+                found.extend(fresh)
+                found.append(rest)
+                return found
+            else:
+                return None
+        found.append(value)
+        return found
+    
+    def _build(self, template: tuple, frame: list) -> Term:
+        """Build a term from a template, creating first-occurrence variables."""
+        tag = template[0]
+        if tag == T_SLOT:
+            return frame[template[1]]
+        if tag == T_CONST:
+            return template[1]
+        if tag == T_NEW:
+            var = Variable(template[2])
+            frame[template[1]] = var
+            return var
+        if tag == T_STRUCT:
+            return Compound(template[1], tuple(self._build(t, frame) for t in template[2]))
+        elements = tuple(self._build(t, frame) for t in template[1])
+        tail = self._build(template[2], frame) if template[2] is not None else None
+        return ListTerm(elements, tail)